@@ -56,4 +56,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    UIElements.run_page(main, "Home")
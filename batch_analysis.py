@@ -0,0 +1,45 @@
+# batch_analysis.py
+
+import argparse
+import sys
+from components.batch_processor import BatchProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the EEG analyses over every recording of a directory, without the web interface. "
+                    "Finished files are listed in a manifest, so an interrupted run resumes where it stopped.")
+    parser.add_argument("input_dir", help="Directory with the CSV recordings.")
+    parser.add_argument("output_dir", help="Directory of the results and of the manifest.")
+    parser.add_argument("--analyses", nargs="+", choices=BatchProcessor.ANALYSES,
+                        default=["visualization", "wavelet", "entropy"],
+                        help="Analyses to run (default: visualization wavelet entropy).")
+    parser.add_argument("--format", choices=BatchProcessor.FORMATS, default="npz",
+                        help="Output format: one .npz per recording, or one .parquet per recording and analysis.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPUs).")
+    parser.add_argument("--pattern", default="**/*.csv", help="Glob pattern of the recordings (default: **/*.csv).")
+    parser.add_argument("--sampling-rate", type=int, default=1000, help="Sampling rate in Hz (default: 1000).")
+    parser.add_argument("--window", type=float, default=5, help="Entropy window size in seconds (default: 5).")
+    parser.add_argument("--min-freq", type=float, default=0.5, help="Lowest scalogram frequency (default: 0.5 Hz).")
+    parser.add_argument("--max-freq", type=float, default=100, help="Highest scalogram frequency (default: 100 Hz).")
+    parser.add_argument("--columns", type=int, default=2000,
+                        help="Time points kept for the envelope and the scalogram (default: 2000).")
+    args = parser.parse_args()
+
+    processor = BatchProcessor(args.input_dir, args.output_dir, args.analyses, args.format, args.workers,
+                               args.pattern, args.sampling_rate, args.window, args.min_freq, args.max_freq,
+                               args.columns)
+    try:
+        summary = processor.run(progress=lambda line: print(line, file=sys.stderr, flush=True))
+    except ImportError as error:
+        parser.error(str(error))
+
+    seconds = max(summary["seconds"], 1e-9)
+    print(f"{summary['done']} done, {summary['skipped']} already done, {summary['failed']} failed "
+          f"in {summary['seconds']:.1f} s ({summary['done'] / seconds:.2f} files/s, "
+          f"{summary['samples'] / seconds:,.0f} samples/s)")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
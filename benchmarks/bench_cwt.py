@@ -0,0 +1,57 @@
+# benchmarks/bench_cwt.py
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pywt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.cwt_engine import FFTWaveletTransform
+
+
+def best_time(function, repeats):
+    """
+    Returns the best wall time of several calls of a function, and its last result.
+    """
+    best = np.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pywt.cwt with the FFT-based wavelet transform.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 60],
+                        help="Signal durations in seconds (default: 5 30 60).")
+    parser.add_argument("--sampling-rate", type=int, default=1000, help="Sampling rate in Hz (default: 1000).")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed calls per case (default: 3).")
+    args = parser.parse_args()
+
+    scales = np.arange(1, 128)
+    rng = np.random.default_rng(0)
+    print(f"{'duration':>9} {'pywt':>9} {'fft128':>9} {'fft64':>9} {'speedup':>8} {'err128':>9} {'err64':>9}")
+    for duration in args.durations:
+        signal = rng.normal(scale=40.0, size=int(duration * args.sampling_rate))
+        reference_time, reference = best_time(lambda: pywt.cwt(signal, scales, 'cmor1.5-1.0')[0], 1)
+        scale = np.abs(reference).max()
+
+        results = []
+        for dtype in (np.complex128, np.complex64):
+            transformer = FFTWaveletTransform('cmor1.5-1.0', dtype=dtype)
+            transformer.filter_bank(scales, len(signal))  # Build the bank outside of the timing
+            elapsed, coefficients = best_time(lambda: transformer.transform(signal, scales), args.repeats)
+            results.append((elapsed, np.abs(coefficients - reference).max() / scale))
+
+        (time128, error128), (time64, error64) = results
+        print(f"{duration:>8g}s {reference_time:>8.3f}s {time128:>8.3f}s {time64:>8.3f}s "
+              f"{reference_time / time64:>7.1f}x {error128:>9.1e} {error64:>9.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/import_times.py
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries whose import is slow enough to matter for cold start
+HEAVY_MODULES = ("streamlit", "neurokit2", "pandas", "scipy", "plotly", "pywt")
+
+COMPONENTS = ("components.data_loader", "components.visualizer", "components.wavelet_analyzer",
+              "components.entropy_analyzer", "components.complexity_analyzer", "components.batch_processor")
+
+# Run in a fresh interpreter: imports the target (a page is executed without calling main()) and reports
+# the elapsed time and which heavy libraries ended up loaded
+PROBE = """
+import json, runpy, sys, time
+target, heavy = sys.argv[1], sys.argv[2].split(",")
+start = time.perf_counter()
+if target.endswith(".py"):
+    runpy.run_path(target, run_name="__import_probe__")
+else:
+    __import__(target)
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [name for name in heavy if name in sys.modules]}))
+"""
+
+
+def measure(target, repeats):
+    """
+    Returns the best import time of a page or module over several fresh interpreters, and the heavy
+    libraries it loads.
+    """
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", PROBE, target, ",".join(HEAVY_MODULES)], cwd=ROOT,
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold import time of every page and main component.")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per target (default: 3).")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    pages = sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    targets = [os.path.join(ROOT, "Home.py")] + pages + list(COMPONENTS)
+
+    results = {}
+    print(f"{'target':<45} {'seconds':>8}  heavy libraries loaded")
+    for target in targets:
+        name = os.path.relpath(target, ROOT) if target.endswith(".py") else target
+        results[name] = measure(target, args.repeats)
+        print(f"{name:<45} {results[name]['seconds']:>8.3f}  {', '.join(results[name]['loaded']) or '-'}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
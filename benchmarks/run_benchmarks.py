@@ -0,0 +1,264 @@
+# benchmarks/run_benchmarks.py
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CASES = ("csv_load", "binary_load", "figure_build", "cwt", "band_power", "preprocessing", "windowed_entropy",
+         "complexity")
+# A wall time only regresses when it grows by more than this many times the spread of the baseline runs
+NOISE_FACTOR = 2
+
+
+def write_synthetic_recording(path, duration, num_channels, sampling_rate, seed=0):
+    """
+    Writes a synthetic EEG recording as CSV, with the integer 10-bit samples of the acquisition device:
+    an alpha rhythm and 1/f background noise around mid-scale, different on every channel.
+
+    :return: Number of samples per channel.
+    """
+    rng = np.random.default_rng(seed)
+    num_samples = int(duration * sampling_rate)
+    time_axis = np.arange(num_samples) / sampling_rate
+    spectrum = rng.normal(size=(num_channels, num_samples // 2 + 1)) \
+        + 1j * rng.normal(size=(num_channels, num_samples // 2 + 1))
+    spectrum /= np.maximum(np.fft.rfftfreq(num_samples, 1 / sampling_rate), 0.5)
+    background = np.fft.irfft(spectrum, n=num_samples, axis=1)
+    background *= 30 / background.std(axis=1, keepdims=True)
+    alpha = 20 * np.sin(2 * np.pi * rng.uniform(8, 12, size=(num_channels, 1)) * time_axis)
+    samples = np.clip(np.rint(512 + background + alpha), 0, 1023).astype(np.int16)
+
+    header = ",".join(f"A{channel + 1}" for channel in range(num_channels))
+    np.savetxt(path, samples.T, fmt="%d", delimiter=",", header=header, comments="")
+    return num_samples
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process in megabytes, or None where it is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB on Linux
+
+
+def prepare_case(case, path, sampling_rate, complexity_sec):
+    """
+    Loads what a case needs outside of the timing.
+
+    :return: Tuple (run, samples) with the callable to time and the number of samples it processes.
+    """
+    from components.binary_cache import EEGBinaryCache
+    from components.data_loader import EEGDataLoader
+    from components.recording_store import RecordingStore
+    from components.result_cache import ResultCache
+
+    # Private stores and caches, so every run starts cold
+    store = RecordingStore(max_bytes=2 ** 40)
+    cache = ResultCache(max_bytes=2 ** 40)
+    data = EEGDataLoader(path, sampling_rate, use_cache=False, store=RecordingStore(max_bytes=2 ** 40),
+                         report_errors=False).load_data()
+    total = data.size
+
+    if case == "csv_load":
+        return lambda: EEGDataLoader(path, sampling_rate, use_cache=False, store=store,
+                                     report_errors=False).load_data(), total
+    if case == "binary_load":
+        binary_cache = EEGBinaryCache(cache_dir=os.path.join(os.path.dirname(path), ".cache"))
+        binary_cache.load_or_convert(path, sampling_rate)
+        # Opening the memory map is almost free; reading every sample is what a page pays for
+        return lambda: float(binary_cache.load_or_convert(path, sampling_rate)[0].sum(dtype=np.int64)), total
+    if case == "figure_build":
+        from components.visualizer import EEGVisualizer
+        duration = len(data) / sampling_rate
+
+        def run():
+            visualizer = EEGVisualizer(data, sampling_rate, recording_key=("benchmark",), store=store)
+            return visualizer.montage_figure(None, (0, duration)).to_json()
+        return run, total
+    if case == "cwt":
+        from components.wavelet_analyzer import EEGWaveletAnalyzer
+
+        def run():
+            for channel in data.columns:
+                EEGWaveletAnalyzer(data[channel].to_numpy(), sampling_rate, cache=cache,
+                                   single_precision=True).scalogram_pyramid()
+        return run, total
+    if case == "band_power":
+        from components.band_power import BandPowerAnalyzer
+        signals = np.ascontiguousarray(data.to_numpy().T)
+        return lambda: BandPowerAnalyzer(signals, sampling_rate, cache=cache, fingerprint="benchmark",
+                                         single_precision=True).calculate_band_powers(4, 1), total
+    if case == "preprocessing":
+        from components.preprocessing import EEGPreprocessor
+        signals = np.ascontiguousarray(data.to_numpy().T)
+        preprocessor = EEGPreprocessor(sampling_rate)
+        return lambda: preprocessor.artifact_mask(preprocessor.filter(signals)), total
+    if case == "windowed_entropy":
+        from components.entropy_analyzer import EntropyAnalyzer
+
+        def run():
+            for channel in data.columns:
+                EntropyAnalyzer(data[channel].to_numpy(), sampling_rate, cache=cache).calculate_entropies_in_windows(5)
+        return run, total
+    if case == "complexity":
+        import neurokit2  # noqa: F401  (imported here so its import time is not measured)
+        from components.complexity_analyzer import ComplexityAnalyzer
+        signal = data[data.columns[0]].to_numpy()[:int(complexity_sec * sampling_rate)]
+        return lambda: ComplexityAnalyzer(signal, cache=cache).calculate_complexity(), len(signal)
+    raise ValueError(f"Unknown benchmark case '{case}'.")
+
+
+def run_case(case, path, sampling_rate, complexity_sec):
+    """
+    Runs one case once in this process and prints its measurements as JSON (used by the child processes).
+    """
+    run, samples = prepare_case(case, path, sampling_rate, complexity_sec)
+    setup_rss = peak_rss_mb()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "samples": samples, "peak_rss_mb": peak_rss_mb(),
+                      "setup_rss_mb": setup_rss}))
+
+
+def measure(case, path, args):
+    """
+    Runs a case in a fresh process per repeat, so caches start cold and the peak RSS is the case's own.
+
+    :return: Dictionary with the median wall time, its relative spread over the repeats, the peak RSS and the
+             throughput.
+    """
+    runs = []
+    for _ in range(args.repeats):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", case, "--recording", path,
+                                 "--sampling-rate", str(args.sampling_rate),
+                                 "--complexity-sec", str(args.complexity_sec)],
+                                cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    seconds = [run["seconds"] for run in runs]
+    median = float(np.median(seconds))
+    rss = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    setup_rss = [run["setup_rss_mb"] for run in runs if run["setup_rss_mb"] is not None]
+    return {
+        "wall_seconds": median,
+        "wall_seconds_all": seconds,
+        # Range of the repeats relative to their median: the run-to-run noise of the case on this machine
+        "wall_noise": (max(seconds) - min(seconds)) / median if median > 0 else 0.0,
+        "peak_rss_mb": max(rss) if rss else None,
+        "setup_rss_mb": max(setup_rss) if setup_rss else None,
+        "samples": runs[0]["samples"],
+        "throughput_samples_per_s": runs[0]["samples"] / median if median > 0 else None,
+    }
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    Compares results with a baseline run. Wall times are medians over the repeats, and a wall time only
+    regresses when it grows past the larger of the threshold and NOISE_FACTOR times the run-to-run spread of
+    the case in the baseline, and by more than min_delta seconds, so that the noise of the machine is not
+    reported.
+
+    :return: List of (case, measure, baseline value, current value, allowed growth) tuples that regressed.
+    """
+    regressions = []
+    for case, result in results.items():
+        reference = baseline["results"].get(case)
+        if reference is None:
+            continue
+        for measure_name in ("wall_seconds", "peak_rss_mb"):
+            if result.get(measure_name) is None or reference.get(measure_name) is None:
+                continue
+            allowed = threshold
+            if measure_name == "wall_seconds":
+                if result[measure_name] - reference[measure_name] <= min_delta:
+                    continue
+                allowed = max(threshold, NOISE_FACTOR * reference.get("wall_noise", 0.0))
+            if result[measure_name] > reference[measure_name] * (1 + allowed):
+                regressions.append((case, measure_name, reference[measure_name], result[measure_name], allowed))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the loaders and analyzers on a synthetic EEG recording. Exits with status 1 when "
+                    "a measure regresses past the threshold relative to a baseline.")
+    parser.add_argument("--duration", type=float, default=60, help="Recording duration in seconds (default: 60).")
+    parser.add_argument("--channels", type=int, default=2, help="Number of channels (default: 2).")
+    parser.add_argument("--sampling-rate", type=int, default=1000, help="Sampling rate in Hz (default: 1000).")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES), help="Cases to run (default: all).")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Fresh processes per case, whose median wall time is reported (default: 5).")
+    parser.add_argument("--complexity-sec", type=float, default=10,
+                        help="Seconds of the first channel used for the complexity case (default: 10).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic recording (default: 0).")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="JSON file of an earlier run (--output) to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help=f"Allowed slowdown or memory growth relative to the baseline, raised for wall times "
+                             f"to {NOISE_FACTOR} times the spread of the baseline runs (default: 0.25, i.e. 25%%).")
+    parser.add_argument("--min-delta", type=float, default=0.02,
+                        help="Wall time growth in seconds below which no regression is reported (default: 0.02).")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--recording", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args.run_case, args.recording, args.sampling_rate, args.complexity_sec)
+        return 0
+
+    config = {"duration": args.duration, "channels": args.channels, "sampling_rate": args.sampling_rate,
+              "complexity_sec": args.complexity_sec, "seed": args.seed}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            parser.error(f"The baseline was recorded with another configuration: {baseline['config']}.")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.csv")
+        write_synthetic_recording(path, args.duration, args.channels, args.sampling_rate, args.seed)
+        print(f"{'case':<18} {'wall (s)':>9} {'noise':>7} {'peak RSS (MB)':>14} {'samples/s':>13}")
+        for case in args.cases:
+            results[case] = measure(case, path, args)
+            result = results[case]
+            rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+            print(f"{case:<18} {result['wall_seconds']:>9.3f} {result['wall_noise']:>7.0%} {rss:>14} "
+                  f"{result['throughput_samples_per_s']:>13,.0f}")
+
+    if args.output:
+        import numpy
+        import scipy
+        environment = {"python": platform.python_version(), "platform": platform.platform(),
+                       "numpy": numpy.__version__, "scipy": scipy.__version__, "cpus": os.cpu_count()}
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "environment": environment, "results": results}, f, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for case, measure_name, reference, current, allowed in regressions:
+        print(f"REGRESSION {case} {measure_name}: {reference:.3f} -> {current:.3f} "
+              f"(+{100 * (current / reference - 1):.0f}%, threshold {100 * allowed:.0f}%)")
+    if not regressions:
+        print(f"No regression past {100 * args.threshold:.0f}% (or {NOISE_FACTOR} times the noise of a case) "
+              f"relative to {args.baseline}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+# components/analysis_index.py
+
+import json
+import os
+import time
+import numpy as np
+from components.binary_cache import EEGBinaryCache
+from components.downsampler import ScalogramPyramid
+
+
+class AnalysisIndex:
+    """
+    Class to handle the precomputed analysis index of a recording, a compact sidecar of its binary cache entry.
+
+    The index is built once (see index_recordings.py) and holds, for every channel:
+    - per-second minimum, maximum, mean and RMS of the samples,
+    - the Shannon, Approximate and Sample entropies of the ENTROPY_WINDOW_SEC windows,
+    - the band powers (BandPowerAnalyzer, Welch) of BAND_WINDOW_SEC windows every BAND_HOP_SEC seconds,
+    - a coarse scalogram (SCALOGRAM_VOICES scales per octave, max-pooled over each second).
+
+    The pages plot whole-recording overviews from it without touching the samples, and seed_cache() stores
+    the entropies and band powers in the ResultCache under the keys the analyzers use, so the default views
+    of an indexed recording are read instead of computed. Only finer views (a zoomed range, other window
+    sizes or frequency bands) are computed at full resolution.
+    """
+
+    FORMAT_VERSION = 1
+    STATS = ("min", "max", "mean", "rms")
+    ENTROPY_WINDOW_SEC = 5
+    BAND_WINDOW_SEC = 4
+    BAND_HOP_SEC = 1
+    SCALOGRAM_BAND = (0.5, 100)
+    SCALOGRAM_VOICES = 4
+    STATS_BLOCK_SEC = 60  # Seconds of samples converted to float64 at once for the statistics
+
+    def __init__(self, meta, arrays):
+        """
+        Initializes the index from its metadata and arrays (use build() or load()).
+
+        :param meta: Dictionary with the format version, the source identity, the sampling rate, the channel
+                     names, the number of samples and the build time.
+        :param arrays: Dictionary of named numpy arrays.
+        """
+        self.meta = meta
+        self.arrays = arrays
+        self.channels = meta["channels"]
+        self.sampling_rate = meta["sampling_rate"]
+        self.num_samples = meta["samples"]
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the arrays of the index.
+        """
+        return sum(values.nbytes for values in self.arrays.values())
+
+    @staticmethod
+    def path(source_path, cache_dir=os.path.join("data", ".cache")):
+        """
+        Returns the path of the index of a source file, next to its binary cache entry.
+
+        :param source_path: Path of the source CSV file.
+        :param cache_dir: Directory of the binary cache (default: 'data/.cache').
+        :return: Path of the ``.index.npz`` file.
+        """
+        array_path, _ = EEGBinaryCache(cache_dir).paths(source_path)
+        return f"{os.path.splitext(array_path)[0]}.index.npz"
+
+    @classmethod
+    def second_stats(cls, signals, sampling_rate):
+        """
+        Computes the minimum, maximum, mean and RMS of every second of every channel.
+
+        :param signals: 2D array (channels x samples).
+        :param sampling_rate: Sampling rate in Hz; the last second may be partial.
+        :return: Dictionary mapping each of STATS to a float32 array of shape (channels, seconds).
+        """
+        num_channels, num_samples = signals.shape
+        num_seconds = -(-num_samples // sampling_rate)
+        stats = {name: np.empty((num_channels, num_seconds), dtype=np.float32) for name in cls.STATS}
+        for first in range(0, num_seconds, cls.STATS_BLOCK_SEC):
+            last = min(num_seconds, first + cls.STATS_BLOCK_SEC)
+            block = np.asarray(signals[:, first * sampling_rate:last * sampling_rate], dtype=np.float64)
+            edges = np.arange(0, block.shape[1], sampling_rate)
+            counts = np.diff(np.append(edges, block.shape[1]))
+            stats["min"][:, first:last] = np.minimum.reduceat(block, edges, axis=1)
+            stats["max"][:, first:last] = np.maximum.reduceat(block, edges, axis=1)
+            stats["mean"][:, first:last] = np.add.reduceat(block, edges, axis=1) / counts
+            stats["rms"][:, first:last] = np.sqrt(np.add.reduceat(block * block, edges, axis=1) / counts)
+        return stats
+
+    @classmethod
+    def build(cls, signals, channels, sampling_rate, source=None, progress=None):
+        """
+        Computes the index of a recording.
+
+        :param signals: 2D array (channels x samples), e.g. the memory map of EEGBinaryCache.
+        :param channels: Names of the channels.
+        :param sampling_rate: Sampling rate in Hz.
+        :param source: Identity of the source file (EEGBinaryCache.source_identity), used to detect stale indexes.
+        :param progress: Optional callable receiving the name of each step as it starts.
+        :return: AnalysisIndex.
+        """
+        # The analyzers are only needed to build an index, not to read one
+        from components.band_power import BandPowerAnalyzer
+        from components.entropy_analyzer import EntropyAnalyzer
+        from components.result_cache import ResultCache
+        from components.wavelet_analyzer import EEGWaveletAnalyzer
+
+        progress = progress or (lambda step: None)
+        started = time.perf_counter()
+        cache = ResultCache()  # Private, so building an index does not evict the results of the pages
+        channels = [str(channel) for channel in channels]
+
+        progress("statistics")
+        arrays = cls.second_stats(signals, sampling_rate)
+
+        progress("entropy")
+        entropies = EntropyAnalyzer(signals, sampling_rate, cache=cache, channel=channels) \
+            .calculate_entropies_in_windows(cls.ENTROPY_WINDOW_SEC)
+        metrics = EntropyAnalyzer.ENTROPY_METRICS
+        num_windows = signals.shape[1] // int(cls.ENTROPY_WINDOW_SEC * sampling_rate)
+        arrays["entropy"] = np.array([[[window[metric] for metric in metrics] for window in channel_windows]
+                                      for channel_windows in entropies], dtype=np.float64) \
+            .reshape(len(channels), num_windows, len(metrics))
+
+        progress("band power")
+        band_analyzer = BandPowerAnalyzer(signals, sampling_rate, cache=cache, single_precision=True)
+        _, arrays["band_power"] = band_analyzer.calculate_band_powers(cls.BAND_WINDOW_SEC, cls.BAND_HOP_SEC)
+
+        progress("scalogram")
+        wavelet_analyzer = EEGWaveletAnalyzer(signals, sampling_rate, *cls.SCALOGRAM_BAND, cache=cache,
+                                              single_precision=True, voices_per_octave=cls.SCALOGRAM_VOICES)
+        pyramids = wavelet_analyzer.scalogram_pyramid(base_bucket=sampling_rate)
+        arrays["scalogram"] = np.stack([pyramid.base_columns() for pyramid in pyramids])
+        arrays["scalogram_frequencies"] = np.asarray(wavelet_analyzer.frequencies, dtype=np.float64)
+
+        meta = {"version": cls.FORMAT_VERSION, "source": source, "sampling_rate": sampling_rate,
+                "channels": channels, "samples": int(signals.shape[1]), "bands": band_analyzer.bands,
+                "build_seconds": time.perf_counter() - started}
+        return cls(meta, arrays)
+
+    @classmethod
+    def build_for_file(cls, source_path, sampling_rate=1000, cache_dir=os.path.join("data", ".cache"),
+                       progress=None):
+        """
+        Builds the index of a CSV file (converting it to the binary cache first if needed) and saves it.
+
+        :param source_path: Path of the source CSV file.
+        :param sampling_rate: Sampling rate in Hz (default: 1000).
+        :param cache_dir: Directory of the binary cache and of the index (default: 'data/.cache').
+        :param progress: Optional callable receiving the name of each step as it starts.
+        :return: AnalysisIndex.
+        """
+        source = EEGBinaryCache.source_identity(source_path)
+        signals, header = EEGBinaryCache(cache_dir).load_or_convert(source_path, sampling_rate)
+        index = cls.build(signals, header["channels"], sampling_rate, source, progress)
+        index.save(cls.path(source_path, cache_dir))
+        return index
+
+    def save(self, path):
+        """
+        Writes the index to a ``.npz`` file, atomically.
+
+        :param path: Path of the file.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(self.meta)), **self.arrays)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, source_path, cache_dir=os.path.join("data", ".cache")):
+        """
+        Opens the index of a source file if it exists and is up to date.
+
+        :param source_path: Path of the source CSV file.
+        :param cache_dir: Directory of the binary cache and of the index (default: 'data/.cache').
+        :return: AnalysisIndex, or None if there is no valid index.
+        """
+        try:
+            with np.load(cls.path(source_path, cache_dir), allow_pickle=False) as stored:
+                meta = json.loads(str(stored["meta"]))
+                arrays = {name: stored[name] for name in stored.files if name != "meta"}
+            source = EEGBinaryCache.source_identity(source_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        if meta.get("version") != cls.FORMAT_VERSION or meta.get("source") != source:
+            return None
+        return cls(meta, arrays)
+
+    def envelope(self, rows, start_idx, end_idx, max_points):
+        """
+        Returns the per-second min/max envelope of a range, in the format of MontagePyramid.query(), when
+        seconds are fine enough for the requested number of points.
+
+        :param rows: Indices of the channels.
+        :param start_idx: First sample of the range.
+        :param end_idx: End sample (exclusive) of the range.
+        :param max_points: Maximum number of points per channel, usually twice the plot width in pixels.
+        :return: Tuple (x0, dx, values) with (min, max) pairs of buckets of whole seconds, or None when the
+                 range needs a finer resolution than one second.
+        """
+        start_idx, end_idx = max(0, start_idx), min(self.num_samples, end_idx)
+        bucket_needed = -(-2 * (end_idx - start_idx) // max(1, max_points))
+        if end_idx <= start_idx or bucket_needed < self.sampling_rate:
+            return None
+        seconds = -(-bucket_needed // self.sampling_rate)
+        bucket = seconds * self.sampling_rate
+        first, last = start_idx // bucket, -(-end_idx // bucket)
+        rows = np.asarray(rows, dtype=np.intp)
+        minima = self.arrays["min"][rows, first * seconds:last * seconds]
+        maxima = self.arrays["max"][rows, first * seconds:last * seconds]
+        edges = np.arange(0, minima.shape[1], seconds)
+        values = np.empty((len(rows), 2 * len(edges)), dtype=np.float32)
+        values[:, 0::2] = np.minimum.reduceat(minima, edges, axis=1)
+        values[:, 1::2] = np.maximum.reduceat(maxima, edges, axis=1)
+        return first * bucket, bucket / 2, values
+
+    def entropies(self, channel):
+        """
+        Returns the indexed window entropies of a channel, as EntropyAnalyzer.calculate_entropies_in_windows().
+
+        :param channel: Name of the channel.
+        :return: List of dictionaries with the entropy values of each ENTROPY_WINDOW_SEC window.
+        """
+        from components.entropy_analyzer import EntropyAnalyzer
+        values = self.arrays["entropy"][self.channels.index(channel)]
+        return [dict(zip(EntropyAnalyzer.ENTROPY_METRICS, map(float, window))) for window in values]
+
+    def band_powers(self, channel):
+        """
+        Returns the indexed band powers of a channel, as BandPowerAnalyzer.calculate_band_powers().
+
+        :param channel: Name of the channel.
+        :return: Tuple (times, powers) with the start of every window in seconds and the (windows, bands) powers.
+        """
+        powers = self.arrays["band_power"][self.channels.index(channel)]
+        return np.arange(len(powers)) * float(self.BAND_HOP_SEC), powers
+
+    def scalogram_pyramid(self, channel):
+        """
+        Returns the coarse scalogram of a channel as a ScalogramPyramid with one column per second.
+
+        :param channel: Name of the channel.
+        :return: Tuple (pyramid, frequencies).
+        """
+        columns = self.arrays["scalogram"][self.channels.index(channel)]
+        pyramid = ScalogramPyramid.from_columns(columns, self.sampling_rate, self.num_samples)
+        return pyramid, self.arrays["scalogram_frequencies"]
+
+    def seed_cache(self, cache, fingerprint, signals):
+        """
+        Stores the indexed entropies and band powers in a ResultCache under the keys the analyzers use for the
+        windows of the default views, so the pages read them instead of computing them.
+
+        :param cache: ResultCache to fill (usually ResultCache.shared()).
+        :param fingerprint: Fingerprint of the recording (ResultCache.recording_fingerprint).
+        :param signals: 2D array (channels x samples) of the recording, whose window spans the keys describe.
+        """
+        from components.band_power import BandPowerAnalyzer
+        from components.entropy_analyzer import EntropyAnalyzer
+
+        window_size = int(self.ENTROPY_WINDOW_SEC * self.sampling_rate)
+        for row, channel in enumerate(self.channels):
+            for i, values in enumerate(self.arrays["entropy"][row]):
+                window = signals[row, i * window_size:(i + 1) * window_size]
+                cache.put(EntropyAnalyzer.window_key(cache, fingerprint, channel, 0, i, window_size, window),
+                          values.copy())
+            analyzer = BandPowerAnalyzer(signals[row], self.sampling_rate, cache=cache, fingerprint=fingerprint,
+                                         channel=channel, bands=self.meta["bands"], single_precision=True)
+            cache.put(analyzer.result_key(self.BAND_WINDOW_SEC, self.BAND_HOP_SEC),
+                      self.arrays["band_power"][row:row + 1].copy())
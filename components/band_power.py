@@ -0,0 +1,261 @@
+# components/band_power.py
+
+import numpy as np
+import scipy.fft
+import scipy.signal
+from components.profiler import Stage
+from components.result_cache import ResultCache
+
+
+class BandPowerAnalyzer:
+    """
+    Class to compute the power of the EEG frequency bands (delta to gamma) over sliding windows.
+
+    The power spectral density of every window is estimated at once from a strided (zero-copy) matrix of the
+    signal with a batched real FFT, either with Welch's method (averaged periodograms of Hann-tapered,
+    half-overlapping segments) or with the multitaper method (averaged periodograms of DPSS tapers). Band
+    powers are the PSD integrated over each band, computed as one matrix product with a (frequencies x
+    bands) weight matrix, so the PSDs of whole blocks of windows never have to be kept.
+
+    Band power is linear in the PSD, so for Welch's method the band powers of each segment of the recording
+    are computed once and every window averages those of the segments it holds; overlapping windows do not
+    transform their shared segments again. Window hops are rounded to a multiple of the segment hop so that
+    each window holds whole segments, which makes the results equal to ``scipy.signal.welch`` on the window.
+
+    The signal can also be a (channels x samples) array, in which case every channel is computed in the
+    same batches and the results gain a leading channel axis.
+    """
+
+    BANDS = {"Delta": (0.5, 4), "Theta": (4, 8), "Alpha": (8, 13), "Beta": (13, 30), "Gamma": (30, 100)}
+    RATIOS = (("Theta", "Beta"), ("Alpha", "Theta"), ("Delta", "Alpha"))
+    METHODS = ("welch", "multitaper")
+    BLOCK_MAX_MB = 32  # Bound on the tapered samples transformed in one batch
+
+    def __init__(self, signal, sampling_rate=1000, cache=None, fingerprint=None, channel=None, offset=0,
+                 bands=None, single_precision=False):
+        """
+        Initializes the analyzer with the signal to be analyzed.
+
+        :param signal: The EEG signal (1D array) to analyze, or a (channels x samples) array of several channels.
+        :param sampling_rate: Sampling rate of the signal (default: 1000 Hz).
+        :param cache: ResultCache memoizing the band powers (default: the process-wide cache).
+        :param fingerprint: Fingerprint of the recording the signal comes from (ResultCache.recording_fingerprint).
+                            Without it, results are identified by a hash of the analyzed samples.
+        :param channel: Name of the channel the signal comes from (a list of names for several channels).
+        :param offset: Position of the first sample of the signal within the recording.
+        :param bands: Dictionary mapping band names to (low, high) frequencies in Hz (default: BANDS).
+        :param single_precision: If True, compute the spectra in float32, which about halves their time
+                                 (default: False).
+        """
+        self.signal = np.asarray(signal)
+        self.sampling_rate = sampling_rate
+        self.cache = cache if cache is not None else ResultCache.shared()
+        self.fingerprint = fingerprint
+        self.channel = channel
+        self.offset = offset
+        self.bands = dict(bands or self.BANDS)
+        self.dtype = np.float32 if single_precision else np.float64
+
+    def band_weights(self, num_samples, scale):
+        """
+        Returns the matrix integrating a two-sided power spectrum into the band powers of a one-sided PSD.
+
+        :param num_samples: Length of the transformed segments.
+        :param scale: Density scaling of the periodogram (1 / (sampling rate * sum of the squared taper)).
+        :return: Array of shape (frequencies, bands); bins with low <= f < high count in a band.
+        """
+        frequencies = scipy.fft.rfftfreq(num_samples, 1 / self.sampling_rate)
+        # Every bin but DC and Nyquist stands for its negative frequency too
+        one_sided = np.full(len(frequencies), 2.0)
+        one_sided[0] = 1.0
+        if num_samples % 2 == 0:
+            one_sided[-1] = 1.0
+        resolution = self.sampling_rate / num_samples
+        weights = np.zeros((len(frequencies), len(self.bands)))
+        for column, (low, high) in enumerate(self.bands.values()):
+            inside = (frequencies >= low) & (frequencies < high)
+            weights[inside, column] = one_sided[inside] * scale * resolution
+        return weights
+
+    def _iter_segment_powers(self, segments, tapers, weights):
+        """
+        Yields the band powers of the periodograms of strided segments, averaged over the tapers, one block of
+        segments at a time. Every taper of a block is applied and transformed in one batched real FFT.
+
+        :param segments: Array of shape (channels, count, length), typically a strided view of the signal.
+        :param tapers: Array of shape (tapers, length).
+        :param weights: Band weights from band_weights(), with the 1 / tapers average folded in.
+        :return: Generator of tuples (start, powers) where powers has shape (channels, block, bands) and holds
+                 the band powers of the segments from start on.
+        """
+        num_channels, count, length = segments.shape
+        # Only the bins up to the highest band are squared and integrated
+        num_bins = int(np.flatnonzero(weights.any(axis=1)).max(initial=0)) + 1
+        weights = weights[:num_bins].astype(self.dtype)
+        tapers = tapers.astype(self.dtype)
+        taper_spectra = scipy.fft.rfft(tapers, axis=-1)[:, :num_bins]
+        rows = max(1, int(self.BLOCK_MAX_MB * 1024 ** 2
+                          / (np.dtype(self.dtype).itemsize * num_channels * len(tapers) * length)))
+        for start in range(0, count, rows):
+            block = segments[:, start:start + rows]
+            means = block.mean(axis=-1, keepdims=True, dtype=self.dtype)
+            # (channels, segments, tapers, length) tapered copies of the block
+            tapered = np.multiply(block[:, :, np.newaxis], tapers, dtype=self.dtype)
+            coefficients = scipy.fft.rfft(tapered, axis=-1, workers=-1)[..., :num_bins]
+            del tapered
+            # Removing the mean of the segments (constant detrend, as in scipy.signal.welch) only subtracts
+            # the spectrum of the taper scaled by the mean
+            coefficients -= (means[..., np.newaxis] * taper_spectra).astype(coefficients.dtype)
+            spectrum = (coefficients.real ** 2 + coefficients.imag ** 2).sum(axis=2)
+            yield start, spectrum @ weights
+
+    def _segment_powers(self, segments, tapers, weights):
+        """
+        Returns the band powers of the periodograms of strided segments, averaged over the tapers
+        (see _iter_segment_powers).
+
+        :return: Array of shape (channels, count, bands).
+        """
+        powers = np.empty(segments.shape[:2] + (weights.shape[1],))
+        for start, block in self._iter_segment_powers(segments, tapers, weights):
+            powers[:, start:start + block.shape[1]] = block
+        return powers
+
+    def _sizes(self, window_sec, hop_sec, method, segment_sec):
+        """
+        Returns the window, hop, segment and segment hop sizes in samples (see calculate_band_powers).
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown band power method '{method}'.")
+        window_size = int(window_sec * self.sampling_rate)
+        segment_size = min(window_size, int(segment_sec * self.sampling_rate))
+        segment_hop = max(1, segment_size // 2)
+        hop_size = max(1, int(hop_sec * self.sampling_rate))
+        if method == "welch":
+            hop_size = max(segment_hop, round(hop_size / segment_hop) * segment_hop)
+        return window_size, hop_size, segment_size, segment_hop
+
+    def result_key(self, window_sec=4, hop_sec=1, method="welch", segment_sec=1, bandwidth=2):
+        """
+        Returns the ResultCache key of the band powers computed with the given parameters
+        (see calculate_band_powers), e.g. to store results computed elsewhere.
+
+        :return: Hexadecimal key.
+        """
+        window_size, hop_size, segment_size, _ = self._sizes(window_sec, hop_sec, method, segment_sec)
+        params = {"analysis": "band_power", "method": method, "window_size": window_size, "hop_size": hop_size,
+                  "segment_size": segment_size, "bandwidth": bandwidth, "bands": self.bands,
+                  "sampling_rate": self.sampling_rate, "samples": self.signal.shape[-1],
+                  "dtype": np.dtype(self.dtype).str}
+        return self.cache.analysis_key(self.signal, params, self.fingerprint, self.channel, self.offset)
+
+    @Stage("transform")
+    def calculate_band_powers(self, window_sec=4, hop_sec=1, method="welch", segment_sec=1, bandwidth=2):
+        """
+        Calculates the absolute power of every band in sliding windows over the whole signal.
+
+        :param window_sec: Window length in seconds (default: 4).
+        :param hop_sec: Time between the starts of consecutive windows in seconds (default: 1). With Welch's
+                        method it is rounded to a multiple of half the segment length.
+        :param method: "welch" or "multitaper" (default: "welch").
+        :param segment_sec: Length of the Welch segments in seconds, at most the window (default: 1).
+        :param bandwidth: Full frequency resolution 2W of the multitaper estimate in Hz (default: 2); it uses
+                          the 2NW - 1 DPSS tapers of time-halfbandwidth NW = W * window_sec.
+        :return: Tuple (times, powers) with the start of every window in seconds, and an array of shape
+                 (windows, bands) (or (channels, windows, bands)) of band powers in squared signal units,
+                 with the bands in the order of self.bands.
+        """
+        window_size, hop_size, segment_size, segment_hop = self._sizes(window_sec, hop_sec, method, segment_sec)
+        key = self.result_key(window_sec, hop_sec, method, segment_sec, bandwidth)
+
+        def compute():
+            signals = self.signal.reshape(-1, self.signal.shape[-1])
+            total = signals.shape[-1]
+            num_windows = (total - window_size) // hop_size + 1 if total >= window_size else 0
+            if not num_windows:
+                return np.empty((signals.shape[0], 0, len(self.bands)))
+
+            if method == "welch":
+                taper = scipy.signal.get_window("hann", segment_size)
+                weights = self.band_weights(segment_size, 1 / (self.sampling_rate * np.sum(taper ** 2)))
+                segments = np.lib.stride_tricks.sliding_window_view(signals, segment_size, axis=-1)[:, ::segment_hop]
+                segment_powers = self._segment_powers(segments, taper[np.newaxis], weights)
+                # Each window averages the segment powers of its own segments, from a running sum
+                per_window = (window_size - segment_size) // segment_hop + 1
+                running = np.concatenate([np.zeros_like(segment_powers[:, :1]), np.cumsum(segment_powers, axis=1)],
+                                         axis=1)
+                first = np.arange(num_windows) * (hop_size // segment_hop)
+                return (running[:, first + per_window] - running[:, first]) / per_window
+
+            return self._segment_powers(*self._multitaper(signals, window_size, hop_size, bandwidth))
+
+        powers = self.cache.get_or_compute(key, compute)
+        times = (self.offset + np.arange(powers.shape[1]) * hop_size) / self.sampling_rate
+        return times, powers if self.signal.ndim == 2 else powers[0]
+
+    def iter_band_powers(self, window_sec=4, hop_sec=1, method="welch", segment_sec=1, bandwidth=2):
+        """
+        Calculates the band powers like calculate_band_powers(), yielding the windows computed so far. Multitaper
+        estimates, several times slower than Welch's, are computed one block of windows at a time; Welch's
+        method and cached results are yielded at once.
+
+        :return: Generator of tuples (times, powers, progress) where powers holds NaN for the windows not computed
+                 yet and progress is the fraction of the windows done; the last powers are the result.
+        """
+        window_size, hop_size, _, _ = self._sizes(window_sec, hop_sec, method, segment_sec)
+        key = self.result_key(window_sec, hop_sec, method, segment_sec, bandwidth)
+        signals = self.signal.reshape(-1, self.signal.shape[-1])
+        total = signals.shape[-1]
+        num_windows = (total - window_size) // hop_size + 1 if total >= window_size else 0
+        if method != "multitaper" or not num_windows or self.cache.get(key) is not None:
+            times, powers = self.calculate_band_powers(window_sec, hop_sec, method, segment_sec, bandwidth)
+            yield times, powers, 1.0
+            return
+
+        times = (self.offset + np.arange(num_windows) * hop_size) / self.sampling_rate
+        powers = np.full((signals.shape[0], num_windows, len(self.bands)), np.nan)
+        for start, block in self._iter_segment_powers(*self._multitaper(signals, window_size, hop_size, bandwidth)):
+            stop = start + block.shape[1]
+            powers[:, start:stop] = block
+            partial = powers.copy() if stop < num_windows else powers
+            yield times, partial if self.signal.ndim == 2 else partial[0], stop / num_windows
+        self.cache.put(key, powers)
+
+    def _multitaper(self, signals, window_size, hop_size, bandwidth):
+        """
+        Returns the windows, DPSS tapers and band weights of a multitaper estimate (see calculate_band_powers).
+        """
+        half_bandwidth = bandwidth / 2 * window_size / self.sampling_rate
+        num_tapers = max(1, int(2 * half_bandwidth) - 1)
+        tapers = np.atleast_2d(scipy.signal.windows.dpss(window_size, half_bandwidth, num_tapers))
+        weights = self.band_weights(window_size, 1 / (self.sampling_rate * num_tapers))
+        windows = np.lib.stride_tricks.sliding_window_view(signals, window_size, axis=-1)[:, ::hop_size]
+        return windows, tapers, weights
+
+    @staticmethod
+    def relative_powers(powers):
+        """
+        Returns the band powers as fractions of the total power of the bands of each window.
+
+        :param powers: Band powers from calculate_band_powers().
+        :return: Array of the same shape (NaN where the powers are not computed yet, see iter_band_powers).
+        """
+        total = powers.sum(axis=-1, keepdims=True)
+        return np.divide(powers, total, out=np.where(np.isnan(total), np.nan, np.zeros_like(powers)),
+                         where=total > 0)
+
+    def band_ratios(self, powers, pairs=RATIOS):
+        """
+        Returns ratios of band powers, such as the theta/beta ratio.
+
+        :param powers: Band powers from calculate_band_powers().
+        :param pairs: Pairs (numerator band, denominator band) (default: RATIOS).
+        :return: Dictionary mapping "numerator/denominator" names to arrays of the window ratios.
+        """
+        names = list(self.bands)
+        ratios = {}
+        for numerator, denominator in pairs:
+            below = powers[..., names.index(denominator)]
+            ratios[f"{numerator}/{denominator}"] = np.divide(powers[..., names.index(numerator)], below,
+                                                             out=np.full_like(below, np.nan), where=below > 0)
+        return ratios
@@ -0,0 +1,251 @@
+# components/batch_processor.py
+
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from components.complexity_analyzer import ComplexityAnalyzer
+from components.data_loader import EEGDataLoader
+from components.downsampler import MinMaxPyramid
+from components.entropy_analyzer import EntropyAnalyzer
+from components.result_cache import ResultCache
+from components.wavelet_analyzer import EEGWaveletAnalyzer
+
+
+def _analyze_file(path, output_base, analyses, output_format, options):
+    """
+    Worker task: run the selected analyses on one recording and write one table per analysis.
+
+    :return: Tuple (outputs, num_samples) with the written paths and the number of samples analyzed.
+    """
+    loader = EEGDataLoader(os.path.abspath(path), options["sampling_rate"], use_cache=options["binary_cache"],
+                           report_errors=False)
+    data = loader.load_data()
+    if data is None:
+        raise ValueError(loader.error)
+    sampling_rate = options["sampling_rate"]
+    fingerprint = ResultCache.recording_fingerprint(loader.recording_key)
+
+    tables = {}
+    for analysis in analyses:
+        rows = []
+        for channel in loader.get_channels():
+            signal = data[channel].to_numpy()
+            if analysis == "visualization":
+                positions, values = MinMaxPyramid(signal).query(0, len(signal), 2 * options["columns"])
+                rows.append(pd.DataFrame({"channel": channel, "time": positions / sampling_rate, "value": values}))
+            elif analysis == "wavelet":
+                analyzer = EEGWaveletAnalyzer(signal, sampling_rate, options["min_freq"], options["max_freq"],
+                                              fingerprint=fingerprint, channel=channel, single_precision=True,
+                                              fft_workers=1)  # The pool already runs one file per CPU
+                positions, values = analyzer.scalogram_pyramid().query(0, len(signal), options["columns"])
+                rows.append(pd.DataFrame({
+                    "channel": channel,
+                    "time": np.tile(positions / sampling_rate, len(analyzer.frequencies)),
+                    "frequency": np.repeat(analyzer.frequencies, len(positions)),
+                    "magnitude": values.ravel(),
+                }))
+            elif analysis == "entropy":
+                analyzer = EntropyAnalyzer(signal, sampling_rate, fingerprint=fingerprint, channel=channel)
+                windows = pd.DataFrame(analyzer.calculate_entropies_in_windows(options["window_sec"]))
+                windows.insert(0, "start_time", np.arange(len(windows)) * options["window_sec"])
+                windows.insert(0, "channel", channel)
+                rows.append(windows)
+            elif analysis == "complexity":
+                results, _ = ComplexityAnalyzer(signal, fingerprint=fingerprint, channel=channel).calculate_complexity()
+                results = results.copy()
+                results.insert(0, "channel", channel)
+                rows.append(results)
+        tables[analysis] = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+    os.makedirs(os.path.dirname(output_base) or ".", exist_ok=True)
+    outputs = []
+    if output_format == "npz":
+        arrays = {}
+        for analysis, table in tables.items():
+            for column in table.columns:
+                values = table[column].to_numpy()
+                # Text columns are stored as fixed-width strings so loading does not need pickle
+                arrays[f"{analysis}.{column}"] = values.astype(str) if values.dtype == object else values
+        outputs.append(f"{output_base}.npz")
+        with open(f"{outputs[-1]}.tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(f"{outputs[-1]}.tmp", outputs[-1])
+    else:
+        for analysis, table in tables.items():
+            outputs.append(f"{output_base}.{analysis}.parquet")
+            table.to_parquet(f"{outputs[-1]}.tmp", index=False)
+            os.replace(f"{outputs[-1]}.tmp", outputs[-1])
+    return outputs, len(data) * len(data.columns)
+
+
+class BatchProcessor:
+    """
+    Class to run the analyses of the platform over every recording of a directory, without Streamlit.
+
+    Files are spread over a process pool, one task per file. Each finished file is appended to a
+    completion manifest (manifest.jsonl in the output directory) together with the identity of its source
+    (size and modification time), so a restarted run skips the files that are already done and unchanged.
+    """
+
+    ANALYSES = ("visualization", "wavelet", "entropy", "complexity")
+    FORMATS = ("npz", "parquet")
+    MANIFEST = "manifest.jsonl"
+
+    def __init__(self, input_dir, output_dir, analyses=("visualization", "wavelet", "entropy"), output_format="npz",
+                 max_workers=None, pattern="**/*.csv", sampling_rate=1000, window_sec=5, min_freq=0.5, max_freq=100,
+                 columns=2000, binary_cache=False):
+        """
+        Initializes the processor.
+
+        :param input_dir: Directory with the CSV recordings.
+        :param output_dir: Directory of the results and of the manifest.
+        :param analyses: Analyses to run, among ANALYSES (default: visualization, wavelet and entropy).
+        :param output_format: "npz" (one file per recording) or "parquet" (one file per recording and
+                              analysis, needs pyarrow or fastparquet) (default: "npz").
+        :param max_workers: Number of worker processes (default: the number of CPUs).
+        :param pattern: Glob pattern of the recordings, relative to input_dir (default: "**/*.csv").
+        :param sampling_rate: Sampling rate of the recordings (default: 1000 Hz).
+        :param window_sec: Entropy window size in seconds (default: 5).
+        :param min_freq: Lowest frequency of the scalogram in Hz (default: 0.5).
+        :param max_freq: Highest frequency of the scalogram in Hz (default: 100).
+        :param columns: Number of time points kept for the envelope and the scalogram (default: 2000).
+        :param binary_cache: Whether to keep binary copies of the recordings in data/.cache (default: False).
+        """
+        unknown = set(analyses) - set(self.ANALYSES)
+        if unknown:
+            raise ValueError(f"Unknown analyses: {', '.join(sorted(unknown))}.")
+        if output_format not in self.FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'.")
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.analyses = list(analyses)
+        self.output_format = output_format
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pattern = pattern
+        self.options = {"sampling_rate": sampling_rate, "window_sec": window_sec, "min_freq": min_freq,
+                        "max_freq": max_freq, "columns": columns, "binary_cache": binary_cache}
+
+    def discover(self):
+        """
+        Returns the recordings to analyze.
+
+        :return: Sorted list of paths relative to input_dir.
+        """
+        paths = glob.glob(os.path.join(self.input_dir, self.pattern), recursive=True)
+        return sorted(os.path.relpath(path, self.input_dir) for path in paths if os.path.isfile(path))
+
+    def _identity(self, relative_path):
+        stat = os.stat(os.path.join(self.input_dir, relative_path))
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def _settings(self):
+        return {"analyses": sorted(self.analyses), "format": self.output_format, "options": self.options}
+
+    def load_manifest(self):
+        """
+        Reads the completion manifest.
+
+        :return: Dictionary mapping relative paths to their latest manifest entry.
+        """
+        entries = {}
+        try:
+            with open(os.path.join(self.output_dir, self.MANIFEST)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short by an interrupted run
+                    entries[entry["file"]] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def pending(self, files):
+        """
+        Returns the files that still need to be analyzed: new, changed, analyzed with other settings, or
+        whose outputs are missing.
+
+        :param files: Relative paths from discover().
+        :return: List of relative paths.
+        """
+        manifest = self.load_manifest()
+        settings = self._settings()
+        remaining = []
+        for relative_path in files:
+            entry = manifest.get(relative_path)
+            done = (entry is not None and entry["source"] == self._identity(relative_path)
+                    and entry["settings"] == settings and all(os.path.exists(path) for path in entry["outputs"]))
+            if not done:
+                remaining.append(relative_path)
+        return remaining
+
+    def _record(self, entry):
+        """
+        Appends an entry to the manifest, flushed to disk so it survives an interruption.
+        """
+        with open(os.path.join(self.output_dir, self.MANIFEST), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run(self, progress=print):
+        """
+        Analyzes every pending recording.
+
+        :param progress: Callable receiving one line of text per finished file (default: print).
+        :return: Dictionary with the number of files done, skipped and failed, the samples analyzed and the
+                 elapsed time in seconds.
+        """
+        if self.output_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                try:
+                    import fastparquet  # noqa: F401
+                except ImportError:
+                    raise ImportError("Parquet output needs pyarrow or fastparquet; use the npz format instead.")
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        files = self.discover()
+        todo = self.pending(files)
+        summary = {"done": 0, "skipped": len(files) - len(todo), "failed": 0, "samples": 0, "seconds": 0.0}
+        if not todo:
+            return summary
+
+        started = time.monotonic()
+        settings = self._settings()
+        # Worker processes are spawned rather than forked, as in ParallelEntropyExecutor
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(todo)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {}
+            for relative_path in todo:
+                output_base = os.path.join(self.output_dir, os.path.splitext(relative_path)[0])
+                future = pool.submit(_analyze_file, os.path.join(self.input_dir, relative_path), output_base,
+                                     self.analyses, self.output_format, self.options)
+                futures[future] = (relative_path, self._identity(relative_path))
+
+            for count, future in enumerate(as_completed(futures), start=1):
+                relative_path, identity = futures[future]
+                try:
+                    outputs, num_samples = future.result()
+                except Exception as error:
+                    summary["failed"] += 1
+                    progress(f"[{count}/{len(todo)}] {relative_path}: failed ({error})")
+                    continue
+                self._record({"file": relative_path, "source": identity, "settings": settings,
+                              "outputs": outputs, "samples": num_samples, "finished": time.time()})
+                summary["done"] += 1
+                summary["samples"] += num_samples
+
+                elapsed = time.monotonic() - started
+                remaining = (len(todo) - count) * elapsed / count
+                progress(f"[{count}/{len(todo)}] {relative_path} | {summary['done'] / elapsed:.2f} files/s, "
+                         f"{summary['samples'] / elapsed:,.0f} samples/s, ETA {remaining:.0f} s")
+
+        summary["seconds"] = time.monotonic() - started
+        return summary
@@ -0,0 +1,161 @@
+# components/binary_cache.py
+
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from components.csv_ingest import CSVIngestor
+
+
+class EEGBinaryCache:
+    """
+    Class to handle the on-disk binary cache of EEG recordings.
+
+    Each CSV recording is converted once into a channel-major ``.npy`` array (one contiguous row per
+    channel) plus a small JSON header with the sampling rate, the channel names and the identity of the
+    source file. Later loads open the array as a read-only memory map, so no samples are parsed or copied.
+    The conversion streams the CSV file into the array in chunks (see CSVIngestor), so very large recordings
+    are converted in bounded memory.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, cache_dir=os.path.join("data", ".cache"), ingestor=None):
+        """
+        Initializes the cache in the given directory.
+
+        :param cache_dir: Directory where the binary arrays and headers are stored (default: 'data/.cache').
+        :param ingestor: CSVIngestor converting the CSV files (default: chunked parsing with the settings of the
+                         EEG_CSV_ENGINE, EEG_CSV_WORKERS and EEG_CSV_CHUNK_MB environment variables).
+        """
+        self.cache_dir = cache_dir
+        if ingestor is None:
+            ingestor = CSVIngestor(engine=os.environ.get("EEG_CSV_ENGINE", "auto"),
+                                   max_workers=int(os.environ.get("EEG_CSV_WORKERS", 0)) or None,
+                                   chunk_mb=float(os.environ.get("EEG_CSV_CHUNK_MB", 16)))
+        self.ingestor = ingestor
+        self.last_ingest = None  # Statistics of the last conversion done by this instance
+
+    def paths(self, source_path):
+        """
+        Returns the paths of the binary array and the header for a source file.
+
+        :param source_path: Path of the source CSV file.
+        :return: Tuple (array_path, header_path).
+        """
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+        return (os.path.join(self.cache_dir, f"{stem}.npy"),
+                os.path.join(self.cache_dir, f"{stem}.json"))
+
+    @staticmethod
+    def source_identity(source_path):
+        """
+        Returns the identity of a source file, used to invalidate stale cache entries.
+
+        :param source_path: Path of the source file.
+        :return: Dictionary with the modification time (ns) and the size (bytes) of the file.
+        """
+        stat = os.stat(source_path)
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def load(self, source_path):
+        """
+        Opens the cached array for a source file if it exists and is up to date.
+
+        :param source_path: Path of the source CSV file.
+        :return: Tuple (signals, header) where signals is a read-only (channels x samples) memory map,
+                 or None if there is no valid cache entry.
+        """
+        array_path, header_path = self.paths(source_path)
+        try:
+            with open(header_path, "r") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (header.get("version") != self.FORMAT_VERSION
+                or header.get("source") != self.source_identity(source_path)):
+            return None
+
+        try:
+            signals = np.load(array_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if signals.shape != (len(header["channels"]), header["samples"]):
+            return None
+        return signals, header
+
+    def ingest(self, source_path, sampling_rate):
+        """
+        Converts a CSV file into the binary layout chunk by chunk (see CSVIngestor), without holding the whole
+        file in memory, and writes it next to its header.
+
+        :param source_path: Path of the source CSV file.
+        :param sampling_rate: Sampling rate of the recording in Hz.
+        :return: Tuple (signals, header) with the stored (channels x samples) memory map and its header, which
+                 also holds the ingestion statistics (bytes, seconds, MB/s) under "ingest".
+        """
+        array_path, header_path = self.paths(source_path)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        identity = self.source_identity(source_path)
+
+        # Write to temporary files first so a concurrent reader never sees a partial entry
+        try:
+            channels, stats = self.ingestor.ingest(source_path, f"{array_path}.tmp")
+            os.replace(f"{array_path}.tmp", array_path)
+        finally:
+            if os.path.exists(f"{array_path}.tmp"):
+                os.remove(f"{array_path}.tmp")
+        signals = np.load(array_path, mmap_mode="r")
+        header = {
+            "version": self.FORMAT_VERSION,
+            "source": identity,
+            "sampling_rate": sampling_rate,
+            "channels": channels,
+            "samples": signals.shape[1],
+            "dtype": signals.dtype.name,
+            "ingest": stats,
+        }
+        with open(f"{header_path}.tmp", "w") as f:
+            json.dump(header, f)
+        os.replace(f"{header_path}.tmp", header_path)
+        self.last_ingest = stats
+        return signals, header
+
+    def load_or_convert(self, source_path, sampling_rate=1000):
+        """
+        Returns the memory-mapped samples of a recording, converting the CSV file first if needed.
+
+        :param source_path: Path of the source CSV file.
+        :param sampling_rate: Sampling rate recorded in the header of new cache entries (default: 1000 Hz).
+        :return: Tuple (signals, header).
+        """
+        cached = self.load(source_path)
+        if cached is not None:
+            return cached
+
+        try:
+            return self.ingest(source_path, sampling_rate)
+        except OSError:
+            # The cache directory is not writable: keep working from an in-memory copy
+            return self.read(source_path, sampling_rate)
+
+    def read(self, source_path, sampling_rate=1000):
+        """
+        Converts a CSV file into the binary layout in memory, without keeping a cache entry. The file is still
+        ingested chunk by chunk, through a temporary directory.
+
+        :param source_path: Path of the source CSV file.
+        :param sampling_rate: Sampling rate of the recording in Hz (default: 1000 Hz).
+        :return: Tuple (signals, header) with the (channels x samples) array and its header.
+        """
+        directory = tempfile.mkdtemp(prefix="eeg-ingest-")
+        try:
+            signals, header = EEGBinaryCache(directory, self.ingestor).ingest(source_path, sampling_rate)
+            signals = np.array(signals)
+            self.last_ingest = header["ingest"]
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        signals.flags.writeable = False
+        return signals, header
@@ -1,26 +1,124 @@
 # components/complexity_analyzer.py
 
-import neurokit2 as nk
+import math
+import numpy as np
+from components.result_cache import ResultCache
 
 
 class ComplexityAnalyzer:
     """
     Class to handle the calculation of complexity for EEG signals using nk.complexity().
+
+    Long signals can be reduced to a target length first, either by splitting them into segments analyzed
+    separately or by decimating them, since the slowest metrics (MSPEn, MFDFA) grow faster than linearly
+    with the signal length. ComplexityJobManager runs the metrics of those segments in the background.
     """
 
-    def __init__(self, signal):
+    # Metric groups of nk.complexity(which="makowski2022"), in the order it computes them
+    METRICS = ("LL", "Hjorth", "AttEn", "SVDEn", "BubbEn", "CWPEn", "MSPEn", "MFDFA")
+    REDUCTIONS = ("segment", "decimate")
+
+    def __init__(self, signal, cache=None, fingerprint=None, channel=None, offset=0):
         """
         Initialize with the EEG signal.
 
         :param signal: The EEG signal data (array-like).
+        :param cache: ResultCache memoizing the results (default: the process-wide cache).
+        :param fingerprint: Fingerprint of the recording the signal comes from (ResultCache.recording_fingerprint).
+                            Without it, results are identified by a hash of the samples.
+        :param channel: Name of the channel the signal comes from.
+        :param offset: Position of the first sample of the signal within the recording.
         """
         self.signal = signal
+        self.cache = cache if cache is not None else ResultCache.shared()
+        self.fingerprint = fingerprint
+        self.channel = channel
+        self.offset = offset
 
     def calculate_complexity(self):
         """
         Calculate complexity metrics for the signal using the 'makowski2022' subset.
         Returns a dataframe with the complexity results and additional information.
         """
-        # Compute the complexity using the "makowski2022" subset of metrics
-        complexity_df, complexity_info = nk.complexity(self.signal, which="makowski2022")
-        return complexity_df, complexity_info
+        params = {"analysis": "complexity", "which": "makowski2022"}
+        key = self.cache.analysis_key(self.signal, params, self.fingerprint, self.channel, self.offset)
+
+        def compute():
+            # NeuroKit2 takes seconds to import, so it is only loaded when a result is not cached yet
+            import neurokit2 as nk
+            # Compute the complexity using the "makowski2022" subset of metrics
+            return nk.complexity(self.signal, which="makowski2022")
+
+        return self.cache.get_or_compute(key, compute)
+
+    def reduced_key(self, target_length, reduction):
+        """
+        Returns the cache key of the complexity of the signal reduced to a target length.
+
+        :param target_length: Maximum number of samples analyzed at once.
+        :param reduction: "segment" or "decimate" (see reduce_signal).
+        :return: Key for the ResultCache.
+        """
+        params = {"analysis": "complexity", "which": "makowski2022", "target_length": int(target_length),
+                  "reduction": reduction}
+        return self.cache.analysis_key(self.signal, params, self.fingerprint, self.channel, self.offset)
+
+    def reduce_signal(self, target_length, reduction="segment"):
+        """
+        Reduces the signal to pieces of at most target_length samples.
+
+        :param target_length: Maximum number of samples analyzed at once.
+        :param reduction: "segment" to split the signal into contiguous segments of about the same length,
+                          analyzed separately, or "decimate" to low-pass filter and downsample the whole
+                          signal by an integer factor (default: "segment").
+        :return: Tuple (starts, pieces, factor) with the position of each piece within the signal, the
+                 pieces as float64 arrays and the decimation factor (1 when segmenting).
+        """
+        if reduction not in self.REDUCTIONS:
+            raise ValueError(f"Unknown reduction '{reduction}'.")
+        signal = np.asarray(self.signal, dtype=np.float64)
+        num_pieces = max(1, math.ceil(len(signal) / target_length))
+        if num_pieces == 1:
+            return [0], [signal], 1
+        if reduction == "segment":
+            bounds = np.linspace(0, len(signal), num_pieces + 1).astype(int)
+            return list(bounds[:-1]), [signal[start:end] for start, end in zip(bounds[:-1], bounds[1:])], 1
+
+        from scipy.signal import decimate  # Only needed for this reduction
+        # A zero-phase FIR anti-aliasing filter stays stable for large factors, unlike the default IIR one
+        return [0], [decimate(signal, num_pieces, ftype="fir", zero_phase=True)], num_pieces
+
+    @staticmethod
+    def calculate_metric(metric, signal, delay=1, dimension=2):
+        """
+        Computes one metric group of nk.complexity(which="makowski2022"), with the same arguments.
+
+        :param metric: Name of the group, among METRICS ("MFDFA" yields one value per MFDFA index).
+        :param signal: 1D signal.
+        :param delay: Time delay in samples (default: 1, as nk.complexity).
+        :param dimension: Embedding dimension (default: 2, as nk.complexity).
+        :return: Tuple (values, info) where values maps result columns to values and info holds the
+                 additional information of the metric (None for MFDFA, which nk.complexity drops).
+        """
+        import neurokit2 as nk
+        if metric == "LL":
+            value, info = nk.fractal_linelength(signal)
+        elif metric == "Hjorth":
+            value, info = nk.complexity_hjorth(signal)
+        elif metric == "AttEn":
+            value, info = nk.entropy_attention(signal)
+        elif metric == "SVDEn":
+            value, info = nk.entropy_svd(signal, delay=delay, dimension=dimension)
+        elif metric == "BubbEn":
+            value, info = nk.entropy_bubble(signal, delay=delay, dimension=dimension)
+        elif metric == "CWPEn":
+            value, info = nk.entropy_permutation(signal, delay=delay, dimension=dimension, corrected=True,
+                                                 weighted=True, conditional=True)
+        elif metric == "MSPEn":
+            value, info = nk.entropy_multiscale(signal, dimension=dimension, method="MSPEn")
+        elif metric == "MFDFA":
+            mfdfa, _ = nk.fractal_dfa(signal, multifractal=True)
+            return {"MFDFA_" + column: mfdfa[column].values[0] for column in mfdfa.columns}, None
+        else:
+            raise ValueError(f"Unknown complexity metric '{metric}'.")
+        return {metric: value}, info
@@ -0,0 +1,327 @@
+# components/complexity_jobs.py
+
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+import pandas as pd
+from components.complexity_analyzer import ComplexityAnalyzer
+
+
+_cancel_flags = None  # Cancellation flags of the jobs, shared with the worker processes
+
+
+def _init_worker(flags):
+    """
+    Worker initializer: keep the shared cancellation flags of the jobs.
+    """
+    global _cancel_flags
+    _cancel_flags = flags
+
+
+def _metric_task(metric, signal, flag=None):
+    """
+    Worker task: compute one complexity metric group on one piece of signal, unless its job was cancelled
+    after the task was handed to the worker. Each task computes a single metric, so the flag is checked
+    between the metrics of a job.
+
+    :return: Tuple (values, info, seconds) with the result columns, the metric information and the
+             computation time, or None if the job was cancelled.
+    """
+    if flag is not None and _cancel_flags is not None and _cancel_flags[flag]:
+        return None
+    start = time.perf_counter()
+    values, info = ComplexityAnalyzer.calculate_metric(metric, signal)
+    return values, info, time.perf_counter() - start
+
+
+class ComplexityJob:
+    """
+    State of one background complexity computation, made of one task per (piece of signal, metric group).
+
+    The state is "queued" (waiting for a free slot of its session), "running", "done", "cancelled" or
+    "failed". Once done, result holds (DataFrame, info) like ComplexityAnalyzer.calculate_complexity(), with
+    one row per analyzed piece indexed by its first sample within the signal.
+    """
+
+    def __init__(self, job_id, session_id, cache, key, starts, pieces, factor):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.cache = cache
+        self.key = key
+        self.starts = starts
+        self.pieces = pieces
+        self.factor = factor
+        self.state = "queued"
+        self.total_tasks = len(pieces) * len(ComplexityAnalyzer.METRICS)
+        self.completed_tasks = 0
+        self.timings = {metric: 0.0 for metric in ComplexityAnalyzer.METRICS}
+        self.rows = [{} for _ in pieces]
+        self.infos = [{} for _ in pieces]
+        self.futures = []
+        self.pending = 0  # Tasks submitted to the pool that have not finished (cancelled ones included)
+        self.flag = None  # Index of the cancellation flag of the job while it has tasks in the pool
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def progress(self):
+        """
+        Fraction of the tasks that are finished, between 0 and 1.
+        """
+        return self.completed_tasks / self.total_tasks if self.total_tasks else 1.0
+
+    @property
+    def active(self):
+        """
+        Whether the job is still queued or running.
+        """
+        return self.state in ("queued", "running")
+
+    @property
+    def elapsed(self):
+        """
+        Seconds since the job started running (0 while queued).
+        """
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+class ComplexityJobManager:
+    """
+    Class to run ComplexityAnalyzer computations on a pool of worker processes without blocking the page.
+
+    Each job gets an ID that the page keeps in its session state to poll the progress and the per-metric
+    timing, and to cancel the job when its inputs change: tasks that have not started are dropped, tasks
+    already handed to a worker see the cancellation flag of the job and return without computing, and the
+    results of running ones are discarded. Every session runs at most max_jobs_per_session jobs at once,
+    counting cancelled jobs whose tasks are still running; the others wait in a queue. Results are stored in
+    the ResultCache of the analyzer, so a job already computed finishes on submission.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # Finished jobs kept for polling before the oldest ones are forgotten
+    MAX_FINISHED_JOBS = 64
+    # Cancellation flags shared with the workers; jobs with tasks in the pool wait for a free flag beyond that
+    MAX_FLAGS = 1024
+
+    def __init__(self, max_workers=None, max_jobs_per_session=1):
+        """
+        Initializes the manager and its process pool.
+
+        :param max_workers: Number of worker processes (default: the number of CPUs).
+        :param max_jobs_per_session: Number of jobs of one session running at the same time (default: 1).
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_jobs_per_session = max(1, max_jobs_per_session)
+        # Worker processes are spawned rather than forked, as in ParallelEntropyExecutor; the flags are handed
+        # to them when they start
+        context = multiprocessing.get_context("spawn")
+        self._flags = context.RawArray("b", self.MAX_FLAGS)
+        self._free_flags = deque(range(self.MAX_FLAGS))
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                        initializer=_init_worker, initargs=(self._flags,))
+        self.jobs = {}
+        self._queues = {}
+        self._finished = deque()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the manager shared by the whole process. Its number of workers can be set with the
+        EEG_COMPLEXITY_WORKERS environment variable, and the per-session limit with EEG_COMPLEXITY_SESSION_JOBS.
+
+        :return: The shared ComplexityJobManager instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                workers = os.environ.get("EEG_COMPLEXITY_WORKERS")
+                cls._shared = cls(max_workers=int(workers) if workers else None,
+                                  max_jobs_per_session=int(os.environ.get("EEG_COMPLEXITY_SESSION_JOBS", 1)))
+            return cls._shared
+
+    def submit(self, analyzer, session_id, target_length=10000, reduction="segment"):
+        """
+        Submits the complexity computation of a signal.
+
+        :param analyzer: ComplexityAnalyzer holding the signal.
+        :param session_id: Identifier of the session submitting the job, for the concurrency limit.
+        :param target_length: Maximum number of samples analyzed at once (default: 10000).
+        :param reduction: "segment" or "decimate" (see ComplexityAnalyzer.reduce_signal) (default: "segment").
+        :return: ID of the job.
+        """
+        key = analyzer.reduced_key(target_length, reduction)
+        starts, pieces, factor = analyzer.reduce_signal(target_length, reduction)
+        job = ComplexityJob(uuid.uuid4().hex, session_id, analyzer.cache, key, starts, pieces, factor)
+        cached = analyzer.cache.get(key)
+        with self._lock:
+            self.jobs[job.job_id] = job
+            if cached is not None:
+                job.result = cached
+                job.timings = dict(cached[1]["timings"])
+                job.completed_tasks = job.total_tasks
+                job.started = job.submitted
+                self._finish(job, "done")
+            else:
+                self._queues.setdefault(session_id, deque()).append(job)
+                self._dispatch(session_id)
+        return job.job_id
+
+    def job(self, job_id):
+        """
+        Returns a job.
+
+        :param job_id: ID returned by submit().
+        :return: The ComplexityJob, or None if it is unknown or was forgotten.
+        """
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job if it is still queued or running.
+
+        :param job_id: ID returned by submit().
+        :return: True if the job was cancelled.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            queue = self._queues.get(job.session_id)
+            if job.state == "queued" and queue is not None:
+                queue.remove(job)
+            for future in job.futures:
+                future.cancel()
+            self._finish(job, "cancelled")
+            return True
+
+    def cancel_session(self, session_id):
+        """
+        Cancels every active job of a session.
+
+        :param session_id: Identifier of the session.
+        :return: Number of cancelled jobs.
+        """
+        with self._lock:
+            job_ids = [job.job_id for job in self.jobs.values() if job.session_id == session_id and job.active]
+            return sum(self.cancel(job_id) for job_id in job_ids)
+
+    def _dispatch(self, session_id):
+        """
+        Starts the queued jobs of a session while it has free slots.
+        """
+        queue = self._queues.get(session_id)
+        running = sum(1 for job in self.jobs.values()
+                      if job.session_id == session_id and (job.state == "running" or job.pending))
+        while queue and running < self.max_jobs_per_session and self._free_flags:
+            job = queue.popleft()
+            job.state = "running"
+            job.started = time.monotonic()
+            job.flag = self._free_flags.popleft()
+            self._flags[job.flag] = 0
+            # Slow metrics first, so the pool is not left waiting on them at the end
+            tasks = list(itertools.product(reversed(ComplexityAnalyzer.METRICS), range(len(job.pieces))))
+            job.pending = len(tasks)
+            for metric, index in tasks:
+                future = self.pool.submit(_metric_task, metric, job.pieces[index], job.flag)
+                job.futures.append(future)
+                future.add_done_callback(lambda future, job=job, metric=metric, index=index:
+                                         self._task_done(job, metric, index, future))
+            running += 1
+        if not queue:
+            self._queues.pop(session_id, None)
+
+    def _task_done(self, job, metric, index, future):
+        """
+        Collects the result of a task, finishing the job with its last task.
+        """
+        try:
+            self._collect(job, metric, index, future)
+        finally:
+            with self._lock:
+                job.pending -= 1
+                if self._release(job):
+                    self._dispatch(job.session_id)
+
+    def _collect(self, job, metric, index, future):
+        """
+        Stores the result of a task in its job (see _task_done).
+        """
+        try:
+            outcome = future.result()
+        except CancelledError:
+            return
+        except Exception as error:
+            with self._lock:
+                if job.active:
+                    job.error = f"{metric}: {error}"
+                    for other in job.futures:
+                        other.cancel()
+                    self._finish(job, "failed")
+            return
+
+        with self._lock:
+            if not job.active or outcome is None:
+                return  # Cancelled while the task was queued or running
+            values, info, seconds = outcome
+            job.rows[index].update(values)
+            if info is not None:
+                job.infos[index][metric] = info
+            job.timings[metric] += seconds
+            job.completed_tasks += 1
+            if job.completed_tasks < job.total_tasks:
+                return
+            table = pd.DataFrame(job.rows, index=pd.Index(job.starts, name="start"))
+            table = table.reindex(sorted(table.columns), axis=1)  # Same column order as nk.complexity
+            info = {"pieces": job.infos, "timings": dict(job.timings), "decimation": job.factor}
+            job.result = (table, info)
+            job.cache.put(job.key, job.result)
+            self._finish(job, "done")
+
+    def _finish(self, job, state):
+        """
+        Marks a job as finished, frees its slot once its tasks have stopped and forgets the oldest finished jobs.
+        """
+        if job.flag is not None:
+            self._flags[job.flag] = 1  # Tasks already handed to a worker return without computing
+        job.state = state
+        job.finished = time.monotonic()
+        job.futures = []
+        job.pieces = None
+        self._release(job)
+        self._finished.append(job.job_id)
+        while len(self._finished) > self.MAX_FINISHED_JOBS:
+            self.jobs.pop(self._finished.popleft(), None)
+        self._dispatch(job.session_id)
+
+    def _release(self, job):
+        """
+        Frees the cancellation flag of a finished job once none of its tasks is left in the pool.
+
+        :return: True if the flag was freed.
+        """
+        if job.active or job.pending or job.flag is None:
+            return False
+        self._free_flags.append(job.flag)
+        job.flag = None
+        return True
+
+    def shutdown(self):
+        """
+        Cancels every job and shuts the worker processes down.
+        """
+        with self._lock:
+            for job_id in [job.job_id for job in self.jobs.values() if job.active]:
+                self.cancel(job_id)
+        self.pool.shutdown(wait=True, cancel_futures=True)
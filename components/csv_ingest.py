@@ -0,0 +1,232 @@
+# components/csv_ingest.py
+
+import csv
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+INT16 = np.iinfo(np.int16)
+
+
+def _fits_int16(values):
+    """
+    Tells whether a block of parsed samples can be stored as int16 without loss, i.e. whether they are all
+    integers within range (integer-valued floats included).
+    """
+    if not values.size:
+        return True
+    if np.issubdtype(values.dtype, np.floating) and not np.array_equal(values, np.trunc(values)):
+        return False
+    if not np.issubdtype(values.dtype, np.number):
+        return False
+    return values.min() >= INT16.min and values.max() <= INT16.max
+
+
+def _count_rows(block, previous):
+    """
+    Counts the lines of a block of a CSV file that hold samples, i.e. its line breaks minus its blank lines
+    (which the parser skips).
+
+    :param block: Bytes of the block.
+    :param previous: Last two bytes before the block (b"\\n\\n" at the start of a range).
+    :return: Number of lines ending in the block.
+    """
+    count = block.count(b"\n")
+    if b"\n\n" not in block and b"\n\r\n" not in block and not block.startswith((b"\n", b"\r\n")):
+        return count
+    data = np.frombuffer(previous + block, dtype=np.uint8)
+    breaks = np.flatnonzero(data[2:] == 10) + 2
+    blank = (data[breaks - 1] == 10) | ((data[breaks - 1] == 13) & (data[breaks - 2] == 10))
+    return count - int(blank.sum())
+
+
+def _parse_range(source_path, start, end, row_offset, num_rows, array_path, channels):
+    """
+    Worker task: parse the lines of a byte range of a CSV file and write them into the channel-major array.
+
+    :return: False if the range holds samples that do not fit the dtype of the array (int16 only), True
+             otherwise.
+    """
+    with open(source_path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start)
+    frame = pd.read_csv(io.BytesIO(text), header=None, names=channels, delimiter=",", engine="c")
+    if len(frame) != num_rows:
+        raise pd.errors.ParserError(f"Expected {num_rows} rows at byte {start}, parsed {len(frame)}.")
+    values = frame.to_numpy()
+    if not np.issubdtype(values.dtype, np.number):
+        raise pd.errors.ParserError(f"Non-numeric samples near byte {start}.")
+
+    out = np.load(array_path, mmap_mode="r+")
+    if out.dtype == np.int16 and not _fits_int16(values):
+        return False
+    out[:, row_offset:row_offset + num_rows] = values.T
+    out.flush()
+    return True
+
+
+class CSVIngestor:
+    """
+    Class to convert a CSV recording into the channel-major binary layout of EEGBinaryCache in bounded memory.
+
+    The file is scanned once to split it into byte ranges of about chunk_mb megabytes aligned on line starts
+    and to count their rows, so the output array can be allocated up front. The ranges are then parsed in
+    parallel by worker processes (or streamed by the multi-threaded pyarrow CSV reader when pyarrow is
+    installed) and written straight into a memory-mapped ``.npy`` file, so memory grows with the chunk
+    size and the number of workers, not with the size of the file. Samples are stored as int16 when every
+    one of them is an integer ADC count within range, float32 otherwise (the file is then parsed again).
+    """
+
+    ENGINES = ("auto", "pyarrow", "processes")
+    SCAN_BLOCK = 16 * 1024 ** 2
+
+    def __init__(self, engine="auto", max_workers=None, chunk_mb=16):
+        """
+        :param engine: "pyarrow", "processes" or "auto" (pyarrow when installed) (default: "auto").
+        :param max_workers: Number of worker processes of the "processes" engine (default: the number of CPUs).
+        :param chunk_mb: Approximate size of the parsed chunks in megabytes (default: 16).
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown CSV engine '{engine}'.")
+        if engine == "auto":
+            try:
+                import pyarrow.csv  # noqa: F401
+                engine = "pyarrow"
+            except ImportError:
+                engine = "processes"
+        self.engine = engine
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_bytes = max(1, int(chunk_mb * 1024 ** 2))
+
+    def _scan(self, source_path):
+        """
+        Reads the channel names and splits the data lines into byte ranges with their row counts.
+
+        :return: Tuple (channels, ranges) where ranges is a list of (start, end, row_offset, num_rows).
+        """
+        size = os.path.getsize(source_path)
+        with open(source_path, "rb") as f:
+            header = f.readline()
+            channels = next(csv.reader([header.decode("utf-8-sig").strip()]), [])
+            if not channels or not any(channels):
+                raise pd.errors.EmptyDataError("No columns to parse from file")
+            data_start = f.tell()
+
+            # Range ends are moved to the next line start
+            bounds = [data_start]
+            while bounds[-1] < size:
+                f.seek(min(size, bounds[-1] + self.chunk_bytes))
+                f.readline()
+                bounds.append(min(size, f.tell()) if f.tell() > bounds[-1] else size)
+
+            ranges = []
+            rows = 0
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                f.seek(start)
+                remaining, count, last = end - start, 0, b"\n\n"
+                while remaining:
+                    block = f.read(min(self.SCAN_BLOCK, remaining))
+                    count += _count_rows(block, last)
+                    remaining -= len(block)
+                    last = (last + block)[-2:]
+                if last[-1:] not in (b"\n", b"\r") and end == size:
+                    count += 1  # Last line of the file without a line break
+                ranges.append((start, end, rows, count))
+                rows += count
+        return channels, ranges
+
+    def ingest(self, source_path, array_path):
+        """
+        Converts a CSV file into a (channels x samples) ``.npy`` array.
+
+        :param source_path: Path of the CSV file (one column per channel, one header line).
+        :param array_path: Path of the ``.npy`` file to write.
+        :return: Tuple (channels, stats) with the channel names and a dictionary with the number of bytes and
+                 rows, the elapsed seconds, the throughput in MB/s, the engine and the stored dtype.
+        """
+        started = time.perf_counter()
+        channels, ranges = self._scan(source_path)
+        num_rows = sum(num for _, _, _, num in ranges)
+        ranges = [entry for entry in ranges if entry[3]]
+
+        for dtype in (np.int16, np.float32):
+            out = np.lib.format.open_memmap(array_path, mode="w+", dtype=dtype, shape=(len(channels), num_rows))
+            del out  # Workers open the file themselves
+            if self.engine == "pyarrow":
+                complete = self._parse_pyarrow(source_path, array_path, channels, num_rows)
+            else:
+                complete = self._parse_processes(source_path, array_path, channels, ranges)
+            if complete:
+                break
+
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(source_path)
+        stats = {"bytes": size, "rows": num_rows, "seconds": seconds,
+                 "mb_per_s": size / 1024 ** 2 / seconds if seconds > 0 else None,
+                 "engine": self.engine, "dtype": np.dtype(dtype).name}
+        return channels, stats
+
+    def _parse_processes(self, source_path, array_path, channels, ranges):
+        """
+        Parses the byte ranges on a pool of worker processes (one after the other in this process when there is
+        only one range or one worker, which saves starting the pool).
+
+        :return: False if some samples do not fit the dtype of the array.
+        """
+        tasks = [(source_path, start, end, offset, num, array_path, channels) for start, end, offset, num in ranges]
+        if len(tasks) <= 1 or self.max_workers <= 1:
+            return all(_parse_range(*task) for task in tasks)
+        # Worker processes are spawned rather than forked, as in ParallelEntropyExecutor
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_parse_range, *task) for task in tasks]
+            try:
+                return all([future.result() for future in futures])
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _parse_pyarrow(self, source_path, array_path, channels, num_rows):
+        """
+        Streams the file through the pyarrow CSV reader, one record batch at a time. Every column is parsed as
+        float64: the reader infers the column types from its first block, so a decimal appearing after it would
+        not convert to the inferred int64.
+
+        :return: False if some samples do not fit the dtype of the array.
+        """
+        import pyarrow
+        import pyarrow.csv
+
+        dtype = np.load(array_path, mmap_mode="r").dtype
+        position = 0
+        try:
+            # The reader parses several blocks ahead on its threads, so its blocks are a fraction of the chunk size
+            reader = pyarrow.csv.open_csv(source_path, read_options=pyarrow.csv.ReadOptions(
+                block_size=max(2 ** 16, min(self.chunk_bytes // 16, 2 ** 31 - 1))),
+                convert_options=pyarrow.csv.ConvertOptions(
+                    column_types={channel: pyarrow.float64() for channel in channels}))
+            for batch in reader:
+                values = np.column_stack([column.to_numpy(zero_copy_only=False) for column in batch.columns])
+                if not np.issubdtype(values.dtype, np.number):
+                    raise pd.errors.ParserError(f"Non-numeric samples after row {position}.")
+                if dtype == np.int16 and not _fits_int16(values):
+                    return False
+                if position + len(values) > num_rows:
+                    raise pd.errors.ParserError(f"More rows than the {num_rows} counted lines.")
+                # The array is mapped for one batch at a time, so its written pages do not pile up in memory
+                out = np.load(array_path, mmap_mode="r+")
+                out[:, position:position + len(values)] = values.T
+                out.flush()
+                del out
+                position += len(values)
+        except pyarrow.ArrowInvalid as error:
+            raise pd.errors.ParserError(str(error)) from error
+        finally:
+            pyarrow.default_memory_pool().release_unused()
+        if position != num_rows:
+            raise pd.errors.ParserError(f"Expected {num_rows} rows, parsed {position}.")
+        return True
@@ -0,0 +1,139 @@
+# components/cwt_engine.py
+
+import numpy as np
+import pywt
+import scipy.fft
+from components.recording_store import RecordingStore
+
+
+class FFTWaveletTransform:
+    """
+    Class to compute the Continuous Wavelet Transform of a signal in the Fourier domain.
+
+    The result matches ``pywt.cwt(signal, scales, wavelet)`` (same sampled wavelet, derivative and centering),
+    but the per-scale wavelet filters are built once and kept in the frequency domain as a filter bank,
+    keyed by (wavelet, scales, padded length, dtype). A transform is then one forward FFT of the signal, one
+    batched multiply with the whole bank and one batched inverse FFT for all scales. The filters depend on
+    the scales in samples only, so the sampling rate enters through the scales chosen by the caller.
+    """
+
+    BANK_CACHE_MB = 256
+    _banks = RecordingStore(max_bytes=BANK_CACHE_MB * 1024 ** 2)
+
+    def __init__(self, wavelet='cmor1.5-1.0', precision=12, dtype=np.complex128, workers=-1):
+        """
+        Initializes the transform for a wavelet.
+
+        :param wavelet: Name of a continuous wavelet known to PyWavelets (default: 'cmor1.5-1.0').
+        :param precision: Precision of the sampled wavelet, as in pywt.cwt (default: 12).
+        :param dtype: Complex dtype of the filter bank and of the output; np.complex64 halves memory and time
+                      (default: np.complex128).
+        :param workers: Number of threads of each FFT, as in scipy.fft; use 1 in worker processes that already
+                        run one task per CPU (default: -1, one per CPU).
+        """
+        self.wavelet = wavelet
+        self.precision = precision
+        self.dtype = np.dtype(dtype)
+        self.workers = workers
+
+    @staticmethod
+    def padded_length(num_samples, max_filter_length):
+        """
+        Returns the FFT length used for a signal, rounded up so that nearby signal lengths share a filter bank.
+
+        :param num_samples: Number of samples of the signal.
+        :param max_filter_length: Length of the longest filter of the bank.
+        :return: FFT length, large enough to avoid circular wrap-around.
+        """
+        minimum = num_samples + max_filter_length + 1
+        granularity = max(1, 1 << max(0, minimum.bit_length() - 4))
+        return scipy.fft.next_fast_len(-(-minimum // granularity) * granularity)
+
+    def _filters(self, scales):
+        """
+        Returns the time-domain filters of each scale and the position of the first output sample.
+
+        :param scales: 1D array of scales.
+        :return: List of tuples (filter, shift) where the output of the scale is the convolution of the signal
+                 with the filter, starting at index shift.
+        """
+        int_psi, x = pywt.integrate_wavelet(self.wavelet, precision=self.precision)
+        wavelet = pywt.ContinuousWavelet(self.wavelet) if isinstance(self.wavelet, str) else self.wavelet
+        if wavelet.complex_cwt:
+            int_psi = np.conj(int_psi)
+        step = x[1] - x[0]
+
+        filters = []
+        for scale in scales:
+            # Same resampling of the integrated wavelet as pywt.cwt
+            j = (np.arange(scale * (x[-1] - x[0]) + 1) / (scale * step)).astype(int)
+            j = j[j < int_psi.size]
+            int_psi_scale = int_psi[j][::-1]
+            length = int_psi_scale.size
+            if length < 2:
+                raise ValueError(f"Selected scale of {scale} too small.")
+
+            # -sqrt(scale) * diff(conv(signal, h)) is a convolution with the first difference of h
+            kernel = -np.sqrt(scale) * (np.append(int_psi_scale, 0) - np.insert(int_psi_scale, 0, 0))
+            # pywt keeps the centered part of the derivative, which starts at floor((length - 2) / 2)
+            filters.append((kernel, 1 + (length - 2) // 2))
+        return filters
+
+    def support(self, scales):
+        """
+        Returns how many input samples before and after an output sample contribute to it, for each scale.
+        A block of output samples is exact (equal to the transform of the whole signal) when the block is
+        transformed together with that much context on each side.
+
+        :param scales: 1D array of scales.
+        :return: Tuple (before, after) of 1D integer arrays with one value per scale.
+        """
+        filters = self._filters(np.atleast_1d(np.asarray(scales, dtype=np.float64)))
+        before = np.array([kernel.size - 1 - shift for kernel, shift in filters], dtype=np.intp)
+        after = np.array([shift for _, shift in filters], dtype=np.intp)
+        return before, after
+
+    def filter_bank(self, scales, num_samples):
+        """
+        Returns the Fourier-domain filter bank for the given scales and signal length, building it on first use.
+
+        :param scales: 1D array of scales.
+        :param num_samples: Number of samples of the signals to transform.
+        :return: Tuple (bank, nfft) where bank has shape (num_scales, nfft).
+        """
+        scales = np.atleast_1d(np.asarray(scales, dtype=np.float64))
+        _, x = pywt.integrate_wavelet(self.wavelet, precision=self.precision)
+        x_extent = x[-1] - x[0]
+        nfft = self.padded_length(num_samples, int(np.ceil(scales.max() * x_extent)) + 2)
+        key = (str(self.wavelet), tuple(scales.tolist()), self.precision, nfft, self.dtype.str)
+
+        def build():
+            bank = np.empty((len(scales), nfft), dtype=self.dtype)
+            frequencies = np.arange(nfft)
+            for i, (kernel, shift) in enumerate(self._filters(scales)):
+                # A circular shift in the filter moves the first kept output sample to index 0
+                spectrum = scipy.fft.fft(kernel, nfft) * np.exp(2j * np.pi * frequencies * shift / nfft)
+                bank[i] = spectrum
+            return bank
+
+        return self._banks.get(key, build), nfft
+
+    def transform(self, signal, scales):
+        """
+        Computes the CWT of a signal, or of several channels at once, at the given scales.
+
+        :param signal: The EEG signal (1D array-like), or a (channels x samples) array of several channels,
+                       transformed in one batch with the same filter bank.
+        :param scales: 1D array of scales.
+        :return: Complex coefficients of shape (num_scales, num_samples), or (channels, num_scales, num_samples)
+                 for a 2D input.
+        """
+        signal = np.asarray(signal, dtype=self.dtype.type(0).real.dtype)
+        num_samples = signal.shape[-1]
+        bank, nfft = self.filter_bank(scales, num_samples)
+
+        spectrum = scipy.fft.fft(signal, nfft, axis=-1, workers=self.workers).astype(self.dtype, copy=False)
+        coefficients = scipy.fft.ifft(bank * spectrum[..., np.newaxis, :], axis=-1, overwrite_x=True,
+                                      workers=self.workers)
+        # Copy the kept samples so the padded FFT buffer is released
+        return np.ascontiguousarray(coefficients[..., :num_samples])
@@ -1,42 +1,190 @@
 # components/data_loader.py
 
 import os
+import numpy as np
 import pandas as pd
-import streamlit as st
+from components.binary_cache import EEGBinaryCache
+from components.profiler import Stage
+from components.recording_store import RecordingStore
 
 
 class EEGDataLoader:
     """
     Class to handle loading EEG data from CSV files.
+
+    The first load of a file converts it chunk by chunk into a memory-mappable binary cache (see EEGBinaryCache);
+    later loads open that cache without parsing or copying the samples. The samples are held once per
+    process in a shared RecordingStore, so every page and session reads the same read-only array.
+
+    The samples are a single contiguous (channels x samples) array (the signals attribute), so analyses can
+    process every channel in one batch; the data attribute is a pandas view of it with one column per channel.
     """
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, sampling_rate=1000, use_cache=True, store=None, report_errors=True):
         """
         Initializes the EEGDataLoader with a specific CSV file.
 
         :param file_name: The name of the file (in the 'data' directory) to load.
+        :param sampling_rate: Sampling rate of the EEG data (default: 1000 Hz).
+        :param use_cache: Whether to keep a binary copy of the file on disk (default: True).
+        :param store: RecordingStore holding the loaded samples (default: the process-wide store).
+        :param report_errors: Whether to show errors in the Streamlit page; they are always kept in the error
+                              attribute, which is all that headless (batch) runs use (default: True).
         """
         self.file_path = os.path.join("data", file_name)
+        self.sampling_rate = sampling_rate
+        self.cache = EEGBinaryCache() if use_cache else None
+        self.store = store if store is not None else RecordingStore.shared()
+        self.recording_key = None
+        self.signals = None
         self.data = None
+        self.ingest_stats = None  # Statistics (bytes, seconds, MB/s) of the CSV conversion done by the last load
+        self.preprocessor = None
+        self.artifact_mask = None  # (channels x epochs) artifact epochs of the preprocessed samples
+        self.report_errors = report_errors
+        self.error = None
+
+    def _fail(self, message):
+        """
+        Keeps an error message and shows it in the page when reporting is enabled.
+
+        :param message: Description of the error.
+        """
+        self.error = message
+        if self.report_errors:
+            import streamlit as st  # Imported on use so the loader also works without Streamlit
+            st.error(message)
+
+    def _read_recording(self):
+        """
+        Reads the samples of the file, through the binary cache when enabled.
+
+        :return: Tuple (signals, header) with the (channels x samples) array and its header.
+        """
+        if self.cache is not None:
+            recording = self.cache.load_or_convert(self.file_path, self.sampling_rate)
+            self.ingest_stats = self.cache.last_ingest
+        else:
+            cache = EEGBinaryCache()
+            recording = cache.read(self.file_path, self.sampling_rate)
+            self.ingest_stats = cache.last_ingest
+        return recording
 
+    @Stage("load")
     def load_data(self):
         """
         Loads the EEG data from the CSV file and stores it in the data attribute.
 
         :return: pandas DataFrame containing EEG data, or None if an error occurs.
         """
+        self.error = None
+        self.signals = None
+        self.ingest_stats = None
+        self.preprocessor = None
+        self.artifact_mask = None
         try:
-            self.data = pd.read_csv(self.file_path, delimiter=",")
+            self.recording_key = RecordingStore.file_key(self.file_path)
+            # Drop the entries of older versions of this file before loading the current one
+            self.store.discard_stale(self.recording_key)
+            signals, header = self.store.get(self.recording_key, self._read_recording)
+            self.signals = signals
+            # The transposed (samples x channels) view keeps the shared array as the single backing block
+            self.data = pd.DataFrame(signals.T, columns=header["channels"], copy=False)
             return self.data
         except FileNotFoundError:
-            st.error(f"The file '{self.file_path}' was not found.")
+            self._fail(f"The file '{self.file_path}' was not found.")
             return None
         except pd.errors.EmptyDataError:
-            st.error(f"The file '{self.file_path}' is empty.")
+            self._fail(f"The file '{self.file_path}' is empty.")
             return None
         except pd.errors.ParserError:
-            st.error(f"There was an error parsing the file '{self.file_path}'.")
+            self._fail(f"There was an error parsing the file '{self.file_path}'.")
+            return None
+
+    def preprocess(self, preprocessor, channels=None):
+        """
+        Replaces the loaded samples by the filtered samples of some or all of the channels and marks their
+        artifacts (see EEGPreprocessor).
+
+        Only the requested channels are filtered, each on its own, since the filters and the artifact marking
+        of a channel do not depend on the others. The filtered samples and the artifact epochs of each channel
+        are held in the RecordingStore under the recording key extended with the preprocessing settings and
+        the channel name, so every page and session filtering the recording the same way shares them. The
+        recording_key attribute is extended with the settings, so the analyzer results and plot pyramids of
+        filtered samples are cached apart from those of the raw samples.
+
+        :param preprocessor: EEGPreprocessor with the settings.
+        :param channels: Names of the channels to filter, which become the only loaded channels (default: all).
+        :return: pandas DataFrame of the filtered samples (also the data attribute), or None if no data is loaded.
+        """
+        if self.signals is None:
+            self._fail("EEG data has not been loaded.")
+            return None
+        names = self.get_channels()
+        channels = names if channels is None else list(channels)
+        key = self.recording_key + ("preprocessed", preprocessor.key())
+
+        def build(row):
+            filtered = preprocessor.filter(self.signals[row])
+            return filtered, preprocessor.artifact_mask(filtered)
+
+        entries = [self.store.get(key + (channel,), lambda row=names.index(channel): build(row))
+                   for channel in channels]
+        num_samples = self.signals.shape[1]
+        signals = np.empty((len(channels), num_samples), dtype=np.float32)
+        mask = np.empty((len(channels), -(-num_samples // preprocessor.epoch_size)), dtype=bool)
+        for row, (filtered, epochs) in enumerate(entries):
+            signals[row], mask[row] = filtered, epochs
+        signals.flags.writeable = False  # Read-only like the loaded recording
+        self.recording_key = key
+        self.preprocessor = preprocessor
+        self.artifact_mask = mask
+        self.signals = signals
+        self.data = pd.DataFrame(signals.T, columns=channels, copy=False)
+        return self.data
+
+    def artifact_samples(self, channel, start_idx=0, end_idx=None):
+        """
+        Returns which samples of a channel lie in epochs marked as artifacts by preprocess().
+
+        :param channel: Name of the channel.
+        :param start_idx: First sample of the range (default: 0).
+        :param end_idx: End sample (exclusive) of the range (default: the end of the recording).
+        :return: Boolean array with one value per sample of the range, or None without preprocessing.
+        """
+        if self.artifact_mask is None:
+            return None
+        from components.preprocessing import EEGPreprocessor
+
+        end_idx = self.signals.shape[1] if end_idx is None else min(end_idx, self.signals.shape[1])
+        return EEGPreprocessor.sample_mask(self.artifact_mask[self.get_channels().index(channel)],
+                                           self.preprocessor.epoch_size, start_idx, end_idx)
+
+    def load_index(self):
+        """
+        Returns the AnalysisIndex of the loaded recording, if one was built (see index_recordings.py). The
+        first time it is found in this process, its entropies and band powers are also stored in the shared
+        ResultCache, so the analyzers read them instead of computing them.
+
+        :return: AnalysisIndex, or None if the recording has no up-to-date index or its samples were preprocessed
+                 (the index describes the raw samples).
+        """
+        if self.signals is None or self.preprocessor is not None:
             return None
+        from components.analysis_index import AnalysisIndex
+        from components.result_cache import ResultCache
+
+        key = self.recording_key + ("index",)
+        index = self.store.lookup(key)
+        if index is None:
+            # A missing index is not stored, so an index built while the app runs is picked up
+            index = AnalysisIndex.load(self.file_path)
+            if index is None or index.channels != self.get_channels():
+                return None
+            index.seed_cache(ResultCache.shared(), ResultCache.recording_fingerprint(self.recording_key),
+                             self.signals)
+            self.store.put(key, index)
+        return index
 
     def get_channels(self):
         """
@@ -47,5 +195,21 @@ class EEGDataLoader:
         if self.data is not None:
             return self.data.columns.tolist()
         else:
-            st.error("EEG data has not been loaded.")
+            self._fail("EEG data has not been loaded.")
             return []
+
+    def get_signals(self, channels=None):
+        """
+        Returns the samples of some or all of the channels as one (channels x samples) array.
+
+        :param channels: Names of the channels, in the order of the rows (default: every channel, returned
+                         without a copy).
+        :return: 2D read-only ndarray, or None if no data is loaded.
+        """
+        if self.signals is None:
+            self._fail("EEG data has not been loaded.")
+            return None
+        if channels is None:
+            return self.signals
+        names = self.get_channels()
+        return self.signals[[names.index(channel) for channel in channels]]
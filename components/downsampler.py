@@ -0,0 +1,403 @@
+# components/downsampler.py
+
+import numpy as np
+
+
+class MinMaxPyramid:
+    """
+    Class to handle a multi-resolution min/max envelope of a signal for plotting.
+
+    Level k keeps, for every bucket of ``min_bucket * 2**k`` samples, the positions of the minimum and the
+    maximum sample of the bucket. A query picks the coarsest level that still gives about two points per
+    screen pixel, so spikes and artifacts stay visible while the number of points sent to the browser is
+    bounded by the screen width instead of the recording length.
+    """
+
+    def __init__(self, signal, min_bucket=16):
+        """
+        Builds every level of the pyramid once.
+
+        :param signal: The EEG signal (1D array-like) to downsample.
+        :param min_bucket: Number of samples per bucket in the finest stored level (default: 16).
+        """
+        self.signal = np.asarray(signal)
+        self.min_bucket = min_bucket
+        self.levels = []  # List of (bucket, min_positions, max_positions), from fine to coarse
+
+        index_dtype = np.int32 if len(self.signal) < np.iinfo(np.int32).max else np.int64
+        if len(self.signal) >= 2 * min_bucket:
+            min_pos, max_pos = self._envelope(self.signal, 0, min_bucket)
+            bucket = min_bucket
+            self.levels.append((bucket, min_pos.astype(index_dtype), max_pos.astype(index_dtype)))
+            # Each coarser level merges pairs of buckets of the previous one
+            while len(min_pos) >= 4:
+                min_pos, max_pos = self._merge_pairs(min_pos, max_pos)
+                bucket *= 2
+                self.levels.append((bucket, min_pos.astype(index_dtype), max_pos.astype(index_dtype)))
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the levels of the pyramid (the signal itself is not counted).
+        """
+        return sum(min_pos.nbytes + max_pos.nbytes for _, min_pos, max_pos in self.levels)
+
+    @staticmethod
+    def _envelope(values, offset, bucket):
+        """
+        Returns the positions of the minimum and maximum of each bucket of a signal segment.
+
+        :param values: 1D array with the samples of the segment.
+        :param offset: Sample position of the first value of the segment.
+        :param bucket: Number of samples per bucket; the last bucket may be shorter.
+        :return: Tuple (min_positions, max_positions) of absolute sample positions.
+        """
+        full = len(values) // bucket * bucket
+        blocks = values[:full].reshape(-1, bucket)
+        starts = np.arange(0, full, bucket) + offset
+        min_pos = starts + np.argmin(blocks, axis=1)
+        max_pos = starts + np.argmax(blocks, axis=1)
+        if full < len(values):
+            tail = values[full:]
+            min_pos = np.append(min_pos, offset + full + np.argmin(tail))
+            max_pos = np.append(max_pos, offset + full + np.argmax(tail))
+        return min_pos, max_pos
+
+    def _merge_pairs(self, min_pos, max_pos):
+        """
+        Merges consecutive pairs of buckets into buckets of twice the size.
+
+        :param min_pos: Positions of the bucket minima of the finer level.
+        :param max_pos: Positions of the bucket maxima of the finer level.
+        :return: Tuple (min_positions, max_positions) of the coarser level.
+        """
+        if len(min_pos) % 2:
+            min_pos = np.append(min_pos, min_pos[-1])
+            max_pos = np.append(max_pos, max_pos[-1])
+        min_pairs = min_pos.reshape(-1, 2)
+        max_pairs = max_pos.reshape(-1, 2)
+        take_min = np.argmin(self.signal[min_pairs], axis=1)
+        take_max = np.argmax(self.signal[max_pairs], axis=1)
+        rows = np.arange(len(min_pairs))
+        return min_pairs[rows, take_min], max_pairs[rows, take_max]
+
+    def query(self, start_idx, end_idx, max_points):
+        """
+        Returns the samples to plot for a range of the signal.
+
+        :param start_idx: First sample of the range.
+        :param end_idx: End sample (exclusive) of the range.
+        :param max_points: Maximum number of points to return, usually twice the plot width in pixels.
+        :return: Tuple (positions, values) with the sample positions in increasing order and their values.
+        """
+        start_idx = max(0, start_idx)
+        end_idx = min(len(self.signal), end_idx)
+        if end_idx - start_idx <= max_points:
+            return np.arange(start_idx, end_idx), self.signal[start_idx:end_idx]
+
+        # Each bucket contributes two points (its minimum and its maximum)
+        bucket_needed = -(-2 * (end_idx - start_idx) // max_points)
+        level = next((lvl for lvl in self.levels if lvl[0] >= bucket_needed), None)
+        if level is None or bucket_needed < self.min_bucket:
+            # Finer than the stored levels (or a short signal): reduce the visible range directly
+            min_pos, max_pos = self._envelope(self.signal[start_idx:end_idx], start_idx, bucket_needed)
+        else:
+            bucket, level_min, level_max = level
+            first, last = start_idx // bucket, -(-end_idx // bucket)
+            min_pos, max_pos = level_min[first:last], level_max[first:last]
+
+        # Emit the two extremes of every bucket in time order
+        positions = np.column_stack((np.minimum(min_pos, max_pos), np.maximum(min_pos, max_pos))).ravel()
+        positions = positions[(positions >= start_idx) & (positions < end_idx)]
+        return positions, self.signal[positions]
+
+
+class MontagePyramid:
+    """
+    Class to handle a multi-resolution min/max envelope of all the channels of a recording at once.
+
+    Unlike MinMaxPyramid, levels keep the minimum and maximum values (not their positions) of every bucket
+    of ``min_bucket * 2**k`` samples, as (channels x buckets) arrays in the dtype of the samples. Every
+    channel shares the same buckets, so each level is built with one reduction over all the channels and a
+    query returns one evenly spaced (min, max) row per channel, plotted on an implicit time axis.
+    """
+
+    def __init__(self, signals, min_bucket=32):
+        """
+        Builds every level of the pyramid once.
+
+        :param signals: 2D array (channels x samples), e.g. a memory-mapped recording.
+        :param min_bucket: Number of samples per bucket in the finest stored level (default: 32).
+        """
+        self.signals = signals
+        self.min_bucket = min_bucket
+        self.levels = []  # List of (bucket, minima, maxima), from fine to coarse
+
+        if signals.shape[1] >= 2 * min_bucket:
+            minima, maxima = self._envelope(signals, min_bucket)
+            bucket = min_bucket
+            self.levels.append((bucket, minima, maxima))
+            # Each coarser level merges pairs of buckets of the previous one
+            while minima.shape[1] >= 4:
+                if minima.shape[1] % 2:
+                    minima = np.concatenate((minima, minima[:, -1:]), axis=1)
+                    maxima = np.concatenate((maxima, maxima[:, -1:]), axis=1)
+                minima = np.minimum(minima[:, 0::2], minima[:, 1::2])
+                maxima = np.maximum(maxima[:, 0::2], maxima[:, 1::2])
+                bucket *= 2
+                self.levels.append((bucket, minima, maxima))
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the levels of the pyramid (the signals themselves are not counted).
+        """
+        return sum(minima.nbytes + maxima.nbytes for _, minima, maxima in self.levels)
+
+    @staticmethod
+    def _envelope(values, bucket):
+        """
+        Returns the minimum and maximum of each bucket of every row; the last bucket may be shorter.
+
+        :param values: 2D array (rows x samples).
+        :param bucket: Number of samples per bucket.
+        :return: Tuple (minima, maxima) of (rows x buckets) arrays.
+        """
+        full = values.shape[1] // bucket * bucket
+        blocks = values[:, :full].reshape(values.shape[0], -1, bucket)
+        minima, maxima = blocks.min(axis=2), blocks.max(axis=2)
+        if full < values.shape[1]:
+            tail = values[:, full:]
+            minima = np.concatenate((minima, tail.min(axis=1, keepdims=True)), axis=1)
+            maxima = np.concatenate((maxima, tail.max(axis=1, keepdims=True)), axis=1)
+        return minima, maxima
+
+    def query(self, start_idx, end_idx, max_points, rows=None):
+        """
+        Returns the samples to plot for a range of the recording, for some or all of the channels.
+
+        :param start_idx: First sample of the range.
+        :param end_idx: End sample (exclusive) of the range.
+        :param max_points: Maximum number of points per channel, usually twice the plot width in pixels.
+        :param rows: Indices of the channels to return (default: all of them).
+        :return: Tuple (x0, dx, values) where values has one row per channel and the point j of every row
+                 is at sample position x0 + j * dx: the raw samples, or (min, max) pairs of each bucket.
+        """
+        rows = np.arange(self.signals.shape[0]) if rows is None else np.asarray(rows, dtype=np.intp)
+        start_idx = max(0, start_idx)
+        end_idx = min(self.signals.shape[1], end_idx)
+        # Each bucket contributes two points (its minimum and its maximum)
+        bucket_needed = -(-2 * (end_idx - start_idx) // max_points)
+        level = next((lvl for lvl in self.levels if lvl[0] >= bucket_needed), None)
+        if end_idx - start_idx <= max_points or level is None or bucket_needed < self.min_bucket:
+            # Finer than the stored levels (or a short recording): reduce the visible range directly
+            return self.reduce(self.signals, start_idx, end_idx, max_points, rows)
+
+        bucket, level_min, level_max = level
+        first, last = start_idx // bucket, -(-end_idx // bucket)
+        minima, maxima = level_min[rows, first:last], level_max[rows, first:last]
+        values = np.empty((len(rows), 2 * minima.shape[1]), dtype=minima.dtype)
+        values[:, 0::2] = minima
+        values[:, 1::2] = maxima
+        return first * bucket, bucket / 2, values
+
+    @classmethod
+    def reduce(cls, signals, start_idx, end_idx, max_points, rows=None):
+        """
+        Reduces a range of the recording directly, without a pyramid, in the format of query(). Its cost grows
+        with the length of the range, so it suits short (zoomed) ranges.
+
+        :param signals: 2D array (channels x samples).
+        :param start_idx: First sample of the range.
+        :param end_idx: End sample (exclusive) of the range.
+        :param max_points: Maximum number of points per channel.
+        :param rows: Indices of the channels to return (default: all of them).
+        :return: Tuple (x0, dx, values), see query().
+        """
+        rows = np.arange(signals.shape[0]) if rows is None else np.asarray(rows, dtype=np.intp)
+        start_idx = max(0, start_idx)
+        end_idx = min(signals.shape[1], end_idx)
+        if end_idx - start_idx <= max_points:
+            return start_idx, 1, signals[rows, start_idx:end_idx]
+
+        bucket = -(-2 * (end_idx - start_idx) // max_points)
+        first = start_idx // bucket
+        minima, maxima = cls._envelope(signals[rows, first * bucket:end_idx], bucket)
+        values = np.empty((len(rows), 2 * minima.shape[1]), dtype=minima.dtype)
+        values[:, 0::2] = minima
+        values[:, 1::2] = maxima
+        return first * bucket, bucket / 2, values
+
+
+class ScalogramPyramid:
+    """
+    Class to handle a multi-resolution, time-decimated store of scalogram magnitudes for plotting.
+
+    Level k keeps, for every bucket of ``base_bucket * 2**k`` samples, the maximum magnitude of each scale
+    (max-pooling keeps short bursts visible). Levels are stored as float32 tiles of TILE_COLUMNS columns
+    and built incrementally from consecutive blocks of coefficients, so a whole recording can be added
+    tile by tile. A query picks the coarsest level that still gives one column per screen pixel and only
+    gathers the tiles overlapping the view.
+    """
+
+    TILE_COLUMNS = 512
+
+    def __init__(self, num_scales, start_idx=0, base_bucket=1):
+        """
+        Initializes an empty pyramid.
+
+        :param num_scales: Number of scales (rows) of the scalogram.
+        :param start_idx: Sample position of the first column within the recording (default: 0).
+        :param base_bucket: Number of samples per column in the finest stored level (default: 1).
+        """
+        self.num_scales = num_scales
+        self.start_idx = start_idx
+        self.base_bucket = base_bucket
+        self.num_samples = 0
+        self.max_value = 0.0
+        self.levels = []  # Per level: dict with its full tiles, the open tile and the columns not yet pooled
+        self._base_carry = np.empty((num_scales, 0), dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the levels of the pyramid.
+        """
+        return sum(sum(tile.nbytes for tile in level["tiles"]) + level["open"].nbytes + level["carry"].nbytes
+                   for level in self.levels) + self._base_carry.nbytes
+
+    @classmethod
+    def from_columns(cls, columns, base_bucket, num_samples, start_idx=0):
+        """
+        Builds a pyramid from the columns of its finest level (e.g. as returned by base_columns()).
+
+        :param columns: 2D array of shape (num_scales, num_columns) of magnitudes pooled over base_bucket samples.
+        :param base_bucket: Number of samples per column.
+        :param num_samples: Number of samples covered by the columns (the last column may be partial).
+        :param start_idx: Sample position of the first column within the recording (default: 0).
+        :return: Finished ScalogramPyramid.
+        """
+        columns = np.asarray(columns, dtype=np.float32)
+        pyramid = cls(columns.shape[0], start_idx=start_idx, base_bucket=base_bucket)
+        if columns.shape[1]:
+            pyramid.num_samples = num_samples
+            pyramid.max_value = float(columns.max())
+            pyramid._push(0, columns)
+            pyramid.finish()
+        return pyramid
+
+    def base_columns(self):
+        """
+        Returns every column of the finest level; call after finish().
+
+        :return: 2D float32 array of shape (num_scales, num_columns).
+        """
+        if not self.levels:
+            return np.empty((self.num_scales, 0), dtype=np.float32)
+        return self._columns(0, 0, self.levels[0]["columns"])
+
+    def _new_level(self):
+        empty = np.empty((self.num_scales, 0), dtype=np.float32)
+        return {"tiles": [], "open": empty, "carry": empty, "columns": 0}
+
+    def _push(self, level, columns):
+        """
+        Appends pooled columns to a level and pools every complete pair of them into the next level.
+        """
+        if level == len(self.levels):
+            self.levels.append(self._new_level())
+        state = self.levels[level]
+        state["columns"] += columns.shape[1]
+
+        # Store the columns in tiles of TILE_COLUMNS
+        state["open"] = np.concatenate((state["open"], columns), axis=1)
+        while state["open"].shape[1] >= self.TILE_COLUMNS:
+            state["tiles"].append(np.ascontiguousarray(state["open"][:, :self.TILE_COLUMNS]))
+            state["open"] = state["open"][:, self.TILE_COLUMNS:].copy()
+
+        state["carry"] = np.concatenate((state["carry"], columns), axis=1)
+        paired = state["carry"].shape[1] // 2 * 2
+        if paired:
+            pooled = np.maximum(state["carry"][:, 0:paired:2], state["carry"][:, 1:paired:2])
+            state["carry"] = state["carry"][:, paired:].copy()
+            self._push(level + 1, pooled)
+
+    def append(self, magnitudes):
+        """
+        Adds the magnitudes of the next block of samples.
+
+        :param magnitudes: 2D array of shape (num_scales, block_samples) with non-negative values.
+        """
+        magnitudes = np.asarray(magnitudes, dtype=np.float32)
+        if magnitudes.shape[1] == 0:
+            return
+        self.num_samples += magnitudes.shape[1]
+        self.max_value = max(self.max_value, float(magnitudes.max()))
+
+        carry = np.concatenate((self._base_carry, magnitudes), axis=1)
+        full = carry.shape[1] // self.base_bucket * self.base_bucket
+        self._base_carry = carry[:, full:].copy()
+        if full:
+            pooled = carry[:, :full].reshape(self.num_scales, -1, self.base_bucket).max(axis=2)
+            self._push(0, pooled)
+
+    def finish(self):
+        """
+        Pools the incomplete buckets left at the end of the data; call once after the last append().
+        """
+        if self._base_carry.shape[1]:
+            self._push(0, self._base_carry.max(axis=1, keepdims=True))
+            self._base_carry = self._base_carry[:, :0]
+        level = 0
+        while level < len(self.levels) and self.levels[level]["columns"] > 1:
+            state = self.levels[level]
+            if state["carry"].shape[1]:
+                carry, state["carry"] = state["carry"], state["carry"][:, :0]
+                self._push(level + 1, carry)
+            level += 1
+
+    def _columns(self, level, first, last):
+        """
+        Returns the columns [first, last) of a level, gathering only the tiles that overlap them.
+        """
+        state = self.levels[level]
+        parts = []
+        for tile_idx in range(first // self.TILE_COLUMNS, -(-last // self.TILE_COLUMNS)):
+            tile = state["tiles"][tile_idx] if tile_idx < len(state["tiles"]) else state["open"]
+            offset = tile_idx * self.TILE_COLUMNS
+            parts.append(tile[:, max(first - offset, 0):last - offset])
+        if not parts:
+            return np.empty((self.num_scales, 0), dtype=np.float32)
+        return np.concatenate(parts, axis=1)
+
+    def query(self, start_idx, end_idx, max_columns, quantize=False):
+        """
+        Returns the columns to plot for a range of the recording.
+
+        :param start_idx: First sample of the range.
+        :param end_idx: End sample (exclusive) of the range.
+        :param max_columns: Maximum number of columns to return, usually the plot width in pixels.
+        :param quantize: If True, return uint8 values scaled so that 255 is the pyramid's max_value.
+        :return: Tuple (positions, values) with the sample position of the first sample of each column and
+                 the (num_scales, num_columns) array of magnitudes (float32, or uint8 when quantized).
+        """
+        start = max(0, start_idx - self.start_idx)
+        end = min(self.num_samples, end_idx - self.start_idx)
+        if not self.levels or end <= start:
+            values = np.empty((self.num_scales, 0), dtype=np.uint8 if quantize else np.float32)
+            return np.empty(0, dtype=np.int64), values
+
+        # Finest level with at most one column per pixel
+        bucket_needed = -(-(end - start) // max(1, max_columns))
+        level = 0
+        while level + 1 < len(self.levels) and self.base_bucket * 2 ** level < bucket_needed:
+            level += 1
+        bucket = self.base_bucket * 2 ** level
+
+        first, last = start // bucket, min(-(-end // bucket), self.levels[level]["columns"])
+        values = self._columns(level, first, last)
+        positions = self.start_idx + np.arange(first, last, dtype=np.int64) * bucket
+        if quantize:
+            scale = 255.0 / self.max_value if self.max_value > 0 else 0.0
+            values = np.rint(values * scale).astype(np.uint8)
+        return positions, values
@@ -1,39 +1,133 @@
 # components/entropy_analyzer.py
 
-import neurokit2 as nk
+import time
+import numpy as np
+from components.entropy_engine import WindowedEntropyEngine
+from components.entropy_executor import ParallelEntropyExecutor
+from components.incremental_entropy import IncrementalEntropyEngine
+from components.profiler import Stage
+from components.result_cache import ResultCache
 
 
 class EntropyAnalyzer:
     """
     Class to handle the calculation of different entropy measures for EEG signals in windows of time.
+
+    Window results are memoized in a ResultCache, so windows whose samples and parameters have not changed
+    (e.g. after shifting the time range by a multiple of the window size) are not computed again.
+
+    Windows holding samples marked as artifacts (see EEGPreprocessor) can be skipped: they are not computed
+    and their entropies are NaN.
     """
 
-    def __init__(self, signal, sampling_rate=1000):
+    ENTROPY_METRICS = ("Shannon", "Approximate", "Sample")
+    ENGINE_PARAMS = {"dimension": 2, "delay": 1, "tolerance_sd": 0.2}
+    INCREMENTAL_MAX_HOP_FRACTION = 0.02  # Above this hop/window ratio, recomputing each window is faster
+
+    def __init__(self, signal, sampling_rate=1000, cache=None, fingerprint=None, channel=None, offset=0, mask=None):
         """
         Initialize the analyzer with the EEG signal and the sampling rate.
 
-        :param signal: The EEG signal data (array-like).
+        :param signal: The EEG signal data (array-like), or a (channels x samples) array of several channels,
+                       whose windows are then computed in one batch by calculate_entropies_in_windows().
         :param sampling_rate: Sampling rate of the EEG data (default: 1000 Hz).
+        :param cache: ResultCache memoizing the window results (default: the process-wide cache).
+        :param fingerprint: Fingerprint of the recording the signal comes from (ResultCache.recording_fingerprint).
+                            Without it, windows are identified by a hash of their samples.
+        :param channel: Name of the channel the signal comes from (a list of names for several channels).
+        :param offset: Position of the first sample of the signal within the recording.
+        :param mask: Optional boolean array with one value per sample of the signal (one row per channel for
+                     several channels), True for artifacts; windows holding any of them are skipped.
         """
         self.signal = signal
         self.sampling_rate = sampling_rate
+        self.cache = cache if cache is not None else ResultCache.shared()
+        self.fingerprint = fingerprint
+        self.channel = channel
+        self.offset = offset
+        self.mask = mask
 
-    def calculate_entropies_in_windows(self, window_size_sec=5):
+    @Stage("entropy")
+    def calculate_entropies_in_windows(self, window_size_sec=5, vectorized=True, executor=None):
         """
         Calculate entropy measures for each window of the signal.
 
         :param window_size_sec: Window size in seconds for which to calculate entropy.
+        :param vectorized: If True (default), compute all windows at once with the WindowedEntropyEngine;
+                           if False, call neurokit2 window by window (reference implementation).
+        :param executor: Optional ParallelEntropyExecutor spreading the windows over worker processes (of all
+                         the channels at once for several channels).
+        :return: List of dictionaries with entropy values for each window, or one such list per channel for
+                 several channels. Every path gives the same values for several channels as for each channel
+                 alone.
+        """
+        window_size = int(window_size_sec * self.sampling_rate)  # Convert window size to number of samples
+        multichannel = np.ndim(self.signal) == 2
+        if multichannel:
+            signals = self.signal
+            channels = self.channel if self.channel is not None else list(range(len(signals)))
+            masks = self.mask if self.mask is not None else [None] * len(signals)
+        else:
+            signals, masks = [self.signal], [self.mask]
+            channels = [self.channel if self.channel is not None else "signal"]
+
+        if executor is not None:
+            # The windows of every channel are spread over the workers together
+            entropies = {channel: [] for channel in channels}
+            channel_masks = None if self.mask is None else dict(zip(channels, masks))
+            for partial in self.iter_entropies_in_windows(dict(zip(channels, signals)), window_size_sec,
+                                                          self.sampling_rate, executor, min_interval_sec=None,
+                                                          cache=self.cache, fingerprint=self.fingerprint,
+                                                          offset=self.offset, masks=channel_masks):
+                entropies = partial
+            return [entropies[channel] for channel in channels] if multichannel else entropies[channels[0]]
+
+        if not vectorized:
+            entropies = [self._calculate_reference_entropies(signal, mask, window_size)
+                         for signal, mask in zip(signals, masks)]
+            return entropies if multichannel else entropies[0]
+
+        if multichannel:
+            return self._calculate_channel_entropies(window_size)
+
+        engine = WindowedEntropyEngine(**self.ENGINE_PARAMS)
+        windows = engine.segment(self.signal, window_size)
+        keys = [self.window_key(self.cache, self.fingerprint, self.channel, self.offset, i, window_size,
+                                windows[i]) for i in range(len(windows))]
+        skipped = self.masked_windows(self.mask, window_size, len(windows))
+        values = [np.full(len(self.ENTROPY_METRICS), np.nan) if skip else self.cache.get(key)
+                  for key, skip in zip(keys, skipped)]
+
+        # Only the windows missing from the cache are computed
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            results = engine.compute(windows[missing])
+            for j, i in enumerate(missing):
+                values[i] = np.array([results[metric][j] for metric in self.ENTROPY_METRICS])
+                self.cache.put(keys[i], values[i])
+        return [dict(zip(self.ENTROPY_METRICS, map(float, value))) for value in values]
+
+    def _calculate_reference_entropies(self, signal, mask, window_size):
+        """
+        Calculate the entropy measures of each window of one channel with neurokit2, window by window.
+
+        :param signal: The EEG signal of the channel (1D array-like).
+        :param mask: Boolean array with one value per sample (True for artifacts), or None.
+        :param window_size: Window size in samples.
         :return: List of dictionaries with entropy values for each window.
         """
-        window_size = window_size_sec * self.sampling_rate  # Convert window size to number of samples
-        num_windows = len(self.signal) // window_size
+        num_windows = len(signal) // window_size
 
         entropies = []
 
+        skipped = self.masked_windows(mask, window_size, num_windows)
         for i in range(num_windows):
+            if skipped[i]:
+                entropies.append(dict.fromkeys(self.ENTROPY_METRICS, np.nan))
+                continue
             start_idx = i * window_size
             end_idx = start_idx + window_size
-            window_signal = self.signal[start_idx:end_idx]
+            window_signal = signal[start_idx:end_idx]
 
             # Calculate entropy measures for the window
             entropy_values = self._calculate_entropies(window_signal)
@@ -41,6 +135,204 @@ class EntropyAnalyzer:
 
         return entropies
 
+    def _calculate_channel_entropies(self, window_size):
+        """
+        Calculate the entropy measures of the windows of every channel of a (channels x samples) signal, with
+        one engine batch for the windows of all the channels that are not cached.
+
+        :param window_size: Window size in samples.
+        :return: One list of window dictionaries per channel.
+        """
+        signals = np.asarray(self.signal)
+        num_channels = signals.shape[0]
+        channels = self.channel if self.channel is not None else [None] * num_channels
+        num_windows = signals.shape[1] // window_size
+        # Non-overlapping windows of a contiguous array are a zero-copy (channels * windows) x window_size view
+        windows = np.ascontiguousarray(signals[:, :num_windows * window_size]).reshape(-1, window_size)
+        keys = [self.window_key(self.cache, self.fingerprint, channels[i // num_windows], self.offset,
+                                i % num_windows, window_size, windows[i]) for i in range(len(windows))]
+        masks = self.mask if self.mask is not None else [None] * num_channels
+        skipped = np.concatenate([self.masked_windows(mask, window_size, num_windows) for mask in masks])
+        values = [np.full(len(self.ENTROPY_METRICS), np.nan) if skip else self.cache.get(key)
+                  for key, skip in zip(keys, skipped)]
+
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            results = WindowedEntropyEngine(**self.ENGINE_PARAMS).compute(windows[missing])
+            for j, i in enumerate(missing):
+                values[i] = np.array([results[metric][j] for metric in self.ENTROPY_METRICS])
+                self.cache.put(keys[i], values[i])
+        return [[dict(zip(self.ENTROPY_METRICS, map(float, value)))
+                 for value in values[row * num_windows:(row + 1) * num_windows]] for row in range(num_channels)]
+
+    @Stage("entropy")
+    def calculate_sliding_entropies(self, window_size_sec=5, hop_size_sec=1):
+        """
+        Calculate entropy measures for overlapping windows starting every hop_size_sec seconds.
+
+        ApEn and SampEn use one fixed tolerance for every window (tolerance_sd times the standard deviation of
+        the whole analyzed signal), so that small hops can be computed incrementally with the
+        IncrementalEntropyEngine; larger hops recompute each window with the WindowedEntropyEngine.
+
+        :param window_size_sec: Window size in seconds for which to calculate entropy.
+        :param hop_size_sec: Time between the starts of consecutive windows in seconds.
+        :return: List of dictionaries with entropy values for each window.
+        """
+        window_size = int(window_size_sec * self.sampling_rate)
+        hop_size = max(1, int(hop_size_sec * self.sampling_rate))
+        signal = np.asarray(self.signal, dtype=np.float64)
+        tolerance = self.ENGINE_PARAMS["tolerance_sd"] * np.std(signal, ddof=1) if len(signal) > 1 else 0.0
+
+        params = dict(self.ENGINE_PARAMS, analysis="sliding_entropy", window_size=window_size,
+                      hop_size=hop_size)
+        key = self.cache.analysis_key(signal, params, self.fingerprint, self.channel, self.offset)
+
+        def compute():
+            if hop_size < self.INCREMENTAL_MAX_HOP_FRACTION * window_size:
+                engine = IncrementalEntropyEngine(window_size, self.ENGINE_PARAMS["dimension"],
+                                                  self.ENGINE_PARAMS["delay"], tolerance=tolerance)
+                results = engine.compute(signal, hop_size)
+            else:
+                engine = WindowedEntropyEngine(**self.ENGINE_PARAMS)
+                windows = np.asarray(engine.segment(signal, window_size, hop_size), dtype=np.float64)
+                approximate, sample = engine.approximate_and_sample(windows, np.full(len(windows), tolerance))
+                results = {"Shannon": engine.shannon(windows), "Approximate": approximate, "Sample": sample}
+            return np.column_stack([results[metric] for metric in self.ENTROPY_METRICS])
+
+        values = self.cache.get_or_compute(key, compute)
+        if self.mask is not None:
+            # Masked windows are still computed, as the incremental engine needs every hop, but not reported
+            values = np.array(values)
+            values[self.masked_windows(self.mask, window_size, len(values), hop_size)] = np.nan
+        return [dict(zip(self.ENTROPY_METRICS, map(float, value))) for value in values]
+
+    @staticmethod
+    def masked_windows(mask, window_size, num_windows, hop_size=None):
+        """
+        Tells which windows hold at least one masked sample.
+
+        :param mask: Boolean array with one value per sample, or None.
+        :param window_size: Window size in samples.
+        :param num_windows: Number of windows.
+        :param hop_size: Distance between window starts in samples (default: window_size).
+        :return: Boolean array with one value per window (all False without a mask).
+        """
+        if mask is None:
+            return np.zeros(num_windows, dtype=bool)
+        starts = np.arange(num_windows) * (hop_size or window_size)
+        # Number of masked samples before each position, so every window is counted with two lookups
+        counts = np.concatenate(([0], np.cumsum(np.asarray(mask, dtype=bool))))
+        ends = np.minimum(starts + window_size, len(mask))
+        return counts[ends] > counts[np.minimum(starts, len(mask))]
+
+    @classmethod
+    def window_key(cls, cache, fingerprint, channel, offset, index, window_size, window):
+        """
+        Returns the ResultCache key of the entropies of the window at the given index, e.g. to store entropies
+        computed elsewhere.
+
+        :param cache: ResultCache the key is built for.
+        :param fingerprint: Fingerprint of the recording (ResultCache.recording_fingerprint), or None.
+        :param channel: Name of the channel, or None.
+        :param offset: Position in the recording of the first sample of the analyzed signal.
+        :param index: Index of the window in the analyzed signal.
+        :param window_size: Number of samples per window.
+        :param window: Samples of the window.
+        :return: Hexadecimal key.
+        """
+        params = dict(cls.ENGINE_PARAMS, analysis="entropy")
+        return cache.analysis_key(window, params, fingerprint, channel, offset + index * window_size)
+
+    @staticmethod
+    def iter_entropies_in_windows(signals, window_size_sec=5, sampling_rate=1000, executor=None,
+                                  min_interval_sec=0.25, cache=None, fingerprint=None, offset=0, coarse_first=False,
+                                  masks=None):
+        """
+        Calculate entropy measures for each window of several channels in parallel, yielding the partial
+        results as the worker processes finish so they can be plotted progressively. Windows found in the
+        result cache are not sent to the workers.
+
+        :param signals: Dictionary mapping channel names to EEG signals of the same length.
+        :param window_size_sec: Window size in seconds for which to calculate entropy.
+        :param sampling_rate: Sampling rate of the EEG data (default: 1000 Hz).
+        :param executor: ParallelEntropyExecutor to use (default: the process-wide executor).
+        :param min_interval_sec: Minimum time between two yielded snapshots; None yields only the final one.
+        :param cache: ResultCache memoizing the window results (default: the process-wide cache).
+        :param fingerprint: Fingerprint of the recording the signals come from (see EntropyAnalyzer.__init__).
+        :param offset: Position of the first sample of the signals within the recording.
+        :param coarse_first: If True, send the windows in coarse-to-fine order (see coarse_to_fine), so the first
+                             snapshots already cover the whole signal sparsely (default: False).
+        :param masks: Optional dictionary mapping channel names to boolean arrays with one value per sample, True
+                      for artifacts; windows holding any of them are skipped and stay NaN.
+        :return: Generator of dictionaries mapping each channel to its list of window dictionaries, where the
+                 windows that are still being computed hold NaN. The last snapshot is complete.
+        """
+        if executor is None:
+            executor = ParallelEntropyExecutor.shared()
+        if cache is None:
+            cache = ResultCache.shared()
+
+        window_size = int(window_size_sec * sampling_rate)
+        length = min(len(signal) for signal in signals.values())
+        signals = {channel: np.asarray(signal)[:length] for channel, signal in signals.items()}
+        num_windows = length // window_size
+        metrics = EntropyAnalyzer.ENTROPY_METRICS
+        values = {channel: np.full((num_windows, len(metrics)), np.nan) for channel in signals}
+
+        # Fill the cached windows first and only compute the others
+        keys = {}
+        missing = {}
+        for channel, signal in signals.items():
+            windows = WindowedEntropyEngine.segment(signal, window_size)
+            keys[channel] = [EntropyAnalyzer.window_key(cache, fingerprint, channel, offset, i, window_size,
+                                                        windows[i]) for i in range(num_windows)]
+            # Skipped windows count as found, so they are never computed
+            found = EntropyAnalyzer.masked_windows((masks or {}).get(channel), window_size, num_windows)
+            for i, key in enumerate(keys[channel]):
+                if found[i]:
+                    continue
+                cached = cache.get(key)
+                if cached is not None:
+                    values[channel][i] = cached
+                    found[i] = True
+            missing[channel] = np.flatnonzero(~found)
+            if coarse_first:
+                missing[channel] = EntropyAnalyzer.coarse_to_fine(missing[channel])
+
+        def snapshot():
+            return {channel: [dict(zip(metrics, map(float, window))) for window in channel_values]
+                    for channel, channel_values in values.items()}
+
+        last_yield = time.monotonic()
+        if any(len(indices) for indices in missing.values()):
+            for channel, indices, results in executor.iter_entropies(signals, window_size,
+                                                                     engine_params=EntropyAnalyzer.ENGINE_PARAMS,
+                                                                     window_indices=missing):
+                for metric, window_values in results.items():
+                    values[channel][indices, metrics.index(metric)] = window_values
+                if min_interval_sec is not None and time.monotonic() - last_yield >= min_interval_sec:
+                    last_yield = time.monotonic()
+                    yield snapshot()
+
+            for channel, indices in missing.items():
+                for i in indices:
+                    cache.put(keys[channel][i], values[channel][i].copy())
+        yield snapshot()
+
+    @staticmethod
+    def coarse_to_fine(indices):
+        """
+        Orders window indices so that every prefix is spread evenly over the signal: the multiples of the
+        largest power of two first, then the indices halfway between them, and so on.
+
+        :param indices: 1D array of window indices.
+        :return: The same indices, reordered.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        # The lowest set bit of an index is the finest power of two it is a multiple of (index 0 goes first)
+        lowest_bit = np.where(indices > 0, indices & -indices, np.iinfo(np.intp).max)
+        return indices[np.argsort(-lowest_bit, kind="stable")]
+
     @staticmethod
     def _calculate_entropies(window_signal):
         """
@@ -49,6 +341,7 @@ class EntropyAnalyzer:
         :param window_signal: The EEG signal window.
         :return: Dictionary with entropy values for Shannon, Approximate, and Sample Entropy.
         """
+        import neurokit2 as nk  # Only needed by this reference path, and slow to import
         return {
             "Shannon": nk.entropy_shannon(window_signal)[0],
             "Approximate": nk.entropy_approximate(window_signal)[0],
@@ -0,0 +1,230 @@
+# components/entropy_engine.py
+
+import numpy as np
+
+
+class WindowedEntropyEngine:
+    """
+    Class to compute Shannon, Approximate and Sample Entropy for every window of a signal at once.
+
+    The signal is segmented with a strided (zero-copy) view and each measure is computed for batches of
+    windows at once. Template matches for ApEn and SampEn are counted from sorted coordinates instead of
+    pairwise distances: for each embedding coordinate the templates are sorted once, so the templates
+    within the tolerance of a value form a contiguous range of the sorted order. That range is stored as
+    a bitset (the XOR of two prefix bitsets), matches over all coordinates are the bitwise AND of those
+    bitsets, and counts are a popcount. The same pass yields the counts for dimensions m and m+1.
+
+    The definitions follow neurokit2 (``entropy_shannon``, ``entropy_approximate`` and ``entropy_sample``
+    with their default arguments): base-2 Shannon entropy of the sample values, Chebyshev distance, and a
+    tolerance of ``tolerance_sd`` times the standard deviation (ddof=1) of each window. Match counts are
+    exact, so results agree with neurokit2 up to floating-point summation order (absolute difference
+    below 1e-9); only pairs at a distance within one rounding error of the tolerance could be classified
+    differently.
+    """
+
+    TOLERANCE = 1e-9  # Documented maximum absolute difference from neurokit2
+    MAX_BATCH_WORDS = 4 * 1024 ** 2  # Bound on the bitset words held at once (32 MB)
+    BITSET_ARRAYS = 4  # Bitset arrays alive at once: prefix, range, its XOR operand and the matches
+
+    def __init__(self, dimension=2, delay=1, tolerance_sd=0.2):
+        """
+        Initialize the engine with the embedding parameters.
+
+        :param dimension: Embedding dimension m (default: 2).
+        :param delay: Embedding delay in samples (default: 1).
+        :param tolerance_sd: Tolerance r as a fraction of each window's standard deviation (default: 0.2).
+        """
+        self.dimension = dimension
+        self.delay = delay
+        self.tolerance_sd = tolerance_sd
+
+    @staticmethod
+    def segment(signal, window_size, hop_size=None):
+        """
+        Segment a signal into windows without copying it.
+
+        :param signal: The EEG signal data (1D array-like).
+        :param window_size: Window size in samples.
+        :param hop_size: Distance between the starts of consecutive windows in samples (default: window_size,
+                         i.e. non-overlapping windows).
+        :return: Read-only 2D view of shape (num_windows, window_size).
+        """
+        signal = np.asarray(signal)
+        hop_size = hop_size or window_size
+        if len(signal) < window_size:
+            return np.empty((0, window_size), dtype=signal.dtype)
+        return np.lib.stride_tricks.sliding_window_view(signal, window_size)[::hop_size]
+
+    def tolerances(self, windows):
+        """
+        Tolerance r of each window.
+
+        :param windows: 2D array of shape (num_windows, window_size).
+        :return: 1D array with one tolerance per window.
+        """
+        return self.tolerance_sd * np.std(windows, axis=1, ddof=1)
+
+    @staticmethod
+    def shannon(windows):
+        """
+        Shannon entropy (base 2) of the sample values of each window.
+
+        :param windows: 2D array of shape (num_windows, window_size).
+        :return: 1D array with one entropy value per window.
+        """
+        num_windows, window_size = windows.shape
+        if num_windows == 0:
+            return np.empty(0)
+        ordered = np.sort(windows, axis=1)
+
+        # Runs of equal values in the sorted rows are the symbols; every row starts a new run
+        new_run = np.ones(ordered.shape, dtype=bool)
+        new_run[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+        starts = np.flatnonzero(new_run)
+        counts = np.diff(np.append(starts, ordered.size))
+        probabilities = counts / window_size
+        return np.bincount(starts // window_size, weights=-probabilities * np.log2(probabilities),
+                           minlength=num_windows)
+
+    def match_counts(self, windows, tolerances):
+        """
+        Count, for every template, the templates of the same window within its tolerance (itself included),
+        for the embedding dimensions m and m+1.
+
+        The bitsets are built for blocks of words (64 templates each) at a time, so the prefix bitsets and the
+        range bitsets of the templates held at once stay within MAX_BATCH_WORDS however long the windows are.
+
+        :param windows: 2D array of shape (num_windows, window_size).
+        :param tolerances: 1D array with the tolerance of each window.
+        :return: Tuple (count_m, count_m1, count_m_trimmed) where count_m has one row of N-(m-1)*delay
+                 counts per window, count_m1 one row of N-m*delay counts, and count_m_trimmed the counts of
+                 the m-templates without the last one (as used by SampEn).
+        """
+        num_windows, window_size = windows.shape
+        num_templates = window_size - (self.dimension - 1) * self.delay
+        words = -(-num_templates // 64)
+        window_idx = np.arange(num_windows)[:, None]
+        block_words = max(1, min(words, self.MAX_BATCH_WORDS // (self.BITSET_ARRAYS * max(1, num_windows)
+                                                                  * (num_templates + 1))))
+
+        # Coordinate k of every template (only N-m*delay templates exist at dimension m+1), its sort order and
+        # the contiguous range of the sorted order within tolerance of each template
+        orders, lows, highs = [], [], []
+        for k in range(self.dimension + 1):
+            length = num_templates if k < self.dimension else window_size - self.dimension * self.delay
+            coordinate = windows[:, k * self.delay:k * self.delay + length]
+            order = np.argsort(coordinate, axis=1, kind="stable")
+            ordered = np.take_along_axis(coordinate, order, axis=1)
+            low = np.empty(coordinate.shape, dtype=np.intp)
+            high = np.empty(coordinate.shape, dtype=np.intp)
+            for w in range(num_windows):
+                low[w] = np.searchsorted(ordered[w], coordinate[w] - tolerances[w], side="left")
+                high[w] = np.searchsorted(ordered[w], coordinate[w] + tolerances[w], side="right")
+            orders.append(order)
+            lows.append(low)
+            highs.append(high)
+
+        count_m = np.zeros((num_windows, num_templates), dtype=np.int64)
+        count_m1 = np.zeros((num_windows, window_size - self.dimension * self.delay), dtype=np.int64)
+        last = num_templates - 1
+        last_bit = np.zeros((num_windows, last), dtype=np.int64)
+        for first_word in range(0, words, block_words):
+            stop_word = min(first_word + block_words, words)
+            matches = None
+            for k, (order, low, high) in enumerate(zip(orders, lows, highs)):
+                length = order.shape[1]
+
+                # prefix[w, t] holds the words of this block of the bitset of the t templates with the smallest
+                # coordinate k
+                prefix = np.zeros((num_windows, length + 1, stop_word - first_word), dtype=np.uint64)
+                rows, ranks = np.nonzero((order >= 64 * first_word) & (order < 64 * stop_word))
+                templates = order[rows, ranks]
+                prefix[rows, ranks + 1, templates // 64 - first_word] = np.left_shift(
+                    np.uint64(1), (templates % 64).astype(np.uint64))
+                del rows, ranks, templates
+                np.bitwise_or.accumulate(prefix, axis=1, out=prefix)
+
+                in_range = prefix[window_idx, high]
+                in_range ^= prefix[window_idx, low]
+                del prefix
+
+                if matches is None:
+                    matches = in_range
+                else:
+                    matches = matches[:, :length]
+                    matches &= in_range
+                del in_range
+                if k == self.dimension - 1:
+                    count_m += np.bitwise_count(matches).sum(axis=2, dtype=np.int64)
+                    # SampEn leaves out the last m-template: drop its bit from the other templates' matches
+                    if first_word <= last // 64 < stop_word:
+                        last_bit = ((matches[:, :last, last // 64 - first_word] >> np.uint64(last % 64))
+                                    & np.uint64(1)).astype(np.int64)
+            count_m1 += np.bitwise_count(matches).sum(axis=2, dtype=np.int64)
+            del matches
+        count_m_trimmed = count_m[:, :last] - last_bit
+        return count_m.astype(np.float64), count_m1.astype(np.float64), count_m_trimmed.astype(np.float64)
+
+    def approximate_and_sample(self, windows, tolerances=None):
+        """
+        Approximate Entropy and Sample Entropy of each window.
+
+        :param windows: 2D array of shape (num_windows, window_size).
+        :param tolerances: Tolerance of each window (default: tolerance_sd times the window's standard deviation).
+        :return: Tuple (approximate, sample) of 1D arrays with one value per window.
+        """
+        windows = np.asarray(windows, dtype=np.float64)
+        if tolerances is None:
+            tolerances = self.tolerances(windows)
+        num_windows, window_size = windows.shape
+        approximate = np.empty(num_windows)
+        sample = np.empty(num_windows)
+
+        # Process the windows in batches so their bitsets stay within MAX_BATCH_WORDS; a window whose bitsets
+        # alone exceed it is processed on its own, in blocks of words (see match_counts)
+        words_per_window = self.BITSET_ARRAYS * (window_size + 1) * (-(-window_size // 64))
+        batch = max(1, self.MAX_BATCH_WORDS // words_per_window)
+        for start in range(0, num_windows, batch):
+            stop = min(start + batch, num_windows)
+            count_m, count_m1, count_m_trimmed = self.match_counts(windows[start:stop], tolerances[start:stop])
+            n_m, n_m1 = count_m.shape[1], count_m1.shape[1]
+
+            # ApEn: |phi_m - phi_m+1| with phi the mean log-fraction of matching templates
+            phi_m = np.mean(np.log(count_m / n_m), axis=1)
+            phi_m1 = np.mean(np.log(count_m1 / n_m1), axis=1)
+            approximate[start:stop] = np.abs(phi_m - phi_m1)
+
+            # SampEn: ratio of the mean match fractions (self-matches excluded) at m+1 and m
+            a = np.mean((count_m_trimmed - 1) / (n_m - 2), axis=1)
+            b = np.mean((count_m1 - 1) / (n_m1 - 1), axis=1)
+            sample[start:stop] = [self.phi_divide(a_w, b_w) for a_w, b_w in zip(a, b)]
+        return approximate, sample
+
+    @staticmethod
+    def phi_divide(phi_m, phi_m1):
+        """
+        Sample entropy from the two phi values, with the same edge cases as neurokit2.
+        """
+        if np.isclose(phi_m, 0):
+            return -np.inf
+        ratio = phi_m1 / phi_m
+        if np.isclose(ratio, 0):
+            return np.inf
+        if ratio < 0:
+            return np.nan
+        return -np.log(ratio)
+
+    def compute(self, windows):
+        """
+        Compute every entropy measure for each window.
+
+        :param windows: 2D array of shape (num_windows, window_size).
+        :return: Dictionary mapping "Shannon", "Approximate" and "Sample" to 1D arrays with one value per window.
+        """
+        windows = np.asarray(windows, dtype=np.float64)
+        approximate, sample = self.approximate_and_sample(windows)
+        return {
+            "Shannon": self.shannon(windows),
+            "Approximate": approximate,
+            "Sample": sample,
+        }
@@ -0,0 +1,187 @@
+# components/entropy_executor.py
+
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from components.entropy_engine import WindowedEntropyEngine
+
+
+def _entropy_task(shm_name, shape, dtype, row, window_size, hop_size, indices, metric, engine_params):
+    """
+    Worker task: compute one metric group for some windows of one channel held in shared memory.
+
+    :return: Tuple (row, indices, results) where results maps metric names to arrays of window values.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        signals = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        engine = WindowedEntropyEngine(**engine_params)
+        windows = np.asarray(engine.segment(signals[row], window_size, hop_size)[indices], dtype=np.float64)
+        if metric == "Shannon":
+            results = {"Shannon": engine.shannon(windows)}
+        else:
+            approximate, sample = engine.approximate_and_sample(windows)
+            results = {"Approximate": approximate, "Sample": sample}
+        del signals, windows
+        return row, indices, results
+    finally:
+        shm.close()
+
+
+class ParallelEntropyExecutor:
+    """
+    Class to spread windowed entropy computations over a pool of worker processes.
+
+    The signals are copied once into a shared-memory block; every task only receives its name, so no
+    samples are pickled. Tasks are (channel, range of windows, metric group) triples, where the metric
+    groups are "Shannon" and "Template" (ApEn and SampEn, which share their template-match counts), and
+    results are yielded as soon as each task finishes.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # Estimated peak memory of one worker process: the interpreter and NumPy, the windows of a task as float64
+    # and the template-match bitsets, which WindowedEntropyEngine bounds to MAX_BATCH_WORDS
+    WORKER_MEMORY_MB = 64 + 2 * WindowedEntropyEngine.MAX_BATCH_WORDS * 8 // 1024 ** 2
+
+    def __init__(self, max_workers=None, tasks_per_worker=4, memory_budget_mb=None):
+        """
+        Initializes the executor and its process pool.
+
+        :param max_workers: Number of worker processes (default: as many as fit in memory_budget_mb, at most
+                            the number of CPUs).
+        :param tasks_per_worker: Target number of template-match tasks per worker, for load balancing (default: 4).
+        :param memory_budget_mb: Memory the workers may use together, in MB (default: half the available
+                                 physical memory).
+        """
+        self.max_workers = max_workers or self.workers_for_budget(memory_budget_mb)
+        self.tasks_per_worker = tasks_per_worker
+        # Worker processes are spawned rather than forked, which is unsafe from a multi-threaded server
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                        mp_context=multiprocessing.get_context("spawn"))
+
+    @classmethod
+    def workers_for_budget(cls, memory_budget_mb=None):
+        """
+        Number of workers whose peak memory fits in a budget, at most the number of CPUs and at least one.
+
+        :param memory_budget_mb: Memory the workers may use together, in MB (default: half the available
+                                 physical memory, or 2 GB where it cannot be queried).
+        :return: Number of worker processes.
+        """
+        if memory_budget_mb is None:
+            try:
+                available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+                memory_budget_mb = available // 2 // 1024 ** 2
+            except (AttributeError, ValueError, OSError):
+                memory_budget_mb = 2048
+        return max(1, min(os.cpu_count() or 1, int(memory_budget_mb // cls.WORKER_MEMORY_MB)))
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the executor shared by the whole process. Its number of workers can be set with the
+        EEG_ENTROPY_WORKERS environment variable, or derived from the memory budget in EEG_ENTROPY_MEMORY_MB.
+
+        :return: The shared ParallelEntropyExecutor instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                workers = os.environ.get("EEG_ENTROPY_WORKERS")
+                budget = os.environ.get("EEG_ENTROPY_MEMORY_MB")
+                cls._shared = cls(max_workers=int(workers) if workers else None,
+                                  memory_budget_mb=float(budget) if budget else None)
+            return cls._shared
+
+    def iter_entropies(self, signals, window_size, hop_size=None, engine_params=None, window_indices=None):
+        """
+        Computes the entropies of the windows of every channel, yielding partial results as they finish.
+
+        :param signals: Dictionary mapping channel names to 1D signals of the same length.
+        :param window_size: Window size in samples.
+        :param hop_size: Distance between window starts in samples (default: window_size).
+        :param engine_params: Keyword arguments for the WindowedEntropyEngine (dimension, delay, tolerance_sd).
+        :param window_indices: Optional dictionary mapping channel names to the indices of the windows to
+                               compute (default: every window of every channel).
+        :return: Generator of tuples (channel, indices, results) where results maps metric names to arrays
+                 with the values of the windows listed in indices.
+        """
+        names = list(signals)
+        if not names:
+            return
+        hop_size = hop_size or window_size
+        engine_params = engine_params or {}
+        stacked = np.stack([np.asarray(signals[name]) for name in names])
+        num_samples = stacked.shape[1]
+        num_windows = 0 if num_samples < window_size else (num_samples - window_size) // hop_size + 1
+        if num_windows == 0:
+            return
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, stacked.nbytes))
+        shared = None
+        futures = []
+        try:
+            shared = np.ndarray(stacked.shape, dtype=stacked.dtype, buffer=shm.buf)
+            shared[:] = stacked
+            del stacked
+
+            if window_indices is None:
+                window_indices = {name: np.arange(num_windows) for name in names}
+            window_indices = {name: np.asarray(window_indices.get(name, []), dtype=np.intp) for name in names}
+
+            # Split the template-match work so every worker gets several tasks
+            target_tasks = self.max_workers * self.tasks_per_worker
+            total_windows = sum(len(indices) for indices in window_indices.values())
+            per_task = max(1, math.ceil(total_windows / target_tasks))
+            args = (shm.name, shared.shape, shared.dtype.str)
+            for row, name in enumerate(names):
+                indices = window_indices[name]
+                if len(indices) == 0:
+                    continue
+                futures.append(self.pool.submit(_entropy_task, *args, row, window_size, hop_size,
+                                                indices, "Shannon", engine_params))
+                for start in range(0, len(indices), per_task):
+                    futures.append(self.pool.submit(_entropy_task, *args, row, window_size, hop_size,
+                                                    indices[start:start + per_task], "Template", engine_params))
+
+            for future in as_completed(futures):
+                row, indices, results = future.result()
+                yield names[row], indices, results
+        finally:
+            shared = None
+            shm.close()
+            self._release(shm, futures)
+
+    @staticmethod
+    def _release(shm, futures):
+        """
+        Cancels the tasks that are still pending (e.g. when the page reran and the consumer stopped early) and
+        unlinks the shared-memory block once the others have finished: tasks already handed to a worker,
+        running or waiting in its call queue, cannot be cancelled and attach to the block by name.
+        """
+        pending = {future for future in futures if not future.cancel() and not future.done()}
+        if not pending:
+            shm.unlink()
+            return
+        lock = threading.Lock()
+
+        def finished(future):
+            with lock:
+                pending.discard(future)
+                last = not pending
+            if last:
+                shm.unlink()
+
+        for future in list(pending):
+            future.add_done_callback(finished)
+
+    def shutdown(self):
+        """
+        Shuts the worker processes down.
+        """
+        self.pool.shutdown(wait=True, cancel_futures=True)
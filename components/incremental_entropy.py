@@ -0,0 +1,225 @@
+# components/incremental_entropy.py
+
+import numpy as np
+from components.entropy_engine import WindowedEntropyEngine
+
+
+class IncrementalEntropyEngine:
+    """
+    Class to compute Shannon, Approximate and Sample Entropy over a sliding window, updating them as
+    samples enter and leave the window instead of recomputing every window from scratch.
+
+    Shannon entropy is kept as a histogram of the sample values together with the sum of c*log2(c) over its
+    counts, which changes by O(1) per sample. ApEn and SampEn are kept as, for every template of the window,
+    the number of templates within tolerance (for dimensions m and m+1, and for the m-templates without the
+    last one, as used by SampEn). When the window moves by a hop, only the distances between the templates
+    that leave or enter and the rest of the window are computed, so an update costs O(hop * window).
+
+    Match counts are only stable if the tolerance does not change with the window, so it is fixed: either
+    given in signal units or taken once as ``tolerance_sd`` times the standard deviation of the first full
+    window. With the same tolerance, results equal WindowedEntropyEngine's.
+    """
+
+    def __init__(self, window_size, dimension=2, delay=1, tolerance=None, tolerance_sd=0.2):
+        """
+        Initialize the engine with an empty window.
+
+        :param window_size: Window size in samples.
+        :param dimension: Embedding dimension m (default: 2).
+        :param delay: Embedding delay in samples (default: 1).
+        :param tolerance: Fixed tolerance r in signal units (default: derived from the first full window).
+        :param tolerance_sd: Tolerance as a fraction of the first window's standard deviation, used when
+                             tolerance is None (default: 0.2).
+        """
+        self.window_size = window_size
+        self.dimension = dimension
+        self.delay = delay
+        self.tolerance = tolerance
+        self.tolerance_sd = tolerance_sd
+        self.engine = WindowedEntropyEngine(dimension, delay, tolerance_sd)
+
+        # Number of templates of each tracked set: m-templates, m-templates without the last one, (m+1)-templates
+        num_templates = window_size - (dimension - 1) * delay
+        self._sets = {
+            "m": (dimension, num_templates),
+            "m_trimmed": (dimension, num_templates - 1),
+            "m1": (dimension + 1, window_size - dimension * delay),
+        }
+        self.reset()
+
+    def reset(self):
+        """
+        Empty the window (the tolerance derived from a previous first window is kept).
+        """
+        self.window = np.empty(0)
+        self.counts = {}
+        self._histogram = {}
+        self._sum_c_log_c = 0.0
+
+    @property
+    def ready(self):
+        """
+        Whether the window is full, i.e. whether entropies() can be called.
+        """
+        return len(self.window) == self.window_size
+
+    def push(self, samples):
+        """
+        Append new samples; the window becomes the last window_size samples seen.
+
+        :param samples: 1D array-like of new samples.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        if not self.ready:
+            missing = self.window_size - len(self.window)
+            self.window = np.concatenate((self.window, samples[:missing]))
+            samples = samples[missing:]
+            if self.ready:
+                self._initialize()
+        if len(samples) == 0:
+            return
+
+        smallest_set = min(size for _, size in self._sets.values())
+        if len(samples) >= smallest_set:
+            # Hardly anything stays in the window: start over from its last samples
+            self.window = np.concatenate((self.window, samples))[-self.window_size:]
+            self._initialize()
+            return
+
+        extended = np.concatenate((self.window, samples))
+        self._slide(extended, len(samples))
+        self._update_histogram(self.window[:len(samples)], samples)
+        self.window = extended[len(samples):]
+
+    def _initialize(self):
+        """
+        Compute the histogram and the match counts of a full window from scratch.
+        """
+        if self.tolerance is None:
+            self.tolerance = float(self.engine.tolerances(self.window[None, :])[0])
+        count_m, count_m1, count_m_trimmed = self.engine.match_counts(self.window[None, :],
+                                                                      np.array([self.tolerance]))
+        self.counts = {"m": count_m[0].astype(np.int64), "m_trimmed": count_m_trimmed[0].astype(np.int64),
+                       "m1": count_m1[0].astype(np.int64)}
+        values, counts = np.unique(self.window, return_counts=True)
+        self._histogram = dict(zip(values.tolist(), counts.tolist()))
+        self._sum_c_log_c = float(np.sum(counts * np.log2(counts)))
+
+    def _close(self, extended, rows, cols, shift):
+        """
+        Boolean matrix of the template pairs whose coordinate at the given shift is within tolerance.
+
+        :param extended: Samples the templates are taken from.
+        :param rows: Slice of the start positions of the row templates.
+        :param cols: Slice of the start positions of the column templates.
+        :param shift: Offset of the coordinate from the start of the templates, in samples.
+        """
+        a = extended[rows.start + shift:rows.stop + shift]
+        b = extended[cols.start + shift:cols.stop + shift]
+        return np.abs(a[:, None] - b[None, :]) <= self.tolerance
+
+    def _slide(self, extended, hop):
+        """
+        Update the match counts of every set of templates when the window moves by hop samples.
+
+        Templates are identified by their start position in extended (the current window followed by the hop
+        new samples). The matches of the templates that leave and of those that enter any set are computed
+        once against every template, for m coordinates, and refined with the last coordinate for m+1.
+
+        :param extended: The current window followed by the hop new samples.
+        :param hop: Number of new samples.
+        """
+        n_m, n_m1 = self._sets["m"][1], self._sets["m1"][1]
+        leaving, entering = slice(0, hop), slice(n_m1, n_m + hop)
+        every = slice(0, n_m + hop)
+        rows = {}
+        for name, block in (("leaving", leaving), ("entering", entering)):
+            matches = None
+            for k in range(self.dimension):
+                close = self._close(extended, block, every, k * self.delay)
+                matches = close if matches is None else matches & close
+            rows[name] = matches
+
+        # (m+1)-templates only start up to n_m1 + hop; the first entering rows are the (m+1) ones
+        tail = slice(0, n_m1 + hop)
+        matches_m1 = {
+            "leaving": rows["leaving"][:, tail] & self._close(extended, leaving, tail, self.dimension * self.delay),
+            "entering": rows["entering"][:hop, tail] & self._close(extended, slice(n_m1, n_m1 + hop), tail,
+                                                                   self.dimension * self.delay),
+        }
+
+        for name, (_, size) in self._sets.items():
+            if name == "m1":
+                leaving_rows, entering_rows = matches_m1["leaving"], matches_m1["entering"]
+            else:
+                # Entering templates of this set start at positions size..size+hop-1
+                leaving_rows = rows["leaving"]
+                entering_rows = rows["entering"][size - n_m1:size - n_m1 + hop]
+            counts = (self.counts[name][hop:] - leaving_rows[:, hop:size].sum(axis=0)
+                      + entering_rows[:, hop:size].sum(axis=0))
+            self.counts[name] = np.concatenate((counts, entering_rows[:, hop:size + hop].sum(axis=1)))
+
+    def _update_histogram(self, removed, added):
+        """
+        Update the value histogram and the sum of c*log2(c) over its counts.
+        """
+        def term(count):
+            return count * np.log2(count) if count > 0 else 0.0
+
+        for values, sign in ((removed, -1), (added, 1)):
+            unique, counts = np.unique(values, return_counts=True)
+            for value, count in zip(unique.tolist(), counts.tolist()):
+                old = self._histogram.get(value, 0)
+                new = old + sign * count
+                self._sum_c_log_c += term(new) - term(old)
+                if new:
+                    self._histogram[value] = new
+                else:
+                    del self._histogram[value]
+
+    def entropies(self):
+        """
+        Entropy measures of the current window.
+
+        :return: Dictionary with the Shannon, Approximate and Sample Entropy of the window.
+        """
+        if not self.ready:
+            raise ValueError(f"The window holds {len(self.window)} of {self.window_size} samples.")
+        n = self.window_size
+        shannon = np.log2(n) - self._sum_c_log_c / n
+
+        count_m, count_m1, count_m_trimmed = self.counts["m"], self.counts["m1"], self.counts["m_trimmed"]
+        n_m, n_m1 = len(count_m), len(count_m1)
+        approximate = abs(np.mean(np.log(count_m / n_m)) - np.mean(np.log(count_m1 / n_m1)))
+        a = np.mean((count_m_trimmed - 1) / (n_m - 2))
+        b = np.mean((count_m1 - 1) / (n_m1 - 1))
+        return {
+            "Shannon": float(shannon),
+            "Approximate": float(approximate),
+            "Sample": float(self.engine.phi_divide(a, b)),
+        }
+
+    def compute(self, signal, hop_size):
+        """
+        Entropy measures of every window of a signal, with windows starting every hop_size samples.
+
+        :param signal: The EEG signal data (1D array-like).
+        :param hop_size: Distance between the starts of consecutive windows in samples.
+        :return: Dictionary mapping "Shannon", "Approximate" and "Sample" to 1D arrays with one value per window.
+        """
+        signal = np.asarray(signal, dtype=np.float64)
+        self.reset()
+        results = {"Shannon": [], "Approximate": [], "Sample": []}
+        if len(signal) < self.window_size:
+            return {metric: np.empty(0) for metric in results}
+
+        self.push(signal[:self.window_size])
+        end = self.window_size
+        while True:
+            for metric, value in self.entropies().items():
+                results[metric].append(value)
+            if end + hop_size > len(signal):
+                break
+            self.push(signal[end:end + hop_size])
+            end += hop_size
+        return {metric: np.array(values) for metric, values in results.items()}
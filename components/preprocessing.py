@@ -0,0 +1,175 @@
+# components/preprocessing.py
+
+import numpy as np
+import scipy.signal
+from components.profiler import Stage
+
+
+class EEGPreprocessor:
+    """
+    Class to filter EEG signals and mark their artifacts before they are analyzed.
+
+    The filters (a Butterworth bandpass and an optional notch at the power-line frequency) are combined into a
+    single cascade of second-order sections and applied forward and backward (zero phase, so peaks are not
+    shifted in time) along the time axis of a whole (channels x samples) array at once. The mean of each
+    channel (the ADC offset) is removed first, so the filter starts without a step.
+
+    Artifacts are marked per epoch of epoch_sec seconds and per channel, all epochs at once from a
+    (channels x epochs x samples) view: an epoch is marked when its peak amplitude is above
+    amplitude_threshold (or above amplitude_z times the median epoch standard deviation of its channel), or
+    when the log of its variance is more than variance_z robust standard deviations away from the median of
+    its channel, which catches eye blinks and movements. Since these thresholds are relative to the channel,
+    an epoch is also marked when its standard deviation is below flat_sd, which catches electrodes that are
+    flat or disconnected for the whole recording.
+    """
+
+    BLOCK_MAX_MB = 256  # Bound on the samples filtered or split into epochs in one call
+
+    def __init__(self, sampling_rate=1000, low_freq=0.5, high_freq=45, notch_freq=50, notch_quality=30, order=4,
+                 epoch_sec=1, amplitude_threshold=None, amplitude_z=5, variance_z=3, flat_sd=0.01):
+        """
+        Initializes the preprocessor with its filter and artifact settings.
+
+        :param sampling_rate: Sampling rate of the signals (default: 1000 Hz).
+        :param low_freq: Lower cut-off of the bandpass in Hz, or None for a lowpass (default: 0.5 Hz).
+        :param high_freq: Upper cut-off of the bandpass in Hz, or None for a highpass (default: 45 Hz).
+        :param notch_freq: Frequency removed by the notch filter in Hz, or None for no notch (default: 50 Hz).
+        :param notch_quality: Quality factor of the notch; its width is notch_freq / notch_quality (default: 30).
+        :param order: Order of the Butterworth filter, doubled by the forward-backward pass (default: 4).
+        :param epoch_sec: Duration of the epochs in which artifacts are marked (default: 1 second).
+        :param amplitude_threshold: Peak absolute amplitude of the filtered signal above which an epoch is
+                                    marked, in signal units (default: None, relative to each channel).
+        :param amplitude_z: Peak amplitude, in median epoch standard deviations of the channel, above which an
+                            epoch is marked when amplitude_threshold is None (default: 5).
+        :param variance_z: Robust z-score of the log variance beyond which an epoch is marked (default: 3).
+        :param flat_sd: Standard deviation of the filtered signal below which an epoch is marked as flat, in
+                        signal units (default: 0.01, far below the noise of microvolt or ADC count data).
+        """
+        self.sampling_rate = sampling_rate
+        self.low_freq = low_freq
+        self.high_freq = high_freq
+        self.notch_freq = notch_freq
+        self.notch_quality = notch_quality
+        self.order = order
+        self.epoch_sec = epoch_sec
+        self.amplitude_threshold = amplitude_threshold
+        self.amplitude_z = amplitude_z
+        self.variance_z = variance_z
+        self.flat_sd = flat_sd
+
+    @property
+    def epoch_size(self):
+        """
+        Number of samples of an artifact epoch.
+        """
+        return max(1, int(self.epoch_sec * self.sampling_rate))
+
+    def key(self):
+        """
+        Returns a hashable description of the settings, to tell apart the results of different settings.
+
+        :return: Tuple of (name, value) pairs.
+        """
+        return tuple(sorted(vars(self).items()))
+
+    def sos(self):
+        """
+        Returns the second-order sections of the bandpass and notch filters.
+
+        :return: Array of shape (sections, 6), or None if no filter is enabled.
+        """
+        nyquist = self.sampling_rate / 2
+        low = self.low_freq if self.low_freq and self.low_freq > 0 else None
+        high = self.high_freq if self.high_freq and self.high_freq < nyquist else None
+        sections = []
+        if low and high:
+            sections.append(scipy.signal.butter(self.order, (low, high), btype="bandpass", fs=self.sampling_rate,
+                                                output="sos"))
+        elif low or high:
+            sections.append(scipy.signal.butter(self.order, low or high, btype="highpass" if low else "lowpass",
+                                                fs=self.sampling_rate, output="sos"))
+        if self.notch_freq and 0 < self.notch_freq < nyquist:
+            b, a = scipy.signal.iirnotch(self.notch_freq, self.notch_quality, fs=self.sampling_rate)
+            sections.append(scipy.signal.tf2sos(b, a))
+        return np.vstack(sections) if sections else None
+
+    @Stage("preprocess")
+    def filter(self, signals):
+        """
+        Removes the mean of every channel and applies the zero-phase filters.
+
+        :param signals: 1D signal or (channels x samples) array.
+        :return: float32 array of the same shape.
+        """
+        signals = np.asarray(signals)
+        rows = signals.reshape(-1, signals.shape[-1])
+        filtered = np.empty(rows.shape, dtype=np.float32)
+        sos = self.sos()
+        # The edges are extended by mirroring about one period of the lower cut-off; the default odd extension
+        # about the edge sample turns the noise of that sample into a step, which rings into the first epoch
+        padding = int(self.sampling_rate / self.low_freq) if self.low_freq else self.sampling_rate
+        channels_per_block = max(1, self.BLOCK_MAX_MB * 1024 ** 2 // (8 * max(1, rows.shape[1])))
+        for start in range(0, rows.shape[0], channels_per_block):
+            block = rows[start:start + channels_per_block].astype(np.float64)
+            block -= block.mean(axis=-1, keepdims=True) if block.shape[1] else 0
+            if sos is not None and block.shape[1] > 1:
+                block = scipy.signal.sosfiltfilt(sos, block, axis=-1, padtype="even",
+                                                 padlen=min(padding, block.shape[1] - 1))
+            filtered[start:start + channels_per_block] = block
+        return filtered.reshape(signals.shape)
+
+    def artifact_mask(self, signals):
+        """
+        Marks the epochs of every channel that hold artifacts; a last partial epoch is judged on its samples.
+
+        :param signals: 1D signal or (channels x samples) array, usually filtered.
+        :return: Boolean array of shape (epochs,) or (channels, epochs), True for the marked epochs.
+        """
+        signals = np.asarray(signals)
+        rows = signals.reshape(-1, signals.shape[-1])
+        num_channels, num_samples = rows.shape
+        num_epochs = -(-num_samples // self.epoch_size)
+        if not num_epochs:
+            return np.zeros(signals.shape[:-1] + (0,), dtype=bool)
+
+        peaks = np.empty((num_channels, num_epochs))
+        variances = np.empty((num_channels, num_epochs))
+        channels_per_block = max(1, self.BLOCK_MAX_MB * 1024 ** 2 // (8 * num_epochs * self.epoch_size))
+        for start in range(0, num_channels, channels_per_block):
+            # Epochs as a (channels x epochs x samples) array; the last one is padded with NaN
+            block = rows[start:start + channels_per_block]
+            padded = np.full((len(block), num_epochs * self.epoch_size), np.nan, dtype=np.float32)
+            padded[:, :num_samples] = block
+            epochs = padded.reshape(len(block), num_epochs, self.epoch_size)
+            means = np.nanmean(epochs, axis=-1, keepdims=True)
+            peaks[start:start + len(block)] = np.nanmax(np.abs(epochs - means), axis=-1)
+            variances[start:start + len(block)] = np.nanvar(epochs, axis=-1)
+
+        deviations = np.sqrt(variances)
+        threshold = (self.amplitude_threshold if self.amplitude_threshold is not None
+                     else self.amplitude_z * np.median(deviations, axis=-1, keepdims=True))
+        mask = peaks > threshold
+
+        # Robust z-score of the log variance: distance to the median in scaled median absolute deviations
+        log_variances = np.log(np.maximum(variances, np.finfo(np.float32).tiny))
+        centered = log_variances - np.median(log_variances, axis=-1, keepdims=True)
+        spread = 1.4826 * np.median(np.abs(centered), axis=-1, keepdims=True)
+        mask |= np.abs(centered) > self.variance_z * np.maximum(spread, 1e-12)
+        mask |= deviations < self.flat_sd
+        return mask.reshape(signals.shape[:-1] + (num_epochs,))
+
+    @staticmethod
+    def sample_mask(epoch_mask, epoch_size, start_idx, end_idx):
+        """
+        Expands the epoch mask of one channel to its samples within a range.
+
+        :param epoch_mask: 1D boolean array from artifact_mask().
+        :param epoch_size: Number of samples per epoch.
+        :param start_idx: First sample of the range.
+        :param end_idx: End sample (exclusive) of the range.
+        :return: Boolean array with one value per sample of the range.
+        """
+        first, last = start_idx // epoch_size, -(-end_idx // epoch_size)
+        samples = np.repeat(np.asarray(epoch_mask[first:last], dtype=bool), epoch_size)
+        offset = start_idx - first * epoch_size
+        return samples[offset:offset + max(0, end_idx - start_idx)]
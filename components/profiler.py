@@ -0,0 +1,217 @@
+# components/profiler.py
+
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import ContextDecorator
+
+# Profiler recording the current rerun, if any; a context variable, so every Streamlit session has its own
+_active = contextvars.ContextVar("eeg_profiler", default=None)
+
+
+def _rss_bytes():
+    """
+    Returns the current resident set size of the process in bytes, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Stage(ContextDecorator):
+    """
+    Named stage of the work of a rerun (e.g. "load", "transform", "figure"), used as a context manager or a
+    decorator. It only records something while a Profiler is active, and costs one lookup otherwise.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: Name of the stage; stages of the same name are added up in the summary.
+        """
+        self.name = name
+
+    def __enter__(self):
+        profiler = _active.get()
+        if profiler is not None:
+            profiler.open(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        profiler = _active.get()
+        if profiler is not None:
+            profiler.close(self.name)
+        return False
+
+
+class Profiler:
+    """
+    Class to record the timings of the stages of one rerun, with memory deltas and cache hit rates.
+
+    Instrumentation is opt-in: it is enabled with the EEG_PROFILE environment variable or the ``profile``
+    query parameter (see requested()). While the profiler is active (``with profiler:``), every Stage
+    entered in the same thread records an open and a close event with a timestamp and the resident memory.
+    The events can be exported as a Chrome trace (chrome://tracing, Perfetto) or a speedscope file, and the
+    rerun can also be captured with cProfile.
+    """
+
+    def __init__(self, name="rerun", caches=None, capture_cprofile=False):
+        """
+        :param name: Name of the root stage (e.g. the page name).
+        :param caches: Dictionary mapping names to caches with a stats() method returning hits and misses
+                       (e.g. the ResultCache and RecordingStore), whose hit rates over the rerun are reported.
+        :param capture_cprofile: Whether to also run cProfile over the rerun (default: False).
+        """
+        self.name = name
+        self.caches = caches or {}
+        self.events = []  # Tuples (kind "O" or "C", stage name, seconds since start, RSS in bytes or None)
+        self.cprofile = cProfile.Profile() if capture_cprofile else None
+        self.thread_id = None
+        self.started = None
+        self._cache_stats = {}
+        self._token = None
+
+    @staticmethod
+    def requested(query_value=None):
+        """
+        Tells whether profiling is requested, and with which capture.
+
+        :param query_value: Value of the ``profile`` query parameter, if any.
+        :return: None when disabled, "cprofile" to capture the rerun with cProfile, "stages" otherwise.
+        """
+        value = (query_value or os.environ.get("EEG_PROFILE") or "").strip().lower()
+        if value in ("", "0", "false", "no", "off"):
+            return None
+        return "cprofile" if value == "cprofile" else "stages"
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self._cache_stats = {name: cache.stats() for name, cache in self.caches.items()}
+        self._token = _active.set(self)
+        self.open(self.name)
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.close(self.name)
+        _active.reset(self._token)
+        for name, cache in self.caches.items():
+            before, after = self._cache_stats[name], cache.stats()
+            self._cache_stats[name] = {"hits": after["hits"] - before["hits"],
+                                       "misses": after["misses"] - before["misses"]}
+        return False
+
+    def open(self, name):
+        """
+        Records the start of a stage.
+        """
+        self.events.append(("O", name, time.perf_counter() - self.started, _rss_bytes()))
+
+    def close(self, name):
+        """
+        Records the end of a stage.
+        """
+        self.events.append(("C", name, time.perf_counter() - self.started, _rss_bytes()))
+
+    def summary(self):
+        """
+        Adds up the stages of the rerun.
+
+        :return: List of dictionaries (stage, calls, seconds, memory delta in MB), in order of first use.
+        """
+        totals = {}
+        stack = []
+        for kind, name, at, rss in self.events:
+            if kind == "O":
+                stack.append((name, at, rss))
+                continue
+            _, opened_at, opened_rss = stack.pop()
+            entry = totals.setdefault(name, {"stage": name, "calls": 0, "seconds": 0.0, "memory_mb": None})
+            entry["calls"] += 1
+            entry["seconds"] += at - opened_at
+            if rss is not None and opened_rss is not None:
+                entry["memory_mb"] = (entry["memory_mb"] or 0.0) + (rss - opened_rss) / 1024 ** 2
+        order = list(dict.fromkeys(name for kind, name, _, _ in self.events if kind == "O"))
+        return [totals[name] for name in order if name in totals]
+
+    def cache_hit_rates(self):
+        """
+        Returns the cache hits and misses of the rerun.
+
+        :return: Dictionary mapping cache names to dictionaries with hits, misses and hit rate (None without
+                 lookups).
+        """
+        rates = {}
+        for name, stats in self._cache_stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            rates[name] = dict(stats, hit_rate=stats["hits"] / lookups if lookups else None)
+        return rates
+
+    def chrome_trace(self):
+        """
+        Returns the stages in the Chrome trace event format (chrome://tracing, ui.perfetto.dev).
+
+        :return: Dictionary to serialize as JSON.
+        """
+        events = []
+        for kind, name, at, rss in self.events:
+            event = {"name": name, "ph": "B" if kind == "O" else "E", "ts": at * 1e6, "pid": os.getpid(),
+                     "tid": self.thread_id}
+            if rss is not None:
+                event["args"] = {"rss_mb": rss / 1024 ** 2}
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def speedscope(self):
+        """
+        Returns the stages in the evented speedscope format (https://www.speedscope.app).
+
+        :return: Dictionary to serialize as JSON.
+        """
+        frames = list(dict.fromkeys(name for _, name, _, _ in self.events))
+        index = {name: i for i, name in enumerate(frames)}
+        end = self.events[-1][2] if self.events else 0.0
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name} for name in frames]},
+            "profiles": [{
+                "type": "evented", "name": self.name, "unit": "milliseconds", "startValue": 0, "endValue": end * 1e3,
+                "events": [{"type": kind, "frame": index[name], "at": at * 1e3} for kind, name, at, _ in self.events],
+            }],
+            "name": self.name,
+            "exporter": "EEG analysis platform",
+        }
+
+    def cprofile_report(self, limit=40):
+        """
+        Returns the cProfile statistics of the rerun as text, sorted by cumulative time.
+
+        :param limit: Number of functions listed (default: 40).
+        :return: Text report, or None if cProfile was not captured.
+        """
+        if self.cprofile is None:
+            return None
+        output = io.StringIO()
+        pstats.Stats(self.cprofile, stream=output).sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+    def cprofile_dump(self):
+        """
+        Returns the cProfile statistics in the binary pstats format (for snakeviz, gprof2dot, pstats).
+
+        :return: Bytes, or None if cProfile was not captured.
+        """
+        if self.cprofile is None:
+            return None
+        import marshal
+        self.cprofile.create_stats()
+        return marshal.dumps(self.cprofile.stats)
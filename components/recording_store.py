@@ -0,0 +1,213 @@
+# components/recording_store.py
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class RecordingStore:
+    """
+    Class to handle a process-wide, thread-safe store of loaded recordings.
+
+    Every page and every user session asks the same store for a recording, so each file is held in memory
+    once. Entries are keyed by file identity (path, modification time and size), handed out as read-only
+    views, and evicted in least-recently-used order once the configured byte budget is exceeded.
+    """
+
+    DEFAULT_MAX_MB = 1024
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 ** 2):
+        """
+        Initializes an empty store.
+
+        :param max_bytes: Byte budget of the store; the least recently used entries are evicted above it.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the store shared by the whole process. Its budget can be set in megabytes with the
+        EEG_STORE_MAX_MB environment variable.
+
+        :return: The shared RecordingStore instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                max_mb = float(os.environ.get("EEG_STORE_MAX_MB", cls.DEFAULT_MAX_MB))
+                cls._shared = cls(max_bytes=int(max_mb * 1024 ** 2))
+            return cls._shared
+
+    @staticmethod
+    def file_key(file_path):
+        """
+        Returns the identity of a file, used as the key of its recording.
+
+        :param file_path: Path of the file.
+        :return: Tuple (absolute path, modification time in ns, size in bytes).
+        """
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def sizeof(value):
+        """
+        Returns the number of bytes held by a stored value.
+
+        :param value: numpy array, pandas object, object with an ``nbytes`` attribute, or a tuple/list/dict
+                      of them.
+        :return: Size in bytes (the Python object size for values without array data).
+        """
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return int(value.memory_usage(index=False, deep=False).sum())
+        if isinstance(value, dict):
+            return sum(RecordingStore.sizeof(item) for item in value.values())
+        if isinstance(value, (tuple, list)):
+            return sum(RecordingStore.sizeof(item) for item in value)
+        nbytes = getattr(value, "nbytes", None)
+        return int(nbytes) if nbytes is not None else sys.getsizeof(value)
+
+    @staticmethod
+    def read_only(value):
+        """
+        Returns a read-only view of a stored value; arrays inside tuples, lists and dicts are wrapped as well.
+
+        :param value: The stored value.
+        :return: The value with every numpy array replaced by a non-writeable view.
+        """
+        if isinstance(value, np.ndarray):
+            view = value.view()
+            view.flags.writeable = False
+            return view
+        if isinstance(value, tuple):
+            return tuple(RecordingStore.read_only(item) for item in value)
+        if isinstance(value, list):
+            return [RecordingStore.read_only(item) for item in value]
+        if isinstance(value, dict):
+            return {key: RecordingStore.read_only(item) for key, item in value.items()}
+        return value
+
+    def get(self, key, builder):
+        """
+        Returns the value stored under a key, building and storing it first on a miss. Concurrent
+        requests for the same missing key wait for a single build.
+
+        :param key: Hashable key, usually from file_key() optionally extended with a suffix.
+        :param builder: Callable without arguments that produces the value on a miss.
+        :return: Read-only view of the stored value.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self.read_only(self._entries[key][0])
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                # Another thread may have built the value while this one was waiting
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self.read_only(self._entries[key][0])
+                self.misses += 1
+
+            try:
+                value = builder()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return self.read_only(value)
+
+    def lookup(self, key):
+        """
+        Returns the value stored under a key without building it, counting a hit or a miss.
+
+        :param key: Hashable key.
+        :return: Read-only view of the stored value, or None if the key is not stored.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self.read_only(self._entries[key][0])
+
+    def put(self, key, value):
+        """
+        Stores a value under a key, evicting least recently used entries to stay within the budget.
+
+        :param key: Hashable key.
+        :param value: Value to store.
+        """
+        nbytes = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+
+            # Always keep the newest entry, even if it alone exceeds the budget
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.evictions += 1
+
+    def discard(self, predicate):
+        """
+        Removes every entry whose key matches a predicate (e.g. older versions of a modified file).
+
+        :param predicate: Callable receiving a key and returning True for the entries to remove.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def discard_stale(self, file_key):
+        """
+        Removes the entries of older versions of a file, including values derived from them.
+
+        :param file_key: Current identity of the file, as returned by file_key().
+        """
+        self.discard(lambda key: isinstance(key, tuple) and len(key) >= 3
+                     and key[0] == file_key[0] and key[1:3] != file_key[1:3])
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the counters of the store.
+
+        :return: Dictionary with hits, misses, evictions, entry count, stored bytes and byte budget.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
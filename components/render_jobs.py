@@ -0,0 +1,272 @@
+# components/render_jobs.py
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RenderJob:
+    """
+    State of one background computation of a page, which yields partial results as it progresses.
+
+    The state is "queued" (waiting for a free slot of its session or for a thread), "running", "done",
+    "cancelled" or "failed". While the job runs, snapshot holds its
+    latest partial result and progress the fraction of the work done; once done, result holds the last
+    snapshot.
+    """
+
+    def __init__(self, job_id, session_id, slot, inputs):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.slot = slot
+        self.inputs = inputs
+        self.state = "queued"
+        self.snapshot = None
+        self.progress = 0.0
+        self.updates = 0
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        """
+        Whether the job is still queued or running.
+        """
+        return self.state in ("queued", "running")
+
+    @property
+    def cancelled(self):
+        """
+        Whether the job was asked to stop.
+        """
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self):
+        """
+        Seconds since the job started running (0 while queued).
+        """
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def wait(self, timeout=None):
+        """
+        Waits for the job to finish.
+
+        :param timeout: Maximum number of seconds to wait (default: no limit).
+        :return: True if the job is finished.
+        """
+        return self._done.wait(timeout)
+
+
+class RenderJobManager:
+    """
+    Class to run the computations of the pages on background threads, so a rerun returns as soon as its
+    widgets are drawn and the page polls the partial results instead of waiting for all of them.
+
+    A job is identified by its session and a slot naming the result it produces on the page (e.g. "entropy").
+    Each slot holds one job: submitting new inputs to a slot cancels the previous job, so dragging a slider
+    only leaves the computation of the last position running. A cancelled job stops at its next partial
+    result, and closing its producer lets it drop the work it had queued (e.g. on ParallelEntropyExecutor).
+    Every session runs at most max_jobs_per_session jobs at once, counting cancelled jobs whose thread has
+    not stopped yet; the others wait in a queue, so one session cannot take every thread of the pool.
+    The heavy work runs in NumPy or in worker processes, which release the GIL, so threads are enough.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    # Finished jobs kept for polling before the oldest ones are forgotten
+    MAX_FINISHED_JOBS = 64
+
+    def __init__(self, max_workers=None, max_jobs_per_session=2):
+        """
+        Initializes the manager and its thread pool.
+
+        :param max_workers: Number of jobs running at the same time (default: the number of CPUs, at least 2).
+        :param max_jobs_per_session: Number of jobs of one session running at the same time (default: 2).
+        """
+        self.max_workers = max(1, max_workers or max(2, os.cpu_count() or 1))
+        self.max_jobs_per_session = max(1, max_jobs_per_session)
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="eeg-render")
+        self.jobs = {}
+        self._slots = {}
+        self._queues = {}
+        self._busy = {}  # Number of jobs of each session handed to the pool whose thread has not returned
+        self._finished = deque()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the manager shared by the whole process. Its number of threads can be set with the
+        EEG_RENDER_WORKERS environment variable, and the per-session limit with EEG_RENDER_SESSION_JOBS.
+
+        :return: The shared RenderJobManager instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                workers = os.environ.get("EEG_RENDER_WORKERS")
+                cls._shared = cls(max_workers=int(workers) if workers else None,
+                                  max_jobs_per_session=int(os.environ.get("EEG_RENDER_SESSION_JOBS", 2)))
+            return cls._shared
+
+    def submit(self, session_id, slot, inputs, producer):
+        """
+        Returns the job of a slot for the given inputs, starting it if the slot holds a job for other inputs
+        (which is cancelled) or none.
+
+        :param session_id: Identifier of the session submitting the job.
+        :param slot: Name of the result within the page.
+        :param inputs: Hashable description of everything the result depends on.
+        :param producer: Function called without arguments on a background thread, returning an iterator of
+                         tuples (snapshot, progress) with a partial result and the fraction of the work done;
+                         the last snapshot is the result.
+        :return: ID of the job.
+        """
+        with self._lock:
+            current = self.jobs.get(self._slots.get((session_id, slot)))
+            if current is not None and current.inputs == inputs and current.state not in ("cancelled", "failed"):
+                return current.job_id
+            if current is not None:
+                self.cancel(current.job_id)
+            job = RenderJob(uuid.uuid4().hex, session_id, slot, inputs)
+            self.jobs[job.job_id] = job
+            self._slots[(session_id, slot)] = job.job_id
+            self._queues.setdefault(session_id, deque()).append((job, producer))
+            self._dispatch(session_id)
+            return job.job_id
+
+    def job(self, job_id):
+        """
+        Returns a job.
+
+        :param job_id: ID returned by submit().
+        :return: The RenderJob, or None if it is unknown or was forgotten.
+        """
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job if it is still queued or running.
+
+        :param job_id: ID returned by submit().
+        :return: True if the job was cancelled.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            job._cancel.set()
+            queue = self._queues.get(job.session_id)
+            if queue is not None:
+                for entry in queue:
+                    if entry[0] is job:
+                        queue.remove(entry)
+                        break
+            self._finish(job, "cancelled")
+            return True
+
+    def cancel_session(self, session_id):
+        """
+        Cancels every active job of a session.
+
+        :param session_id: Identifier of the session.
+        :return: Number of cancelled jobs.
+        """
+        with self._lock:
+            job_ids = [job.job_id for job in self.jobs.values() if job.session_id == session_id and job.active]
+            return sum(self.cancel(job_id) for job_id in job_ids)
+
+    def _dispatch(self, session_id):
+        """
+        Hands the queued jobs of a session to the pool while it has free slots. Called with the lock held.
+        """
+        queue = self._queues.get(session_id)
+        while queue and self._busy.get(session_id, 0) < self.max_jobs_per_session:
+            job, producer = queue.popleft()
+            self._busy[session_id] = self._busy.get(session_id, 0) + 1
+            self.pool.submit(self._run, job, producer)
+        if not queue:
+            self._queues.pop(session_id, None)
+        if not self._busy.get(session_id):
+            self._busy.pop(session_id, None)
+
+    def _run(self, job, producer):
+        """
+        Runs a job on a pool thread, publishing its partial results until it finishes or is cancelled.
+        """
+        try:
+            with self._lock:
+                if not job.active:
+                    return  # Cancelled before a thread picked it up
+                job.state = "running"
+                job.started = time.monotonic()
+            self._produce(job, producer)
+        finally:
+            # The thread is free again: start the next queued job of the session
+            with self._lock:
+                self._busy[job.session_id] -= 1
+                self._dispatch(job.session_id)
+
+    def _produce(self, job, producer):
+        """
+        Iterates the producer of a running job, stopping at the first partial result after a cancellation.
+        """
+        updates = None
+        try:
+            updates = iter(producer())
+            for snapshot, progress in updates:
+                with self._lock:
+                    if not job.active:
+                        return
+                    job.snapshot, job.progress = snapshot, progress
+                    job.updates += 1
+        except Exception as error:
+            with self._lock:
+                if job.active:
+                    job.error = str(error) or type(error).__name__
+                    self._finish(job, "failed")
+            return
+        finally:
+            # Closing the producer lets it cancel the work it had queued
+            if hasattr(updates, "close"):
+                updates.close()
+        with self._lock:
+            if job.active:
+                job.result = job.snapshot
+                job.progress = 1.0
+                self._finish(job, "done")
+
+    def _finish(self, job, state):
+        """
+        Marks a job as finished and forgets the oldest finished jobs.
+        """
+        with self._lock:
+            job.state = state
+            job.finished = time.monotonic()
+            job._done.set()
+            self._finished.append(job.job_id)
+            while len(self._finished) > self.MAX_FINISHED_JOBS:
+                forgotten = self.jobs.pop(self._finished.popleft(), None)
+                if (forgotten is not None
+                        and self._slots.get((forgotten.session_id, forgotten.slot)) == forgotten.job_id):
+                    del self._slots[(forgotten.session_id, forgotten.slot)]
+
+    def shutdown(self):
+        """
+        Cancels every job and stops the threads.
+        """
+        with self._lock:
+            for job_id in [job.job_id for job in self.jobs.values() if job.active]:
+                self.cancel(job_id)
+        self.pool.shutdown(wait=True, cancel_futures=True)
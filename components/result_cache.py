@@ -0,0 +1,185 @@
+# components/result_cache.py
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import numpy as np
+from components.recording_store import RecordingStore
+
+
+class ResultCache:
+    """
+    Class to handle a content-addressed cache of analysis results shared by the analyzers.
+
+    Results are keyed by (recording fingerprint, channel, sample span, parameters), so the same analysis of
+    the same samples is computed once. The cache has an in-memory LRU tier (a RecordingStore with its own
+    byte budget) and an optional on-disk tier of pickled results that survives restarts. Results larger than
+    MAX_ENTRY_FRACTION of the memory budget (e.g. the complex coefficients of a long wavelet transform) are not
+    kept in memory, since storing one would evict most of the other results.
+    """
+
+    DEFAULT_MAX_MB = 256
+    MAX_ENTRY_FRACTION = 0.25
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 ** 2, disk_dir=None):
+        """
+        Initializes the cache.
+
+        :param max_bytes: Byte budget of the in-memory tier.
+        :param disk_dir: Directory of the on-disk tier, or None to keep results in memory only (default).
+        """
+        self.memory = RecordingStore(max_bytes=max_bytes)
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        self.oversized = 0  # Results too large for the memory tier
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns the cache shared by the whole process. Its memory budget can be set in megabytes with the
+        EEG_RESULT_CACHE_MB environment variable, and the on-disk tier enabled with EEG_RESULT_CACHE_DIR.
+
+        :return: The shared ResultCache instance.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                max_mb = float(os.environ.get("EEG_RESULT_CACHE_MB", cls.DEFAULT_MAX_MB))
+                cls._shared = cls(max_bytes=int(max_mb * 1024 ** 2),
+                                  disk_dir=os.environ.get("EEG_RESULT_CACHE_DIR") or None)
+            return cls._shared
+
+    @staticmethod
+    def recording_fingerprint(recording_key):
+        """
+        Returns the fingerprint of a recording from its identity in the RecordingStore.
+
+        :param recording_key: Tuple (path, modification time, size) as returned by RecordingStore.file_key().
+        :return: Hexadecimal fingerprint.
+        """
+        return hashlib.blake2b(repr(tuple(recording_key)).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def array_fingerprint(values):
+        """
+        Returns the fingerprint of the content of an array.
+
+        :param values: Array-like of samples.
+        :return: Hexadecimal fingerprint.
+        """
+        values = np.ascontiguousarray(values)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{values.dtype.str}{values.shape}".encode())
+        digest.update(values.data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(fingerprint, channel, span, params):
+        """
+        Builds the key of a result.
+
+        :param fingerprint: Fingerprint of the recording (or of the analyzed samples).
+        :param channel: Name of the channel (can be None).
+        :param span: Tuple (start_sample, end_sample) of the analyzed samples within the recording.
+        :param params: Dictionary with the parameters of the analysis.
+        :return: Hexadecimal key.
+        """
+        description = json.dumps([fingerprint, channel, [int(span[0]), int(span[1])], params],
+                                 sort_keys=True, default=str)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def analysis_key(self, samples, params, fingerprint=None, channel=None, start=0):
+        """
+        Builds the key of the analysis of some samples: their span within the recording when the recording
+        fingerprint is known, the hash of the samples otherwise.
+
+        :param samples: The analyzed samples.
+        :param params: Dictionary with the parameters of the analysis.
+        :param fingerprint: Fingerprint of the recording the samples come from, or None.
+        :param channel: Name of the channel the samples come from.
+        :param start: Position of the first sample within the recording.
+        :return: Hexadecimal key.
+        """
+        if fingerprint is None:
+            return self.make_key(self.array_fingerprint(samples), None, (0, len(samples)), params)
+        return self.make_key(fingerprint, channel, (start, start + len(samples)), params)
+
+    def _disk_path(self, key):
+        """
+        Returns the path of a result in the on-disk tier.
+        """
+        return os.path.join(self.disk_dir, key[:2], f"{key}.pkl")
+
+    def get(self, key):
+        """
+        Returns a cached result, looking in memory first and then on disk.
+
+        :param key: Key from make_key().
+        :return: The cached result, or None on a miss.
+        """
+        value = self.memory.lookup(key)
+        if value is not None or self.disk_dir is None:
+            return value
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        self.memory.put(key, value)
+        return RecordingStore.read_only(value)
+
+    def put(self, key, value):
+        """
+        Stores a result in memory (unless it is larger than MAX_ENTRY_FRACTION of the memory budget) and, when
+        enabled, on disk.
+
+        :param key: Key from make_key().
+        :param value: Result to store.
+        """
+        if RecordingStore.sizeof(value) <= self.MAX_ENTRY_FRACTION * self.memory.max_bytes:
+            self.memory.put(key, value)
+        else:
+            self.oversized += 1
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            pass  # The disk tier is best effort: the result is still cached in memory
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns a cached result, computing and storing it first on a miss.
+
+        :param key: Key from make_key().
+        :param compute: Callable without arguments that produces the result.
+        :return: The result.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        """
+        Returns the counters of the cache.
+
+        :return: Dictionary with the in-memory counters, the number of disk hits and the number of results
+                 too large for the memory tier.
+        """
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["oversized"] = self.oversized
+        return stats
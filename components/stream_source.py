@@ -0,0 +1,298 @@
+# components/stream_source.py
+
+import abc
+import io
+import os
+import socket
+import threading
+import time
+import numpy as np
+from components.binary_cache import EEGBinaryCache
+
+
+class EEGRingBuffer:
+    """
+    Class to hold the most recent samples of a live recording in a fixed-size, preallocated array.
+
+    Samples are stored channel-major, like the recordings loaded by EEGDataLoader, and written at a
+    moving position that wraps around, so appending never reallocates. Readers copy the latest samples
+    into an output array they own, which lets a plot reuse the same arrays on every frame.
+    """
+
+    def __init__(self, num_channels, capacity, dtype=np.float32):
+        """
+        Allocates the buffer.
+
+        :param num_channels: Number of channels.
+        :param capacity: Number of samples kept per channel.
+        :param dtype: dtype of the stored samples (default: np.float32).
+        """
+        self.capacity = capacity
+        self.samples = np.zeros((num_channels, capacity), dtype=dtype)
+        self.total = 0  # Number of samples written since the buffer was created
+        self._lock = threading.Lock()
+
+    def write(self, block):
+        """
+        Appends samples, overwriting the oldest ones once the buffer is full.
+
+        :param block: 2D array of shape (num_samples, num_channels), i.e. rows as in a CSV file.
+        """
+        block = np.asarray(block)
+        if len(block) > self.capacity:
+            skipped = len(block) - self.capacity
+            block = block[skipped:]
+        else:
+            skipped = 0
+        with self._lock:
+            start = (self.total + skipped) % self.capacity
+            first = min(len(block), self.capacity - start)
+            self.samples[:, start:start + first] = block[:first].T
+            self.samples[:, :len(block) - first] = block[first:].T
+            self.total += skipped + len(block)
+
+    def read_latest(self, out):
+        """
+        Copies the latest samples into a preallocated array.
+
+        :param out: 2D array of shape (num_channels, n) with n <= capacity; positions older than the first
+                    written sample are filled with NaN.
+        :return: Position in the stream of the sample copied to the last column of out, plus one.
+        """
+        num_samples = out.shape[1]
+        with self._lock:
+            total = self.total
+            available = min(num_samples, total, self.capacity)
+            out[:, :num_samples - available] = np.nan
+            start = (total - available) % self.capacity
+            first = min(available, self.capacity - start)
+            out[:, num_samples - available:num_samples - available + first] = self.samples[:, start:start + first]
+            out[:, num_samples - available + first:] = self.samples[:, :available - first]
+        return total
+
+
+class EEGStreamSource(abc.ABC):
+    """
+    Base class of live EEG sources: a producer thread reads blocks of samples from somewhere and appends
+    them to an EEGRingBuffer holding the last buffer_sec seconds.
+
+    Subclasses implement _blocks(), a generator of (num_samples, num_channels) arrays that checks stopping
+    regularly (e.g. on socket timeouts) so that stop() is honoured. A source that is not read for idle_sec
+    seconds (e.g. because the browser tab showing it was closed) stops by itself.
+    """
+
+    def __init__(self, channels, sampling_rate=1000, buffer_sec=60, idle_sec=60):
+        """
+        Initializes the source without starting it.
+
+        :param channels: Names of the channels, in the order of the columns of the blocks.
+        :param sampling_rate: Sampling rate of the stream (default: 1000 Hz).
+        :param buffer_sec: Number of seconds kept in the ring buffer (default: 60).
+        :param idle_sec: Time without a call to latest() after which the producer thread stops, or None to
+                         keep it running until stop() (default: 60 seconds).
+        """
+        self.channels = list(channels)
+        self.sampling_rate = sampling_rate
+        self.buffer = EEGRingBuffer(len(self.channels), int(buffer_sec * sampling_rate))
+        self.idle_sec = idle_sec
+        self.error = None
+        self.idle_stopped = False  # Whether the source stopped because nobody read it
+        self._last_read = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @abc.abstractmethod
+    def _blocks(self):
+        """
+        Generator of the blocks of samples received, as (num_samples, num_channels) arrays; it returns when
+        stopping is set or the stream ends.
+        """
+
+    @property
+    def stopping(self):
+        """
+        Whether the producer thread was asked to stop, or has not been read for idle_sec seconds.
+        """
+        if (not self._stop.is_set() and self.idle_sec is not None
+                and time.monotonic() - self._last_read > self.idle_sec):
+            self.idle_stopped = True
+            self._stop.set()
+        return self._stop.is_set()
+
+    def _run(self):
+        try:
+            for block in self._blocks():
+                if self.stopping:
+                    break
+                if len(block):
+                    self.buffer.write(block)
+        except Exception as error:  # Surfaced to the page through the error attribute
+            self.error = error
+
+    def start(self):
+        """
+        Starts the producer thread.
+
+        :return: The source itself.
+        """
+        if not self.running:
+            self._stop.clear()
+            self.error = None
+            self.idle_stopped = False
+            self._last_read = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """
+        Stops the producer thread.
+
+        :param timeout: Maximum time to wait for the thread to finish, in seconds (default: 2).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        """
+        Whether the producer thread is alive.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def total_samples(self):
+        """
+        Number of samples received since the source started.
+        """
+        return self.buffer.total
+
+    def latest(self, out):
+        """
+        Copies the latest samples of every channel into a preallocated array.
+
+        :param out: 2D array of shape (num_channels, n).
+        :return: Time in seconds of the end of the copied samples since the stream started.
+        """
+        self._last_read = time.monotonic()
+        return self.buffer.read_latest(out) / self.sampling_rate
+
+
+class ReplayStreamSource(EEGStreamSource):
+    """
+    Class to replay a recording from the data directory as a live stream, in real time or faster, as a
+    stand-in for the acquisition device when testing.
+    """
+
+    def __init__(self, file_name, sampling_rate=1000, buffer_sec=60, block_sec=0.05, speed=1.0, loop=True):
+        """
+        Loads the recording to replay.
+
+        :param file_name: The name of the CSV file (in the 'data' directory) to replay.
+        :param sampling_rate: Sampling rate of the recording (default: 1000 Hz).
+        :param buffer_sec: Number of seconds kept in the ring buffer (default: 60).
+        :param block_sec: Duration of the blocks pushed at once (default: 0.05 seconds).
+        :param speed: Replay speed relative to real time (default: 1.0).
+        :param loop: Whether to start over at the end of the recording (default: True).
+        """
+        self.signals, header = EEGBinaryCache().load_or_convert(os.path.join("data", file_name), sampling_rate)
+        super().__init__(header["channels"], sampling_rate, buffer_sec)
+        self.block_size = max(1, int(block_sec * sampling_rate))
+        self.speed = speed
+        self.loop = loop
+
+    def _blocks(self):
+        num_samples = self.signals.shape[1]
+        started = time.monotonic()
+        sent = 0
+        while not self.stopping:
+            position = sent % num_samples
+            if not self.loop and sent >= num_samples:
+                return
+            block = self.signals[:, position:position + self.block_size].T
+            # Pace the blocks so that samples arrive at speed times the sampling rate
+            delay = started + (sent + len(block)) / (self.sampling_rate * self.speed) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            sent += len(block)
+            yield block
+
+
+class SocketStreamSource(EEGStreamSource):
+    """
+    Class to receive a live stream over TCP as raw interleaved binary samples (one value per channel per
+    sample, e.g. little-endian int16 as sent by most acquisition bridges).
+    """
+
+    def __init__(self, host, port, channels, sampling_rate=1000, buffer_sec=60, dtype="<i2", timeout=0.5):
+        """
+        Initializes the source without connecting.
+
+        :param host: Host name or address of the acquisition server.
+        :param port: TCP port of the acquisition server.
+        :param channels: Names of the channels, in the order in which they are interleaved.
+        :param sampling_rate: Sampling rate of the stream (default: 1000 Hz).
+        :param buffer_sec: Number of seconds kept in the ring buffer (default: 60).
+        :param dtype: dtype of the values on the wire (default: little-endian int16).
+        :param timeout: Socket timeout in seconds, bounding how long stop() waits (default: 0.5).
+        """
+        super().__init__(channels, sampling_rate, buffer_sec)
+        self.address = (host, port)
+        self.dtype = np.dtype(dtype)
+        self.timeout = timeout
+
+    def _blocks(self):
+        frame_bytes = self.dtype.itemsize * len(self.channels)
+        pending = b""
+        with socket.create_connection(self.address, timeout=self.timeout) as connection:
+            while not self.stopping:
+                try:
+                    chunk = connection.recv(65536)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    return  # The server closed the connection
+                pending += chunk
+                complete = len(pending) // frame_bytes * frame_bytes
+                if complete:
+                    yield np.frombuffer(pending[:complete], dtype=self.dtype).reshape(-1, len(self.channels))
+                    pending = pending[complete:]
+
+
+class FileTailStreamSource(EEGStreamSource):
+    """
+    Class to follow a CSV file that is being written by the acquisition software, like ``tail -f``.
+    """
+
+    def __init__(self, file_path, sampling_rate=1000, buffer_sec=60, poll_sec=0.05, from_start=False):
+        """
+        Reads the header of the file to know its channels.
+
+        :param file_path: Path of the CSV file (with a header line of channel names).
+        :param sampling_rate: Sampling rate of the stream (default: 1000 Hz).
+        :param buffer_sec: Number of seconds kept in the ring buffer (default: 60).
+        :param poll_sec: Time between checks for new lines (default: 0.05 seconds).
+        :param from_start: Whether to stream the lines already in the file (default: False, only new lines).
+        """
+        with open(file_path) as f:
+            channels = [name.strip() for name in f.readline().split(",")]
+        super().__init__(channels, sampling_rate, buffer_sec)
+        self.file_path = file_path
+        self.poll_sec = poll_sec
+        self.from_start = from_start
+
+    def _blocks(self):
+        with open(self.file_path) as f:
+            f.readline()  # Header
+            if not self.from_start:
+                f.seek(0, os.SEEK_END)
+            pending = ""
+            while not self.stopping:
+                pending += f.read()
+                end = pending.rfind("\n") + 1
+                if end == 0:
+                    time.sleep(self.poll_sec)
+                    continue
+                lines, pending = pending[:end], pending[end:]
+                yield np.loadtxt(io.StringIO(lines), delimiter=",", ndmin=2)
@@ -1,6 +1,12 @@
 # components/ui_elements.py
 
+import json
+import uuid
 import streamlit as st
+from components.profiler import Profiler
+from components.recording_store import RecordingStore
+from components.render_jobs import RenderJobManager
+from components.result_cache import ResultCache
 
 class UIElements:
     """
@@ -21,3 +27,132 @@ class UIElements:
             }
         </style>
         """, unsafe_allow_html=True)
+
+    @staticmethod
+    def run_page(main, page_name):
+        """
+        Runs the main function of a page. When profiling is requested (EEG_PROFILE environment variable, or
+        ?profile=1 in the URL), the stages of the rerun are recorded and shown in a sidebar panel.
+
+        :param main: Main function of the page.
+        :param page_name: Name of the page, used for the exported files.
+        """
+        mode = Profiler.requested(st.query_params.get("profile"))
+        if mode is None:
+            main()
+            return
+        # cProfile covers a single rerun, unless it is requested for every rerun with ?profile=cprofile
+        capture = mode == "cprofile" or st.session_state.pop("profile_capture_next", False)
+        profiler = Profiler(page_name, caches={"Results": ResultCache.shared(), "Recordings": RecordingStore.shared()},
+                            capture_cprofile=capture)
+        with profiler:
+            main()
+        UIElements.display_profiling_panel(profiler)
+
+    @staticmethod
+    def preprocessing_options(sampling_rate=1000):
+        """
+        Displays the preprocessing settings in a sidebar panel. They are kept in the session, so every page
+        analyzes the recording with the same settings.
+
+        :param sampling_rate: Sampling rate of the recording (default: 1000 Hz).
+        :return: EEGPreprocessor with the settings, or None if preprocessing is disabled.
+        """
+        defaults = {"preprocessing_enabled": False, "preprocessing_band": (0.5, 45.0),
+                    "preprocessing_notch": "50 Hz", "preprocessing_amplitude_z": 5.0,
+                    "preprocessing_variance_z": 3.0}
+        for key, value in defaults.items():
+            # Reassigning the value keeps the widget state when another page is opened
+            st.session_state[key] = st.session_state.get(key, value)
+
+        with st.sidebar.expander("Preprocessing", expanded=st.session_state["preprocessing_enabled"]):
+            enabled = st.checkbox("Filter the signals and skip artifacts", key="preprocessing_enabled")
+            band = st.slider("Bandpass (Hz)", 0.1, sampling_rate / 2 - 1, step=0.1, key="preprocessing_band")
+            notch = st.radio("Notch filter", ["None", "50 Hz", "60 Hz"], horizontal=True,
+                             key="preprocessing_notch")
+            amplitude_z = st.number_input("Artifact peak (× typical epoch SD)", min_value=1.0, max_value=50.0,
+                                          step=0.5, key="preprocessing_amplitude_z")
+            variance_z = st.number_input("Artifact variance (robust z-score)", min_value=1.0, max_value=20.0,
+                                         step=0.5, key="preprocessing_variance_z")
+        if not enabled:
+            return None
+        from components.preprocessing import EEGPreprocessor  # SciPy's signal module is slow to import
+
+        return EEGPreprocessor(sampling_rate, low_freq=band[0], high_freq=band[1],
+                               notch_freq=None if notch == "None" else float(notch.split()[0]),
+                               amplitude_z=amplitude_z, variance_z=variance_z)
+
+    @staticmethod
+    def render_job(slot, inputs, producer):
+        """
+        Returns the background job computing a result of the page for the given inputs, starting it if the
+        session has no job for them in this slot (a job of previous inputs is cancelled).
+
+        :param slot: Name of the result within the page.
+        :param inputs: Hashable description of everything the result depends on.
+        :param producer: Function returning an iterator of (partial result, progress) tuples (see RenderJobManager).
+        :return: The RenderJob.
+        """
+        session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+        manager = RenderJobManager.shared()
+        return manager.job(manager.submit(session_id, slot, inputs, producer))
+
+    @staticmethod
+    def show_render_job(job, label, plot_partial=None, wait_sec=0.3):
+        """
+        Shows the progress and the latest partial result of a background job until it is done, polling it in a
+        fragment so the rest of the page stays responsive; the page is rerun once the job is done. Jobs that
+        finish quickly (e.g. from cached results) are waited for instead.
+
+        :param job: RenderJob from render_job().
+        :param label: Description of the computation shown with the progress bar.
+        :param plot_partial: Optional function displaying a partial result.
+        :param wait_sec: Time to wait for the job before polling it (default: 0.3 seconds).
+        :return: True if the job is done and its result can be shown, False otherwise.
+        """
+        if job.active and not job.wait(wait_sec):
+            # st.fragment is named st.experimental_fragment before Streamlit 1.37
+            fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+            @fragment(run_every=0.5)
+            def poll():
+                if not job.active:
+                    st.rerun()  # Show the result outside of the polling fragment
+                st.progress(job.progress, text=f"{label}... {job.progress:.0%} ({job.elapsed:.0f} s)")
+                if plot_partial is not None and job.snapshot is not None:
+                    plot_partial(job.snapshot)
+
+            poll()
+            return False
+        if job.state == "failed":
+            st.error(f"{label} failed: {job.error}")
+        return job.state == "done"
+
+    @staticmethod
+    def display_profiling_panel(profiler):
+        """
+        Displays the stage timings, memory deltas and cache hit rates of a rerun in a collapsible sidebar
+        panel, with downloads of the Chrome trace, the speedscope file and the cProfile capture.
+
+        :param profiler: Profiler that recorded the rerun.
+        """
+        with st.sidebar.expander("Profiling", expanded=False):
+            rows = [{"Stage": entry["stage"], "Calls": entry["calls"], "Time (ms)": round(entry["seconds"] * 1e3, 1),
+                     "Memory (MB)": None if entry["memory_mb"] is None else round(entry["memory_mb"], 1)}
+                    for entry in profiler.summary()]
+            st.dataframe(rows, hide_index=True)
+            for name, stats in profiler.cache_hit_rates().items():
+                rate = "-" if stats["hit_rate"] is None else f"{100 * stats['hit_rate']:.0f}%"
+                st.caption(f"{name} cache: {stats['hits']} hits, {stats['misses']} misses ({rate})")
+
+            stem = profiler.name.lower().replace(" ", "_")
+            st.download_button("Chrome trace", json.dumps(profiler.chrome_trace()), file_name=f"{stem}.trace.json",
+                               mime="application/json")
+            st.download_button("speedscope", json.dumps(profiler.speedscope()), file_name=f"{stem}.speedscope.json",
+                               mime="application/json")
+            if profiler.cprofile is not None:
+                st.download_button("cProfile (.prof)", profiler.cprofile_dump(), file_name=f"{stem}.prof")
+                st.code(profiler.cprofile_report(), language=None)
+            elif st.button("Capture the next rerun with cProfile"):
+                st.session_state["profile_capture_next"] = True
+                st.rerun()
@@ -1,69 +1,347 @@
 # components/visualizer.py
 
+import numpy as np
 import plotly.graph_objects as go
-import streamlit as st
+from components.downsampler import MinMaxPyramid, MontagePyramid
+from components.profiler import Stage
+from components.recording_store import RecordingStore
+from components.stream_source import EEGStreamSource
 
 
 class EEGVisualizer:
     """
     Class to handle the visualization of EEG data using Plotly.
+
+    The *_figure methods only build Plotly figures and do not depend on Streamlit; the plot_* methods
+    display them in the page (Streamlit is imported on first use).
     """
 
-    def __init__(self, data, sampling_rate=1000):
+    def __init__(self, data, sampling_rate=1000, recording_key=None, store=None, index=None):
         """
         Initializes the EEGVisualizer with the loaded EEG data.
 
-        :param data: pandas DataFrame containing the EEG data.
+        :param data: pandas DataFrame containing the EEG data, or a live EEGStreamSource.
         :param sampling_rate: Sampling rate of the EEG data (default: 1000 Hz).
+        :param recording_key: Key of the recording in the RecordingStore (EEGDataLoader.recording_key). When
+                              given, the downsampling pyramids are shared through the store across reruns.
+        :param store: RecordingStore holding the shared pyramids (default: the process-wide store).
+        :param index: AnalysisIndex of the recording (EEGDataLoader.load_index). When given, ranges plotted at
+                      a second per point or coarser come from its per-second envelope, and finer (zoomed)
+                      ranges are reduced directly, so no pyramid of the whole recording is built.
         """
         self.data = data
         self.sampling_rate = sampling_rate
-        self.time = [i / sampling_rate for i in range(len(data))]  # Calculate time axis based on sampling rate
+        self.recording_key = recording_key
+        self.store = store if store is not None else RecordingStore.shared()
+        self.index = index
+        self._pyramids = {}
+        self._frames = {}  # Arrays reused by every frame of a live plot, per (samples, bucket)
+
+    @property
+    def time(self):
+        """
+        Time axis of the whole recording in seconds, computed on demand (plots only use the visible window).
+        """
+        return np.arange(len(self.data)) / self.sampling_rate
+
+    def _channel_signal(self, channel):
+        """
+        Returns the samples of a channel as a NumPy array without copying them.
+
+        :param channel: Column name of the channel.
+        :return: 1D ndarray view of the channel.
+        """
+        return self.data[channel].to_numpy()
+
+    def _signals(self):
+        """
+        Returns the samples of every channel as a (channels x samples) array. The data frame of EEGDataLoader
+        is a transposed view of the loaded recording, so this is the recording itself, without a copy.
+
+        :return: 2D C-contiguous ndarray.
+        """
+        return np.ascontiguousarray(self.data.to_numpy().T)
+
+    def _montage_pyramid(self):
+        """
+        Returns the min/max pyramid of all the channels, building it only once per recording and set of
+        channels (a preprocessed recording holds only the channels a page filtered).
+
+        :return: MontagePyramid of the recording.
+        """
+        if self.recording_key is not None:
+            return self.store.get(self.recording_key + ("montage", tuple(map(str, self.data.columns))),
+                                  lambda: MontagePyramid(self._signals()))
+        if "montage" not in self._pyramids:
+            self._pyramids["montage"] = MontagePyramid(self._signals())
+        return self._pyramids["montage"]
+
+    def _pyramid(self, channel):
+        """
+        Returns the min/max downsampling pyramid of a channel, building it only once per recording.
+
+        :param channel: Column name of the channel.
+        :return: MinMaxPyramid of the channel.
+        """
+        if self.recording_key is not None:
+            return self.store.get(self.recording_key + ("minmax", channel),
+                                  lambda: MinMaxPyramid(self._channel_signal(channel)))
+        if channel not in self._pyramids:
+            self._pyramids[channel] = MinMaxPyramid(self._channel_signal(channel))
+        return self._pyramids[channel]
+
+    def _indexed_envelope(self, channels, start_idx, end_idx, max_points):
+        """
+        Returns the envelope of some channels over a range from the analysis index, or reduced directly from
+        the samples when the range needs a finer resolution than one second.
 
-    def plot_channels(self, channel_fp1=None, channel_fp2=None, time_range=(0, 5)):
+        :return: Tuple (x0, dx, values), see MontagePyramid.query().
         """
-        Plots EEG channels (Fp1 and/or Fp2) in a single graph using Plotly, limited to the given time range.
+        names = [str(column) for column in self.data.columns]
+        rows = [names.index(channel) for channel in channels]
+        envelope = self.index.envelope([self.index.channels.index(channel) for channel in channels], start_idx,
+                                       end_idx, max_points)
+        return envelope or MontagePyramid.reduce(self._signals(), start_idx, end_idx, max_points, rows)
+
+    @Stage("figure")
+    def channels_figure(self, channel_fp1=None, channel_fp2=None, time_range=(0, 5), width_px=1500, last_sec=None):
+        """
+        Builds the figure of EEG channels (Fp1 and/or Fp2) limited to the given time range.
+
+        Long ranges are reduced to a min/max envelope of about two points per pixel of the plot width, so
+        spikes and artifacts stay visible while the number of points sent to the browser stays bounded.
+
+        When the data is a live EEGStreamSource, the last last_sec seconds of the stream are used instead
+        of time_range; every frame reuses the same arrays.
 
         :param channel_fp1: Column name for the Fp1 channel (can be None).
         :param channel_fp2: Column name for the Fp2 channel (can be None).
         :param time_range: Tuple (min_time, max_time) representing the time range to display in seconds.
+        :param width_px: Approximate width of the plot in screen pixels (default: 1500).
+        :param last_sec: Number of seconds to plot from a live source (default: 10 for a live source).
+        :return: Plotly figure, or None if none of the channels is available.
         """
-        start_idx = int(time_range[0] * self.sampling_rate)
-        end_idx = int(time_range[1] * self.sampling_rate)
+        if isinstance(self.data, EEGStreamSource):
+            return self._latest_figure(channel_fp1, channel_fp2, last_sec or 10, width_px)
+
+        start_idx = max(0, int(time_range[0] * self.sampling_rate))
+        end_idx = min(len(self.data), int(time_range[1] * self.sampling_rate))
+        max_points = 2 * width_px
 
         fig = go.Figure()
 
-        # Plot Fp1 if available
-        if channel_fp1 and channel_fp1 in self.data.columns:
-            fig.add_trace(go.Scatter(x=self.time[start_idx:end_idx], y=self.data[channel_fp1][start_idx:end_idx],
-                                     mode='lines', name='Fp1'))
-
-        # Plot Fp2 if available
-        if channel_fp2 and channel_fp2 in self.data.columns:
-            fig.add_trace(go.Scatter(x=self.time[start_idx:end_idx], y=self.data[channel_fp2][start_idx:end_idx],
-                                     mode='lines', name='Fp2'))
-
-        # Update layout if data is available
-        if fig.data:
-            fig.update_layout(
-                title="EEG Channels",
-                xaxis_title="Time (s)",
-                yaxis_title="Amplitude (µV)",
-                legend_title="Electrode"
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
+        for channel, label in ((channel_fp1, "Fp1"), (channel_fp2, "Fp2")):
+            if channel and channel in self.data.columns:
+                if end_idx - start_idx <= max_points:
+                    # Short windows are sent raw: a view of the samples on an implicit x0/dx time axis
+                    values = self._channel_signal(channel)[start_idx:end_idx]
+                    fig.add_trace(go.Scatter(x0=start_idx / self.sampling_rate, dx=1 / self.sampling_rate,
+                                             y=values, mode='lines', name=label))
+                elif self.index is not None:
+                    with Stage("slice"):
+                        x0, dx, values = self._indexed_envelope([str(channel)], start_idx, end_idx, max_points)
+                    fig.add_trace(go.Scatter(x0=x0 / self.sampling_rate, dx=dx / self.sampling_rate, y=values[0],
+                                             mode='lines', name=label))
+                else:
+                    with Stage("slice"):
+                        positions, values = self._pyramid(channel).query(start_idx, end_idx, max_points)
+                    fig.add_trace(go.Scatter(x=positions / self.sampling_rate, y=values, mode='lines', name=label))
+
+        if not fig.data:
+            return None
+        fig.update_layout(
+            title="EEG Channels",
+            xaxis_title="Time (s)",
+            yaxis_title="Amplitude (µV)",
+            legend_title="Electrode"
+        )
+        return fig
+
+    def plot_channels(self, channel_fp1=None, channel_fp2=None, time_range=(0, 5), width_px=1500, zoomable=False,
+                      last_sec=None, key=None):
+        """
+        Plots EEG channels (Fp1 and/or Fp2) in a single graph using Plotly, limited to the given time range
+        (see channels_figure). For a live source, call it again (e.g. from a fragment with run_every) to
+        refresh the plot.
+
+        :param channel_fp1: Column name for the Fp1 channel (can be None).
+        :param channel_fp2: Column name for the Fp2 channel (can be None).
+        :param time_range: Tuple (min_time, max_time) representing the time range to display in seconds.
+        :param width_px: Approximate width of the plot in screen pixels (default: 1500).
+        :param zoomable: If True, a box selection on the plot reruns the page and its time range is returned,
+                         so the caller can refetch that range at a finer resolution (default: False).
+        :param last_sec: Number of seconds to plot from a live source (default: 10 for a live source).
+        :param key: Optional unique key of the chart.
+        :return: Tuple (min_time, max_time) of the box selection when zoomable, None otherwise.
+        """
+        import streamlit as st
+
+        fig = self.channels_figure(channel_fp1, channel_fp2, time_range, width_px, last_sec)
+        if fig is None:
             st.error("Fp1 or Fp2 channels are not available in the loaded data.")
+            return None
+        return self._display(fig, time_range, zoomable and not isinstance(self.data, EEGStreamSource), key,
+                             "eeg_channels")
+
+    @Stage("figure")
+    def montage_figure(self, channels=None, time_range=(0, 5), width_px=1500, spacing=None):
+        """
+        Builds a stacked-trace figure of several channels (a montage) limited to the given time range.
+
+        All the channels are reduced at once from a shared MontagePyramid to about two points per pixel of
+        the plot width, and every trace is sent on an implicit time axis (x0/dx), so 64 channels of an hour
+        of recording cost about as much to plot as a few seconds.
+
+        :param channels: Names of the channels, from top to bottom (default: every channel of the recording).
+        :param time_range: Tuple (min_time, max_time) representing the time range to display in seconds.
+        :param width_px: Approximate width of the plot in screen pixels (default: 1500).
+        :param spacing: Vertical distance between two channels in µV (default: twice the typical 99th
+                        percentile of the absolute amplitude of the visible traces).
+        :return: Plotly figure, or None if none of the channels is available.
+        """
+        names = [str(column) for column in self.data.columns]
+        channels = names if channels is None else [channel for channel in channels if channel in names]
+        if not channels:
+            return None
+        rows = [names.index(channel) for channel in channels]
+        start_idx = max(0, int(time_range[0] * self.sampling_rate))
+        end_idx = min(len(self.data), int(time_range[1] * self.sampling_rate))
+
+        with Stage("slice"):
+            if self.index is not None:
+                x0, dx, values = self._indexed_envelope(channels, start_idx, end_idx, 2 * width_px)
+            else:
+                x0, dx, values = self._montage_pyramid().query(start_idx, end_idx, 2 * width_px, rows)
+
+        # Center every trace on its median and stack them, first channel on top
+        traces = values.astype(np.float32)
+        if traces.shape[1]:
+            traces -= np.median(traces, axis=1, keepdims=True)
+            if spacing is None:
+                spacing = 2 * float(np.median(np.percentile(np.abs(traces), 99, axis=1)))
+        spacing = spacing or 1.0
+        offsets = spacing * np.arange(len(rows))[::-1]
+        traces += offsets[:, None].astype(np.float32)
+
+        fig = go.Figure([go.Scattergl(x0=x0 / self.sampling_rate, dx=dx / self.sampling_rate, y=trace,
+                                      mode='lines', name=channel, line=dict(width=1))
+                         for channel, trace in zip(channels, traces)])
+        fig.update_layout(
+            title="EEG Montage",
+            xaxis_title="Time (s)",
+            yaxis=dict(title="Channel", tickvals=offsets, ticktext=channels, zeroline=False),
+            showlegend=False,
+            height=max(450, 22 * len(channels) + 150)
+        )
+        return fig
+
+    def plot_montage(self, channels=None, time_range=(0, 5), width_px=1500, zoomable=False, key=None):
+        """
+        Plots several channels as stacked traces (see montage_figure).
+
+        :param channels: Names of the channels, from top to bottom (default: every channel of the recording).
+        :param time_range: Tuple (min_time, max_time) representing the time range to display in seconds.
+        :param width_px: Approximate width of the plot in screen pixels (default: 1500).
+        :param zoomable: If True, a box selection on the plot reruns the page and its time range is returned
+                         (default: False).
+        :param key: Optional unique key of the chart.
+        :return: Tuple (min_time, max_time) of the box selection when zoomable, None otherwise.
+        """
+        import streamlit as st
+
+        fig = self.montage_figure(channels, time_range, width_px)
+        if fig is None:
+            st.error("None of the selected channels is available in the loaded data.")
+            return None
+        return self._display(fig, time_range, zoomable, key, "eeg_montage")
+
+    def _display(self, fig, time_range, zoomable, key, key_prefix):
+        """
+        Shows a figure of signals in the page; when zoomable, returns the time range of a box selection.
+        """
+        import streamlit as st
+
+        if not zoomable:
+            with Stage("serialize"):
+                st.plotly_chart(fig, use_container_width=True, key=key)
+            return None
+
+        start_idx = max(0, int(time_range[0] * self.sampling_rate))
+        end_idx = min(len(self.data), int(time_range[1] * self.sampling_rate))
+        fig.update_layout(dragmode="select")
+        # A new key per range gives every zoom level a fresh chart without a leftover selection
+        with Stage("serialize"):
+            event = st.plotly_chart(fig, use_container_width=True, on_select="rerun", selection_mode="box",
+                                    key=key or f"{key_prefix}_{start_idx}_{end_idx}")
+        boxes = event.get("selection", {}).get("box", []) if event else []
+        if boxes and len(boxes[0].get("x", [])) == 2:
+            x0, x1 = sorted(boxes[0]["x"])
+            return max(x0, time_range[0]), min(x1, time_range[1])
+        return None
+
+    def _frame_arrays(self, num_samples, width_px):
+        """
+        Returns the arrays of a live frame, allocating them only for the first frame of a given size.
+
+        :return: Tuple (window, envelope, bucket) where window holds the latest samples of every channel and
+                 envelope, when the window is longer than two points per pixel, their per-bucket min and max.
+        """
+        bucket = max(1, -(-num_samples // width_px)) if num_samples > 2 * width_px else 1
+        if (num_samples, bucket) not in self._frames:
+            num_channels = len(self.data.channels)
+            window = np.empty((num_channels, num_samples // bucket * bucket), dtype=self.data.buffer.samples.dtype)
+            envelope = np.empty((num_channels, 2 * (num_samples // bucket)), dtype=window.dtype) if bucket > 1 else None
+            self._frames[(num_samples, bucket)] = (window, envelope, bucket)
+        return self._frames[(num_samples, bucket)]
+
+    def _latest_figure(self, channel_fp1, channel_fp2, last_sec, width_px):
+        """
+        Builds the figure of the last seconds of a live source, reduced in place to a min/max envelope when long.
+        """
+        source = self.data
+        window, envelope, bucket = self._frame_arrays(int(last_sec * self.sampling_rate), width_px)
+        end_time = source.latest(window)
+        start_time = end_time - window.shape[1] / self.sampling_rate
+        if envelope is not None:
+            # Evenly spaced (min, max) pairs, so the time axis is implicit (x0/dx) as well
+            blocks = window.reshape(window.shape[0], -1, bucket)
+            np.min(blocks, axis=2, out=envelope[:, 0::2])
+            np.max(blocks, axis=2, out=envelope[:, 1::2])
+            values, step = envelope, bucket / 2
+        else:
+            values, step = window, 1
+
+        fig = go.Figure()
+        for channel, label in ((channel_fp1, "Fp1"), (channel_fp2, "Fp2")):
+            if channel and channel in source.channels:
+                fig.add_trace(go.Scatter(x0=start_time, dx=step / self.sampling_rate,
+                                         y=values[source.channels.index(channel)], mode='lines', name=label))
+        if not fig.data:
+            return None
+        fig.update_layout(
+            title="EEG Channels (live)",
+            xaxis_title="Time (s)",
+            yaxis_title="Amplitude (µV)",
+            legend_title="Electrode",
+            uirevision="live"  # Keep the user's legend and zoom state across frames
+        )
+        return fig
 
     @staticmethod
-    def plot_entropy_over_time(entropies_fp1, entropies_fp2, window_size_sec):
+    @Stage("figure")
+    def entropy_over_time_figure(entropies_fp1, entropies_fp2, window_size_sec, connect_gaps=False,
+                                 title="Entropy Over Time - Fp1 vs Fp2"):
         """
-        Plots entropy over time for Fp1 and Fp2 for all entropy metrics (Shannon, Approximate, Sample)
-        using a scatter plot with lines.
+        Builds the figure of entropy over time for Fp1 and Fp2 for all entropy metrics (Shannon, Approximate,
+        Sample) using a scatter plot with lines.
 
         :param entropies_fp1: List of entropy values for Fp1.
         :param entropies_fp2: List of entropy values for Fp2.
         :param window_size_sec: Size of each window in seconds.
+        :param connect_gaps: Whether the lines bridge windows without values (NaN), e.g. those of a partial
+                             result; otherwise they show as gaps, e.g. windows skipped as artifacts (default: False).
+        :param title: Title of the figure (default: "Entropy Over Time - Fp1 vs Fp2").
+        :return: Plotly figure.
         """
         times = [i * window_size_sec for i in range(len(entropies_fp1))]
 
@@ -77,7 +355,7 @@ class EEGVisualizer:
             values_fp1 = [window[metric] for window in entropies_fp1]
             fig.add_trace(go.Scatter(x=times, y=values_fp1, mode='lines+markers',
                                      marker=dict(symbol="circle", size=10, color=color),
-                                     line=dict(width=0.5),
+                                     line=dict(width=0.5), connectgaps=connect_gaps,
                                      name=f"Fp1 - {metric}"))
 
         # Plot entropy for Fp2 with triangle-up markers
@@ -85,25 +363,45 @@ class EEGVisualizer:
             values_fp2 = [window[metric] for window in entropies_fp2]
             fig.add_trace(go.Scatter(x=times, y=values_fp2, mode='lines+markers',
                                      marker=dict(symbol="triangle-up", size=10, color=color),
-                                     line=dict(width=0.5),
+                                     line=dict(width=0.5), connectgaps=connect_gaps,
                                      name=f"Fp2 - {metric}"))
 
         fig.update_layout(
-            title="Entropy Over Time - Fp1 vs Fp2",
+            title=title,
             xaxis_title="Time (s)",
             yaxis_title="Entropy Value"
         )
+        return fig
 
-        st.plotly_chart(fig, use_container_width=True)
+    @staticmethod
+    def plot_entropy_over_time(entropies_fp1, entropies_fp2, window_size_sec, key=None, connect_gaps=False,
+                               title="Entropy Over Time - Fp1 vs Fp2"):
+        """
+        Plots entropy over time for Fp1 and Fp2 (see entropy_over_time_figure).
+
+        :param entropies_fp1: List of entropy values for Fp1.
+        :param entropies_fp2: List of entropy values for Fp2.
+        :param window_size_sec: Size of each window in seconds.
+        :param key: Optional unique key of the chart, needed when it is redrawn several times in one run.
+        :param connect_gaps: Whether the lines bridge windows without values (default: False).
+        :param title: Title of the figure (default: "Entropy Over Time - Fp1 vs Fp2").
+        """
+        import streamlit as st
+        fig = EEGVisualizer.entropy_over_time_figure(entropies_fp1, entropies_fp2, window_size_sec, connect_gaps,
+                                                     title)
+        with Stage("serialize"):
+            st.plotly_chart(fig, use_container_width=True, key=key)
 
     @staticmethod
-    def plot_entropy_bars(entropy_fp1, entropy_fp2, labels):
+    @Stage("figure")
+    def entropy_bars_figure(entropy_fp1, entropy_fp2, labels):
         """
-        Plots a bar chart comparing the average entropy values for Fp1 and Fp2.
+        Builds a bar chart comparing the average entropy values for Fp1 and Fp2.
 
         :param entropy_fp1: List of average entropy values for Fp1.
         :param entropy_fp2: List of average entropy values for Fp2.
         :param labels: Labels for the entropy measures.
+        :return: Plotly figure.
         """
         fig = go.Figure()
 
@@ -119,5 +417,142 @@ class EEGVisualizer:
             yaxis_title="Average Entropy Value",
             barmode="group"
         )
+        return fig
+
+    @staticmethod
+    def plot_entropy_bars(entropy_fp1, entropy_fp2, labels):
+        """
+        Plots a bar chart comparing the average entropy values for Fp1 and Fp2 (see entropy_bars_figure).
+
+        :param entropy_fp1: List of average entropy values for Fp1.
+        :param entropy_fp2: List of average entropy values for Fp2.
+        :param labels: Labels for the entropy measures.
+        """
+        import streamlit as st
+        fig = EEGVisualizer.entropy_bars_figure(entropy_fp1, entropy_fp2, labels)
+        with Stage("serialize"):
+            st.plotly_chart(fig)
+
+    @staticmethod
+    @Stage("figure")
+    def second_stats_figure(values, channels, stat):
+        """
+        Builds the figure of a per-second statistic of every channel over the whole recording.
+
+        :param values: Array of shape (channels, seconds), e.g. from AnalysisIndex.arrays.
+        :param channels: Names of the channels.
+        :param stat: Name of the statistic ("min", "max", "mean" or "rms").
+        :return: Plotly figure.
+        """
+        fig = go.Figure([go.Scattergl(x0=0, dx=1, y=row, mode='lines', name=channel, line=dict(width=1))
+                         for channel, row in zip(channels, values)])
+        fig.update_layout(
+            title=f"Per-second {stat.upper() if stat == 'rms' else stat}",
+            xaxis_title="Time (s)",
+            yaxis_title="Amplitude (µV)",
+            legend_title="Channel"
+        )
+        return fig
 
-        st.plotly_chart(fig)
+    @staticmethod
+    def plot_second_stats(values, channels, stat, key=None):
+        """
+        Plots a per-second statistic of every channel (see second_stats_figure).
+
+        :param values: Array of shape (channels, seconds).
+        :param channels: Names of the channels.
+        :param stat: Name of the statistic.
+        :param key: Optional unique key of the chart.
+        """
+        import streamlit as st
+        fig = EEGVisualizer.second_stats_figure(values, channels, stat)
+        with Stage("serialize"):
+            st.plotly_chart(fig, use_container_width=True, key=key)
+
+    @staticmethod
+    @Stage("figure")
+    def band_power_figure(times, powers, bands, relative=False, title="Band Power Over Time"):
+        """
+        Builds the figure of the power of each frequency band over time.
+
+        :param times: Start of every window in seconds.
+        :param powers: Array of shape (windows, bands) of band powers (BandPowerAnalyzer.calculate_band_powers).
+        :param bands: Names of the bands, in the order of the columns of powers.
+        :param relative: Whether powers are fractions of the total power (BandPowerAnalyzer.relative_powers),
+                         shown as stacked areas; absolute powers are shown as lines on a log scale.
+        :param title: Title of the figure.
+        :return: Plotly figure.
+        """
+        fig = go.Figure()
+        for column, band in enumerate(bands):
+            if relative:
+                fig.add_trace(go.Scatter(x=times, y=powers[:, column], mode='lines', stackgroup="bands",
+                                         line=dict(width=0.5), name=band))
+            else:
+                fig.add_trace(go.Scatter(x=times, y=powers[:, column], mode='lines', line=dict(width=1), name=band))
+
+        fig.update_layout(
+            title=title,
+            xaxis_title="Time (s)",
+            yaxis_title="Relative power" if relative else "Power (µV²)",
+            yaxis_type="linear" if relative else "log",
+            legend_title="Band"
+        )
+        return fig
+
+    @staticmethod
+    def plot_band_power(times, powers, bands, relative=False, title="Band Power Over Time", key=None):
+        """
+        Plots the power of each frequency band over time (see band_power_figure).
+
+        :param times: Start of every window in seconds.
+        :param powers: Array of shape (windows, bands) of band powers.
+        :param bands: Names of the bands, in the order of the columns of powers.
+        :param relative: Whether powers are fractions of the total power.
+        :param title: Title of the figure.
+        :param key: Optional unique key of the chart.
+        """
+        import streamlit as st
+        fig = EEGVisualizer.band_power_figure(times, powers, bands, relative, title)
+        with Stage("serialize"):
+            st.plotly_chart(fig, use_container_width=True, key=key)
+
+    @staticmethod
+    @Stage("figure")
+    def band_ratios_figure(times, ratios, title="Band Power Ratios"):
+        """
+        Builds the figure of band power ratios over time.
+
+        :param times: Start of every window in seconds.
+        :param ratios: Dictionary mapping ratio names (e.g. "Theta/Beta") to the ratio of every window
+                       (BandPowerAnalyzer.band_ratios).
+        :param title: Title of the figure.
+        :return: Plotly figure.
+        """
+        fig = go.Figure()
+        for name, values in ratios.items():
+            fig.add_trace(go.Scatter(x=times, y=values, mode='lines', line=dict(width=1), name=name))
+
+        fig.update_layout(
+            title=title,
+            xaxis_title="Time (s)",
+            yaxis_title="Ratio",
+            yaxis_type="log",
+            legend_title="Ratio"
+        )
+        return fig
+
+    @staticmethod
+    def plot_band_ratios(times, ratios, title="Band Power Ratios", key=None):
+        """
+        Plots band power ratios over time (see band_ratios_figure).
+
+        :param times: Start of every window in seconds.
+        :param ratios: Dictionary mapping ratio names to the ratio of every window.
+        :param title: Title of the figure.
+        :param key: Optional unique key of the chart.
+        """
+        import streamlit as st
+        fig = EEGVisualizer.band_ratios_figure(times, ratios, title)
+        with Stage("serialize"):
+            st.plotly_chart(fig, use_container_width=True, key=key)
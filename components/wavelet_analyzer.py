@@ -2,74 +2,320 @@
 
 import numpy as np
 import plotly.graph_objects as go
-import streamlit as st
 import pywt
+from components.cwt_engine import FFTWaveletTransform
+from components.downsampler import ScalogramPyramid
+from components.profiler import Stage
+from components.result_cache import ResultCache
 
 
 class EEGWaveletAnalyzer:
     """
     Class to handle wavelet-based frequency analysis of EEG data using Plotly.
+
+    Scales are chosen from the requested frequency band: they are log-spaced with a fixed number of voices
+    per octave between min_freq and max_freq, so only the displayed frequencies are computed.
+
+    Long spans are transformed block by block. Each octave of scales is computed with as much context
+    before and after the block as its wavelet filters reach (their cone of influence), so the stitched
+    blocks equal the transform of the whole recording while memory only grows with the block size.
+
+    For display, magnitudes are kept in a ScalogramPyramid (max-pooled in time), so a plot only sends
+    about one uint8 column per pixel whatever the length of the viewed range.
+
+    The signal can also be a (channels x samples) array, in which case every block of every channel is
+    transformed in one batch and the results gain a leading channel axis.
     """
 
-    def __init__(self, signal, sampling_rate=1000, min_freq=0.5, max_freq=100):
+    WAVELET = 'cmor1.5-1.0'
+    PYRAMID_MAX_MB = 64
+    BLOCK_MAX_MB = 256  # Bound on the coefficients of one block of all the channels
+    PROGRESSIVE_STRIDES = (8, 4, 2, 1)  # Scales filled in by iter_scalogram_pyramid, every 8th one first
+
+    def __init__(self, signal, sampling_rate=1000, min_freq=0.5, max_freq=100, cache=None, fingerprint=None,
+                 channel=None, single_precision=False, voices_per_octave=16, block_sec=30, fft_workers=-1):
         """
         Initializes the EEGWaveletAnalyzer with the signal to be analyzed.
 
-        :param signal: The EEG signal (1D array) to analyze.
+        :param signal: The EEG signal (1D array) to analyze, or a (channels x samples) array of several channels.
         :param sampling_rate: The sampling rate of the signal (default: 1000 Hz).
         :param min_freq: Minimum frequency of interest (default: 0.5 Hz).
         :param max_freq: Maximum frequency of interest (default: 100 Hz).
+        :param cache: ResultCache memoizing the transforms (default: the process-wide cache).
+        :param fingerprint: Fingerprint of the recording the signal comes from (ResultCache.recording_fingerprint).
+                            Without it, transforms are identified by a hash of the analyzed samples.
+        :param channel: Name of the channel the signal comes from (a list of names for several channels).
+        :param single_precision: If True, compute the transform in complex64, which halves its memory and time
+                                 (default: False).
+        :param voices_per_octave: Number of scales per octave of frequency (default: 16).
+        :param block_sec: Duration of the blocks in which long spans are transformed (default: 30 seconds).
+        :param fft_workers: Number of threads of each FFT (default: -1, one per CPU; see FFTWaveletTransform).
         """
-        self.signal = signal
+        self.signal = np.asarray(signal)
         self.sampling_rate = sampling_rate
         self.min_freq = min_freq
         self.max_freq = max_freq
-        self.scales = np.arange(1, 128)  # Define scales based on the desired frequency range using a Morlet wavelet
+        self.voices_per_octave = voices_per_octave
+        self.scales, self.frequencies = self.frequency_scales(min_freq, max_freq, sampling_rate, voices_per_octave)
+        self.cache = cache if cache is not None else ResultCache.shared()
+        self.fingerprint = fingerprint
+        self.channel = channel
+        self.transformer = FFTWaveletTransform(self.WAVELET,
+                                               dtype=np.complex64 if single_precision else np.complex128,
+                                               workers=fft_workers)
+        self.block_sec = block_sec
+        self._support = None
+
+    @classmethod
+    def frequency_scales(cls, min_freq, max_freq, sampling_rate, voices_per_octave=16):
+        """
+        Returns log-spaced scales covering a frequency band, from the highest frequency down.
 
+        :param min_freq: Lowest frequency of the band in Hz.
+        :param max_freq: Highest frequency of the band in Hz, capped at the Nyquist frequency.
+        :param sampling_rate: The sampling rate of the signal.
+        :param voices_per_octave: Number of scales per octave of frequency.
+        :return: Tuple (scales, frequencies) of 1D arrays, where frequencies[i] is the frequency of scales[i] in Hz.
+        """
+        max_freq = min(max_freq, sampling_rate / 2)
+        if not 0 < min_freq <= max_freq:
+            raise ValueError(f"Invalid frequency band [{min_freq}, {max_freq}] Hz.")
+
+        num_scales = int(np.floor(np.log2(max_freq / min_freq) * voices_per_octave)) + 1
+        frequencies = max_freq * 2.0 ** (-np.arange(num_scales) / voices_per_octave)
+        scales = pywt.central_frequency(cls.WAVELET) * sampling_rate / frequencies
+        return scales, pywt.scale2frequency(cls.WAVELET, scales) * sampling_rate
+
+    @Stage("transform")
     def perform_wavelet_transform(self, time_range):
         """
         Performs the Continuous Wavelet Transform (CWT) on the selected time range of the signal.
 
+        The samples around the range are used as context, so the coefficients have no edge effect except at
+        the edges of the recording. Coefficients larger than a fraction of the ResultCache budget (about a
+        minute of one channel in complex64 with the default band and budget) are not kept in memory; the pages
+        display the scalogram_pyramid() instead, which stays within PYRAMID_MAX_MB whatever the length of the
+        recording.
+
         :param time_range: Tuple (min_time, max_time) representing the time range in seconds.
-        :return: Coefficients and frequencies from the wavelet transform.
+        :return: Coefficients (one column per sample of the range, after a leading channel axis for several
+                 channels) and frequencies from the wavelet transform.
         """
         start_idx = int(time_range[0] * self.sampling_rate)
         end_idx = int(time_range[1] * self.sampling_rate)
 
         # Slice the signal according to the selected time range
-        signal_slice = self.signal[start_idx:end_idx]
+        signal_slice = self.signal[..., start_idx:end_idx]
+
+        params = {"analysis": "cwt", "wavelet": self.WAVELET, "scales": self.scales.tolist(),
+                  "sampling_rate": self.sampling_rate, "min_freq": self.min_freq, "max_freq": self.max_freq,
+                  "dtype": self.transformer.dtype.str}
+        key = self.cache.analysis_key(signal_slice, params, self.fingerprint, self.channel, start_idx)
+        return self.cache.get_or_compute(key, lambda: self._transform(time_range))
+
+    def _transform(self, time_range):
+        """
+        Computes the CWT of a time range of the signal by stitching its blocks.
+
+        :param time_range: Tuple (min_time, max_time) representing the time range in seconds.
+        :return: Coefficients and frequencies from the wavelet transform.
+        """
+        tiles = [tile for _, tile in self.iter_wavelet_tiles(time_range)]
+        if not tiles:
+            shape = self.signal.shape[:-1] + (len(self.scales), 0)
+            return np.empty(shape, dtype=self.transformer.dtype), self.frequencies
+        return np.concatenate(tiles, axis=-1), self.frequencies
+
+    def iter_wavelet_tiles(self, time_range=None, block_sec=None, scale_indices=None):
+        """
+        Computes the CWT of a time range block by block, yielding each block as soon as it is ready.
+
+        :param time_range: Tuple (min_time, max_time) in seconds (default: the whole recording).
+        :param block_sec: Duration of the blocks in seconds (default: the analyzer's block_sec); shortened for
+                          many channels so a block stays within BLOCK_MAX_MB.
+        :param scale_indices: Increasing indices of the scales to compute (default: every scale).
+        :return: Generator of tuples ((start_time, end_time), coefficients) where coefficients has one row per
+                 scale (aligned with self.frequencies, or with scale_indices) and one column per sample of the
+                 block, after a leading channel axis for several channels.
+        """
+        if scale_indices is None:
+            scale_indices = np.arange(len(self.scales))
+        scale_indices = np.asarray(scale_indices, dtype=np.intp)
+        samples = self.signal
+        total = samples.shape[-1]
+        if time_range is None:
+            start_idx, end_idx = 0, total
+        else:
+            start_idx = max(0, int(time_range[0] * self.sampling_rate))
+            end_idx = min(total, int(time_range[1] * self.sampling_rate))
+        block = max(1, int((block_sec or self.block_sec) * self.sampling_rate))
+        num_channels = samples.shape[0] if samples.ndim == 2 else 1
+        max_block = self.BLOCK_MAX_MB * 1024 ** 2 // (num_channels * max(1, len(scale_indices)) *
+                                                      self.transformer.dtype.itemsize)
+        block = min(block, max(self.sampling_rate, max_block))
+
+        if self._support is None:
+            self._support = self.transformer.support(self.scales)
+        before, after = self._support
+
+        # One group of scales per octave, so short scales do not pay for the context of long ones
+        octaves = scale_indices // self.voices_per_octave
+        groups = [(np.flatnonzero(octaves == octave), scale_indices[octaves == octave])
+                  for octave in np.unique(octaves)]
+
+        for block_start in range(start_idx, end_idx, block):
+            block_end = min(block_start + block, end_idx)
+            tile = np.empty(samples.shape[:-1] + (len(scale_indices), block_end - block_start),
+                            dtype=self.transformer.dtype)
+            for rows, group in groups:
+                # Samples outside of the recording count as zeros, as in the transform of the whole recording
+                context_start = max(0, block_start - int(before[group].max()))
+                context_end = min(total, block_end + int(after[group].max()))
+                coefficients = self.transformer.transform(samples[..., context_start:context_end], self.scales[group])
+                tile[..., rows, :] = coefficients[..., block_start - context_start:block_end - context_start]
+            yield (block_start / self.sampling_rate, block_end / self.sampling_rate), tile
+
+    @Stage("transform")
+    def scalogram_pyramid(self, time_range=None, max_mb=PYRAMID_MAX_MB, base_bucket=None):
+        """
+        Returns the scalogram pyramid of a time range, computing it block by block on first use.
+
+        :param time_range: Tuple (min_time, max_time) in seconds (default: the whole recording).
+        :param max_mb: Approximate memory budget of the pyramid in megabytes; the finest level is pooled
+                       over as many samples as needed to fit in it (default: PYRAMID_MAX_MB).
+        :param base_bucket: Number of samples pooled in the finest level, instead of deriving it from max_mb
+                            (e.g. the sampling rate for one column per second).
+        :return: ScalogramPyramid whose rows are aligned with self.frequencies, or a list with one pyramid per
+                 channel for several channels (sharing the budget).
+        """
+        key, start_idx, end_idx, base_bucket = self._pyramid_key(time_range, max_mb, base_bucket)
+        num_channels = self.signal.shape[0] if self.signal.ndim == 2 else 1
 
-        # Perform CWT using a parametrized Morlet wavelet
-        coefficients, _ = pywt.cwt(signal_slice, self.scales, 'cmor1.5-1.0')
+        def build():
+            pyramids = [ScalogramPyramid(len(self.scales), start_idx=start_idx, base_bucket=base_bucket)
+                        for _ in range(num_channels)]
+            for _, tile in self.iter_wavelet_tiles((start_idx / self.sampling_rate, end_idx / self.sampling_rate)):
+                magnitudes = np.abs(tile).reshape(num_channels, len(self.scales), -1)
+                for pyramid, channel_magnitudes in zip(pyramids, magnitudes):
+                    pyramid.append(channel_magnitudes)
+            for pyramid in pyramids:
+                pyramid.finish()
+            return pyramids if self.signal.ndim == 2 else pyramids[0]
 
-        # Convert scales to frequencies (in Hz)
-        frequencies = pywt.scale2frequency('cmor1.5-1.0', self.scales) * self.sampling_rate
-        frequencies = frequencies[(frequencies <= self.max_freq) & (frequencies >= self.min_freq)]
+        return self.cache.get_or_compute(key, build)
 
-        # Return only the central portion to reduce the edge effect
-        center_coefficients = coefficients[:, 200:-200]  # Trim to avoid edge effects
+    def _pyramid_key(self, time_range, max_mb, base_bucket):
+        """
+        Returns the cache key, sample range and base bucket of a scalogram pyramid (see scalogram_pyramid).
+        """
+        total = self.signal.shape[-1]
+        num_channels = self.signal.shape[0] if self.signal.ndim == 2 else 1
+        if time_range is None:
+            start_idx, end_idx = 0, total
+        else:
+            start_idx = max(0, int(time_range[0] * self.sampling_rate))
+            end_idx = min(total, int(time_range[1] * self.sampling_rate))
+
+        # The levels of a pyramid add up to about twice its finest level
+        finest_bytes = 2 * 4 * num_channels * len(self.scales) * max(1, end_idx - start_idx)
+        if base_bucket is None:
+            base_bucket = 1
+            while finest_bytes / base_bucket > max_mb * 1024 ** 2:
+                base_bucket *= 2
+
+        params = {"analysis": "scalogram", "wavelet": self.WAVELET, "scales": self.scales.tolist(),
+                  "sampling_rate": self.sampling_rate, "dtype": self.transformer.dtype.str,
+                  "base_bucket": base_bucket}
+        key = self.cache.analysis_key(self.signal[..., start_idx:end_idx], params, self.fingerprint, self.channel,
+                                      start_idx)
+        return key, start_idx, end_idx, base_bucket
+
+    def iter_scalogram_pyramid(self, time_range=None, max_mb=PYRAMID_MAX_MB, base_bucket=None):
+        """
+        Computes the scalogram pyramid of a time range like scalogram_pyramid(), yielding partial pyramids as
+        the scales are filled in: every 8th scale over the whole range first, then the scales halfway
+        between them, and so on (see PROGRESSIVE_STRIDES). Every scale is still computed only once.
+
+        :param time_range: Tuple (min_time, max_time) in seconds (default: the whole recording).
+        :param max_mb: Approximate memory budget of the pyramid in megabytes (default: PYRAMID_MAX_MB).
+        :param base_bucket: Number of samples pooled in the finest level (see scalogram_pyramid).
+        :return: Generator of tuples (pyramid, frequencies, progress) where pyramid (a list with one pyramid
+                 per channel for several channels, None until the first scales are done) only has the rows of
+                 the scales computed so far, frequencies are those of its rows and progress is the fraction
+                 of the scales computed. The last pyramid is complete and stored in the cache entry of
+                 scalogram_pyramid().
+        """
+        key, start_idx, end_idx, base_bucket = self._pyramid_key(time_range, max_mb, base_bucket)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached, self.frequencies, 1.0
+            return
 
-        return center_coefficients, frequencies
+        num_channels = self.signal.shape[0] if self.signal.ndim == 2 else 1
+        num_scales = len(self.scales)
+        span = (start_idx / self.sampling_rate, end_idx / self.sampling_rate)
+        computed = np.zeros(num_scales, dtype=bool)
+        snapshot, frequencies = None, None
+        columns = np.zeros((num_channels, num_scales, 0), dtype=np.float32)
+        for stride in self.PROGRESSIVE_STRIDES:
+            rows = np.flatnonzero((np.arange(num_scales) % stride == 0) & ~computed)
+            if not len(rows):
+                continue
+            pyramids = [ScalogramPyramid(len(rows), start_idx=start_idx, base_bucket=base_bucket)
+                        for _ in range(num_channels)]
+            for (_, block_end), tile in self.iter_wavelet_tiles(span, scale_indices=rows):
+                magnitudes = np.abs(tile).reshape(num_channels, len(rows), -1)
+                for pyramid, channel_magnitudes in zip(pyramids, magnitudes):
+                    pyramid.append(channel_magnitudes)
+                done = (block_end - span[0]) / (span[1] - span[0])
+                yield snapshot, frequencies, (computed.sum() + done * len(rows)) / num_scales
+            for pyramid in pyramids:
+                pyramid.finish()
+
+            # The finest columns of the new scales are merged with the previous ones, in frequency order
+            stage_columns = np.stack([pyramid.base_columns() for pyramid in pyramids])
+            if not columns.shape[2]:
+                columns = np.zeros((num_channels, num_scales, stage_columns.shape[2]), dtype=np.float32)
+            columns[:, rows] = stage_columns
+            computed[rows] = True
+            pyramids = [ScalogramPyramid.from_columns(channel_columns[computed], base_bucket, end_idx - start_idx,
+                                                      start_idx) for channel_columns in columns]
+            snapshot = pyramids if self.signal.ndim == 2 else pyramids[0]
+            frequencies = self.frequencies[computed]
+            yield snapshot, frequencies, computed.sum() / num_scales
+
+        if snapshot is None:  # No scales
+            snapshot = self.scalogram_pyramid(time_range, max_mb, base_bucket)
+        self.cache.put(key, snapshot)
 
     @staticmethod
-    def plot_wavelet_transform(coefficients, frequencies, time_range):
+    @Stage("figure")
+    def scalogram_figure(pyramid, frequencies, time_range, sampling_rate=1000, width_px=1500):
         """
-        Plots the wavelet transform coefficients as a time-frequency heatmap using Plotly.
+        Builds the time-frequency heatmap of the part of a scalogram pyramid within a time range.
 
-        :param coefficients: The CWT coefficients.
+        :param pyramid: ScalogramPyramid with the magnitudes.
         :param frequencies: The corresponding frequencies for each scale.
         :param time_range: Tuple (min_time, max_time) representing the time range in seconds.
+        :param sampling_rate: The sampling rate of the signal (default: 1000 Hz).
+        :param width_px: Approximate plot width in pixels; at most one column per pixel is sent (default: 1500).
+        :return: Plotly figure.
         """
-        # Time axis based on the time range
-        time = np.linspace(time_range[0], time_range[1], num=coefficients.shape[1])
+        start_idx = int(time_range[0] * sampling_rate)
+        end_idx = int(time_range[1] * sampling_rate)
+        with Stage("slice"):
+            positions, values = pyramid.query(start_idx, end_idx, width_px, quantize=True)
 
-        # Create heatmap using Plotly
+        # Values are quantized to uint8; the color bar shows them in amplitude units
+        ticks = np.linspace(0, 255, 6)
         heatmap = go.Heatmap(
-            z=np.abs(coefficients),
-            x=time,
+            z=values,
+            x=positions / sampling_rate,
             y=frequencies,
             colorscale='Viridis',
-            zmin=0, zmax=np.abs(coefficients).max()
+            zmin=0, zmax=255,
+            colorbar=dict(title="Amplitude", tickvals=ticks,
+                          ticktext=[f"{tick * pyramid.max_value / 255:.3g}" for tick in ticks])
         )
 
         # Layout configuration for the heatmap
@@ -77,10 +323,43 @@ class EEGWaveletAnalyzer:
             title=f"Time-Frequency Representation (Wavelet Transform) from {time_range[0]}s to {time_range[1]}s",
             xaxis_title="Time (s)",
             yaxis_title="Frequency (Hz)",
-            coloraxis_colorbar=dict(title="Amplitude")
+            yaxis_type="log",  # Scales are log-spaced, so every row gets the same height
         )
 
-        fig = go.Figure(data=[heatmap], layout=layout)
+        return go.Figure(data=[heatmap], layout=layout)
+
+    @staticmethod
+    def plot_scalogram(pyramid, frequencies, time_range, sampling_rate=1000, width_px=1500):
+        """
+        Plots the part of a scalogram pyramid within a time range in the page (see scalogram_figure).
+
+        :param pyramid: ScalogramPyramid with the magnitudes.
+        :param frequencies: The corresponding frequencies for each scale.
+        :param time_range: Tuple (min_time, max_time) representing the time range in seconds.
+        :param sampling_rate: The sampling rate of the signal (default: 1000 Hz).
+        :param width_px: Approximate plot width in pixels; at most one column per pixel is sent (default: 1500).
+        """
+        import streamlit as st  # Imported on use so the analyzer also works without Streamlit
+        fig = EEGWaveletAnalyzer.scalogram_figure(pyramid, frequencies, time_range, sampling_rate, width_px)
+        with Stage("serialize"):
+            st.plotly_chart(fig, use_container_width=True)
+
+    @staticmethod
+    def plot_wavelet_transform(coefficients, frequencies, time_range, width_px=1500):
+        """
+        Plots the wavelet transform coefficients as a time-frequency heatmap using Plotly.
+
+        :param coefficients: The CWT coefficients.
+        :param frequencies: The corresponding frequencies for each scale.
+        :param time_range: Tuple (min_time, max_time) representing the time range in seconds.
+        :param width_px: Approximate plot width in pixels; at most one column per pixel is sent (default: 1500).
+        """
+        # One column per sample of the time range
+        duration = time_range[1] - time_range[0]
+        sampling_rate = coefficients.shape[1] / duration if duration > 0 else 1
 
-        # Display the plot in Streamlit
-        st.plotly_chart(fig, use_container_width=True)
+        # Magnitudes are computed once and max-pooled in time down to the plot width
+        pyramid = ScalogramPyramid(coefficients.shape[0], start_idx=int(time_range[0] * sampling_rate))
+        pyramid.append(np.abs(coefficients))
+        pyramid.finish()
+        EEGWaveletAnalyzer.plot_scalogram(pyramid, frequencies, time_range, sampling_rate, width_px)
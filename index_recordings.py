@@ -0,0 +1,63 @@
+# index_recordings.py
+
+import argparse
+import glob
+import os
+import sys
+import time
+from components.analysis_index import AnalysisIndex
+
+
+def index_directory(directory, sampling_rate, pattern, force=False):
+    """
+    Builds the analysis index of every recording of a directory that has no up-to-date one.
+
+    :return: Tuple (built, failed) with the number of indexes built and of recordings that failed.
+    """
+    cache_dir = os.path.join(directory, ".cache")
+    built = failed = 0
+    for path in sorted(glob.glob(os.path.join(directory, pattern), recursive=True)):
+        if not force and AnalysisIndex.load(path, cache_dir) is not None:
+            continue
+        started = time.perf_counter()
+        try:
+            index = AnalysisIndex.build_for_file(
+                path, sampling_rate, cache_dir,
+                progress=lambda step: print(f"{os.path.basename(path)}: {step}", file=sys.stderr, flush=True))
+        except Exception as error:  # Report the file and go on with the others
+            print(f"{path}: failed ({error})", file=sys.stderr, flush=True)
+            failed += 1
+            continue
+        built += 1
+        print(f"{path}: indexed {len(index.channels)} channels, {index.num_samples / sampling_rate:.0f} s "
+              f"in {time.perf_counter() - started:.1f} s ({index.nbytes / 1024 ** 2:.1f} MB)", flush=True)
+    return built, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the analysis index (per-second statistics, window entropies, band powers and a "
+                    "coarse scalogram) of the recordings of a directory, which the pages read instead of "
+                    "computing their default views.")
+    parser.add_argument("directory", nargs="?", default="data", help="Directory with the CSV recordings "
+                                                                     "(default: data).")
+    parser.add_argument("--pattern", default="*.csv", help="Glob pattern of the recordings (default: *.csv).")
+    parser.add_argument("--sampling-rate", type=int, default=1000, help="Sampling rate in Hz (default: 1000).")
+    parser.add_argument("--force", action="store_true", help="Rebuild the indexes that are up to date.")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="Keep running and index new or modified recordings, checking every SECONDS.")
+    args = parser.parse_args()
+
+    built, failed = index_directory(args.directory, args.sampling_rate, args.pattern, args.force)
+    while args.watch:
+        time.sleep(args.watch)
+        index_directory(args.directory, args.sampling_rate, args.pattern)
+    print(f"{built} indexed, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -1,6 +1,7 @@
 # pages/1_⚡_EEG_Visualization.py
 
 from components.data_loader import EEGDataLoader
+from components.stream_source import FileTailStreamSource, ReplayStreamSource, SocketStreamSource
 from components.visualizer import EEGVisualizer
 from components.ui_elements import UIElements
 import streamlit as st
@@ -23,27 +24,138 @@ def main():
 
     # List available CSV files in the data directory
     available_files = [f for f in os.listdir("data") if f.endswith(".csv")]
+
+    if st.radio("Source", ["Recording file", "Live stream"], horizontal=True) == "Live stream":
+        live_view(available_files)
+        return
+
     selected_file = st.selectbox("Select an EEG file to load", available_files)
 
     eeg_loader = EEGDataLoader(selected_file)
     data = eeg_loader.load_data()
 
     if data is not None:
+        preprocessor = UIElements.preprocessing_options(eeg_loader.sampling_rate)
+
         # Display signal information
         st.markdown(f"**Sampling rate:** {1000} Hz")
         st.markdown("**Electrodes:** Fp1 and Fp2 according to the international 10-20 system")
         st.markdown("**Reference electrode:** Behind the ear")
-
-        # Instantiate the EEGVisualizer
-        visualizer = EEGVisualizer(data)
+        if eeg_loader.ingest_stats:
+            stats = eeg_loader.ingest_stats
+            st.caption(f"Converted {stats['bytes'] / 1024 ** 2:.1f} MB of CSV to {stats['dtype']} in "
+                       f"{stats['seconds']:.2f} s ({stats['mb_per_s']:.1f} MB/s, {stats['engine']} engine)")
 
         # Add a slider for selecting the time range
-        total_duration = len(data) / visualizer.sampling_rate
+        total_duration = len(data) / eeg_loader.sampling_rate
         time_range = st.slider("Select the time range to visualize", 0.0, total_duration, (0.0, total_duration), 0.1)
 
-        # Plot both channels in a single graph, limited to the selected time range
-        visualizer.plot_channels("A1", "A2", time_range)
+        # A box selection on the plot zooms into that range, refetched at a finer resolution
+        zoom_range = st.session_state.get("eeg_zoom_range")
+        if zoom_range and time_range[0] <= zoom_range[0] < zoom_range[1] <= time_range[1]:
+            st.caption(f"Zoomed in on {zoom_range[0]:.2f}s - {zoom_range[1]:.2f}s")
+            if st.button("Reset zoom"):
+                st.session_state.pop("eeg_zoom_range")
+                st.rerun()
+        else:
+            zoom_range = time_range
+
+        # Plot the selected channels as stacked traces, limited to the selected time range
+        channels = eeg_loader.get_channels()
+        selected_channels = st.multiselect("Channels to display", channels, default=channels)
+
+        # Optionally filter the displayed channels and mark their artifacts; every page shares the filtered
+        # samples of each channel
+        if preprocessor is not None:
+            data = eeg_loader.preprocess(preprocessor, selected_channels)
+            if selected_channels:
+                st.caption(f"Signals filtered; {eeg_loader.artifact_mask.mean():.1%} of the "
+                           f"{preprocessor.epoch_sec} s epochs are marked as artifacts.")
+
+        # Instantiate the EEGVisualizer; long ranges of an indexed recording are plotted from its index
+        index = eeg_loader.load_index()
+        visualizer = EEGVisualizer(data, eeg_loader.sampling_rate, recording_key=eeg_loader.recording_key,
+                                   index=index)
+        selected_range = visualizer.plot_montage(selected_channels, zoom_range, zoomable=True)
+        if selected_range and selected_range[1] > selected_range[0]:
+            st.session_state["eeg_zoom_range"] = selected_range
+            st.rerun()
+
+        if index is not None:
+            with st.expander("Per-second statistics (analysis index)"):
+                stat = st.selectbox("Statistic", index.STATS, index=index.STATS.index("rms"))
+                visualizer.plot_second_stats(index.arrays[stat], index.channels, stat, key="second_stats")
+
+
+def live_view(available_files):
+    """
+    Shows the last seconds of a live stream, refreshed at the selected rate. The source and the visualizer
+    are kept in the session so the producer thread and the frame arrays survive reruns; the source stops by
+    itself once no frame has read it for a while (e.g. after the tab was closed).
+    """
+    kind = st.selectbox("Stream source", ["Replay a recording (test)", "TCP socket", "Follow a CSV file"])
+    if kind == "Replay a recording (test)":
+        replay_file = st.selectbox("Recording to replay", available_files)
+        speed = st.number_input("Replay speed", min_value=0.1, max_value=20.0, value=1.0, step=0.5)
+
+        def create():
+            return ReplayStreamSource(replay_file, speed=speed)
+    elif kind == "TCP socket":
+        host = st.text_input("Host", "127.0.0.1")
+        port = st.number_input("Port", min_value=1, max_value=65535, value=5555)
+        channels = st.text_input("Channels (comma-separated, in wire order)", "A1,A2")
+
+        def create():
+            return SocketStreamSource(host, int(port), [name.strip() for name in channels.split(",")])
+    else:
+        file_path = st.text_input("CSV file being written", os.path.join("data", "live.csv"))
+
+        def create():
+            return FileTailStreamSource(file_path)
+
+    col1, col2 = st.columns(2)
+    if col1.button("Start"):
+        if "eeg_stream" in st.session_state:
+            st.session_state.pop("eeg_stream").stop()
+        try:
+            source = create().start()
+        except OSError as error:
+            st.error(f"The stream could not be opened: {error}")
+            return
+        st.session_state["eeg_stream"] = source
+        st.session_state["eeg_stream_visualizer"] = EEGVisualizer(source, source.sampling_rate)
+    if col2.button("Stop") and "eeg_stream" in st.session_state:
+        st.session_state.pop("eeg_stream").stop()
+        st.session_state.pop("eeg_stream_visualizer", None)
+
+    source = st.session_state.get("eeg_stream")
+    if source is None:
+        st.info("Start a stream to see the signal.")
+        return
+
+    last_sec = st.slider("Seconds to display", 1, int(source.buffer.capacity / source.sampling_rate), 10)
+    refresh_hz = st.slider("Refresh rate (frames per second)", 1, 10, 4)
+    channel_fp1 = source.channels[0]
+    channel_fp2 = source.channels[1] if len(source.channels) > 1 else None
+
+    # st.fragment is named st.experimental_fragment before Streamlit 1.37
+    fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+    @fragment(run_every=1 / refresh_hz)
+    def frame():
+        if source.error is not None:
+            st.error(f"The stream stopped: {source.error}")
+        elif source.idle_stopped:
+            st.warning(f"The stream was stopped after {source.idle_sec} s without being displayed; press Start to "
+                       f"resume it.")
+        elif not source.running:
+            st.warning("The stream has ended.")
+        st.caption(f"{source.total_samples / source.sampling_rate:.1f} s received")
+        visualizer = st.session_state["eeg_stream_visualizer"]
+        visualizer.plot_channels(channel_fp1, channel_fp2, last_sec=last_sec, key="eeg_live")
+
+    frame()
 
 
 if __name__ == "__main__":
-    main()
+    UIElements.run_page(main, "EEG Visualization")
@@ -2,13 +2,14 @@
 
 from components.data_loader import EEGDataLoader
 from components.wavelet_analyzer import EEGWaveletAnalyzer
+from components.band_power import BandPowerAnalyzer
 from components.ui_elements import UIElements
 from components.visualizer import EEGVisualizer
+from components.result_cache import ResultCache
 import streamlit as st
 import os
 
 
-
 def main():
     st.set_page_config(page_title="Frequency Analysis (Wavelet)", page_icon="📡")
 
@@ -25,43 +26,130 @@ def main():
     data = eeg_loader.load_data()
 
     if data is not None:
+        preprocessor = UIElements.preprocessing_options(eeg_loader.sampling_rate)
+
         # Get available channels using the EEGDataLoader class
         channels = eeg_loader.get_channels()
         channel = st.selectbox("Select a channel for frequency analysis", channels)
 
         if channel:
+            # Optionally filter the selected channel and mark its artifacts; every page shares the filtered
+            # samples of each channel
+            if preprocessor is not None:
+                data = eeg_loader.preprocess(preprocessor, [channel])
+                st.caption(f"Signal filtered; {eeg_loader.artifact_mask.mean():.1%} of the "
+                           f"{preprocessor.epoch_sec} s epochs are marked as artifacts.")
+
             # Extract the signal from the selected channel
             signal = data[channel]
             sampling_rate = 1000
 
-            # Instantiate the EEGVisualizer with the data
-            visualizer = EEGVisualizer(data, sampling_rate)
+            # Instantiate the EEGVisualizer with the data; an analysis index provides the overviews
+            index = eeg_loader.load_index()
+            visualizer = EEGVisualizer(data, sampling_rate, recording_key=eeg_loader.recording_key, index=index)
+
+            # Select the frequency band to analyze; only the scales of this band are computed
+            min_freq, max_freq = st.slider(
+                "Select the frequency band to analyze (Hz)",
+                0.5, sampling_rate / 2, (0.5, 100.0), 0.5
+            )
 
             # Instantiate the EEGWaveletAnalyzer with the full signal
-            wavelet_analyzer = EEGWaveletAnalyzer(signal, sampling_rate)
+            wavelet_analyzer = EEGWaveletAnalyzer(
+                signal, sampling_rate, min_freq=min_freq, max_freq=max_freq,
+                fingerprint=ResultCache.recording_fingerprint(eeg_loader.recording_key),
+                channel=channel, single_precision=True)
 
-            # Add a slider for selecting the time range
+            # Add a slider for selecting the time range; any range can be shown since the scalogram of the
+            # whole recording is computed once and served at screen resolution
             total_duration = int(len(signal) / sampling_rate)
-            max_window_size = 30
             time_range = st.slider(
-                "Select the time range to analyze (maximum 30 seconds)",
+                "Select the time range to analyze",
                 0, total_duration, (0, 5), 1
             )
-            #  Limit to 30 seconds
-            if time_range[1] - time_range[0] > max_window_size:
-                st.error(f"The selected window cannot exceed {max_window_size} seconds.")
-                time_range = (time_range[0], time_range[0] + max_window_size)
-                st.info(f"The range will be automatically adjusted between {time_range[0]} and {time_range[1]}")
 
             # Plot the selected channel
             visualizer.plot_channels(f"{channel}", None, time_range)
 
-            # Perform wavelet analysis
-            coefficients, frequencies = wavelet_analyzer.perform_wavelet_transform(time_range)
-
-            # Plot the wavelet transform
-            wavelet_analyzer.plot_wavelet_transform(coefficients, frequencies, time_range)
+            if index is not None:
+                # The whole recording comes from the coarse scalogram of the index, and only the selected
+                # range is transformed at full resolution
+                overview, overview_frequencies = index.scalogram_pyramid(channel)
+                with st.expander("Whole recording (analysis index)"):
+                    wavelet_analyzer.plot_scalogram(overview, overview_frequencies, (0, total_duration), sampling_rate)
+                transformed_range = time_range
+            else:
+                # Perform wavelet analysis of the whole recording, kept as a time-decimated pyramid
+                transformed_range = None
+
+            # The wavelet transform runs in the background, filling in the scales from every 8th one, and the
+            # selected range is plotted as they arrive; a job of a previous band or channel is cancelled
+            inputs = (eeg_loader.recording_key, channel, min_freq, max_freq, transformed_range)
+            job = UIElements.render_job("scalogram", inputs,
+                                        lambda: scalogram_updates(wavelet_analyzer, transformed_range))
+            plot_partial = lambda partial: plot_partial_scalogram(partial, time_range, sampling_rate)
+            if UIElements.show_render_job(job, "Computing the wavelet transform", plot_partial):
+                # Plot the wavelet transform of the selected range
+                pyramid, frequencies = job.result
+                wavelet_analyzer.plot_scalogram(pyramid, frequencies, time_range, sampling_rate)
+
+            # Band powers of the whole recording in sliding windows, from batched Welch or multitaper PSDs (the
+            # defaults of an indexed recording are read from its index through the result cache)
+            st.subheader("Band Power")
+            method = st.radio("Spectral estimate", ["Welch", "Multitaper"], horizontal=True)
+            window_sec = st.slider("Window size (seconds)", 1, 30, 4)
+            hop_sec = st.slider("Time between windows (seconds)", 0.5, float(window_sec), 1.0, 0.5)
+            relative = st.checkbox("Show relative power")
+
+            band_analyzer = BandPowerAnalyzer(
+                signal.to_numpy(), sampling_rate,
+                fingerprint=ResultCache.recording_fingerprint(eeg_loader.recording_key),
+                channel=channel, single_precision=True)
+            # The band powers are computed in the background as well: multitaper estimates take several seconds
+            # on long recordings, and their windows are plotted as they are computed
+            inputs = (eeg_loader.recording_key, channel, method, window_sec, hop_sec)
+            job = UIElements.render_job("band_power", inputs,
+                                        lambda: band_power_updates(band_analyzer, window_sec, hop_sec, method.lower()))
+            plot_partial = lambda partial: plot_band_powers(visualizer, band_analyzer, *partial, relative, channel)
+            if UIElements.show_render_job(job, "Computing the band powers", plot_partial):
+                plot_band_powers(visualizer, band_analyzer, *job.result, relative, channel)
+
+
+def band_power_updates(band_analyzer, window_sec, hop_sec, method):
+    """
+    Yields the partial band powers of the recording with their window times and progress, for a RenderJob.
+    """
+    for times, powers, progress in band_analyzer.iter_band_powers(window_sec, hop_sec, method):
+        yield (times, powers), progress
+
+
+def plot_band_powers(visualizer, band_analyzer, times, powers, relative, channel):
+    """
+    Plots the band powers and band ratios of a channel (windows not computed yet hold NaN and are left blank).
+    """
+    shown = BandPowerAnalyzer.relative_powers(powers) if relative else powers
+    visualizer.plot_band_power(times, shown, list(band_analyzer.bands), relative,
+                               title=f"Band Power Over Time - {channel}", key="band_power")
+    visualizer.plot_band_ratios(times, band_analyzer.band_ratios(powers),
+                                title=f"Band Power Ratios - {channel}", key="band_ratios")
+
+
+def scalogram_updates(wavelet_analyzer, time_range):
+    """
+    Yields the partial scalogram pyramids of a time range with their frequencies and progress, for a RenderJob.
+    """
+    for pyramid, frequencies, progress in wavelet_analyzer.iter_scalogram_pyramid(time_range):
+        yield (pyramid, frequencies), progress
+
+
+def plot_partial_scalogram(partial, time_range, sampling_rate):
+    """
+    Plots a partial scalogram pyramid, once its first scales are computed.
+    """
+    pyramid, frequencies = partial
+    if pyramid is not None:
+        EEGWaveletAnalyzer.plot_scalogram(pyramid, frequencies, time_range, sampling_rate)
 
 
 if __name__ == "__main__":
-    main()
+    UIElements.run_page(main, "Frequency Analysis")
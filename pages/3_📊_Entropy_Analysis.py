@@ -2,10 +2,16 @@
 
 import streamlit as st
 import os
+import uuid
+import numpy as np
+import pandas as pd
+from components.complexity_analyzer import ComplexityAnalyzer
+from components.complexity_jobs import ComplexityJobManager
 from components.data_loader import EEGDataLoader
 from components.ui_elements import UIElements
 from components.entropy_analyzer import EntropyAnalyzer
 from components.visualizer import EEGVisualizer
+from components.result_cache import ResultCache
 
 
 def main():
@@ -24,14 +30,35 @@ def main():
     data = eeg_loader.load_data()
 
     if data is not None:
+        preprocessor = UIElements.preprocessing_options(eeg_loader.sampling_rate)
+
         # Display signal information
         st.markdown(f"**Sampling rate:** {1000} Hz")
         st.markdown("**Electrodes:** Fp1 and Fp2 according to the international 10-20 system")
         st.markdown("**Reference electrode:** Behind the ear")
 
-        # Get the Fp1 and Fp2 data
-        signal_fp1 = data["A1"]
-        signal_fp2 = data["A2"]
+        # Select the channels compared as Fp1 and Fp2 (the first two channels by default)
+        channels = eeg_loader.get_channels()
+        col1, col2 = st.columns(2)
+        channel_fp1 = col1.selectbox("Channel compared as Fp1", channels, index=0)
+        channel_fp2 = col2.selectbox("Channel compared as Fp2", channels, index=min(1, len(channels) - 1))
+
+        # Optionally filter the selected channels and mark their artifacts; every page shares the filtered
+        # samples of each channel
+        if preprocessor is not None:
+            data = eeg_loader.preprocess(preprocessor, dict.fromkeys([channel_fp1, channel_fp2]))
+            st.caption(f"Signals filtered; {eeg_loader.artifact_mask.mean():.1%} of the {preprocessor.epoch_sec} s "
+                       f"epochs are marked as artifacts.")
+        signal_fp1 = data[channel_fp1]
+        signal_fp2 = data[channel_fp2]
+
+        # The entropies of an indexed recording are read from its index (through the result cache) for
+        # 5-second windows, and its whole-recording overview is shown without computing anything
+        index = eeg_loader.load_index()
+        if index is not None:
+            with st.expander("Whole recording (analysis index)"):
+                EEGVisualizer.plot_entropy_over_time(index.entropies(channel_fp1), index.entropies(channel_fp2),
+                                                     index.ENTROPY_WINDOW_SEC, key="indexed_entropy_over_time")
 
         # Add a slider for selecting the time range
         total_duration = int(len(signal_fp1) / 1000)
@@ -51,27 +78,148 @@ def main():
             window_size = st.number_input("Select the window size (seconds)", min_value=5, max_value=30,
                                           value=5, step=5)
 
-        # Calculate entropy
-        entropy_analyzer_fp1 = EntropyAnalyzer(signal_fp1)
-        entropies_fp1 = entropy_analyzer_fp1.calculate_entropies_in_windows(window_size_sec=window_size)
-
-        entropy_analyzer_fp2 = EntropyAnalyzer(signal_fp2)
-        entropies_fp2 = entropy_analyzer_fp2.calculate_entropies_in_windows(window_size_sec=window_size)
-
-        # Visualize entropy
+        # Entropies are computed in the background, coarse windows first, and plotted as they arrive; a job of
+        # a previous range or window size is cancelled. Windows computed before (e.g. before shifting the
+        # range) come from the cache.
         visualizer = EEGVisualizer(data)
-        visualizer.plot_entropy_over_time(entropies_fp1, entropies_fp2, window_size)
-
-        # Calculate the average entropy
+        fingerprint = ResultCache.recording_fingerprint(eeg_loader.recording_key)
+        signals = {channel_fp1: signal_fp1, channel_fp2: signal_fp2}
+        # Windows holding artifacts are skipped when the signals are preprocessed
+        masks = None
+        if preprocessor is not None:
+            masks = {channel: eeg_loader.artifact_samples(channel, start_time * 1000, end_time * 1000)
+                     for channel in signals}
+        inputs = (fingerprint, channel_fp1, channel_fp2, start_time, end_time, window_size)
+        job = UIElements.render_job("entropy", inputs, lambda: entropy_updates(signals, window_size, fingerprint,
+                                                                               start_time * 1000, masks))
+        plot_partial = lambda partial: visualizer.plot_entropy_over_time(partial[channel_fp1], partial[channel_fp2],
+                                                                          window_size, key="entropy_over_time",
+                                                                          connect_gaps=True)
+        if not UIElements.show_render_job(job, "Computing entropies", plot_partial):
+            return
+        entropies_fp1, entropies_fp2 = job.result[channel_fp1], job.result[channel_fp2]
+        visualizer.plot_entropy_over_time(entropies_fp1, entropies_fp2, window_size, key="entropy_over_time")
+
+        if not entropies_fp1:
+            st.error(f"The selected time range is shorter than the window size ({window_size} s).")
+            return
+        if masks is not None:
+            skipped = {channel: int(EntropyAnalyzer.masked_windows(mask, window_size * 1000,
+                                                                   len(entropies_fp1)).sum())
+                       for channel, mask in masks.items()}
+            st.caption("Windows skipped as artifacts: " + ", ".join(f"{count} of {len(entropies_fp1)} ({channel})"
+                                                                   for channel, count in skipped.items()))
+
+        # Optionally show a smoother curve from overlapping windows
+        if st.checkbox("Show entropy over overlapping windows"):
+            hop_size = st.number_input("Select the hop between windows (seconds)", min_value=0.01,
+                                       max_value=float(window_size), value=1.0, step=0.1)
+            sliding_fp1 = EntropyAnalyzer(signal_fp1, fingerprint=fingerprint, channel=channel_fp1,
+                                          offset=start_time * 1000, mask=None if masks is None else masks[channel_fp1]
+                                          ).calculate_sliding_entropies(window_size, hop_size)
+            sliding_fp2 = EntropyAnalyzer(signal_fp2, fingerprint=fingerprint, channel=channel_fp2,
+                                          offset=start_time * 1000, mask=None if masks is None else masks[channel_fp2]
+                                          ).calculate_sliding_entropies(window_size, hop_size)
+            # The overlapping windows are updated incrementally, which needs one tolerance for all of them
+            visualizer.plot_entropy_over_time(sliding_fp1, sliding_fp2, hop_size, key="sliding_entropy_over_time",
+                                              title="Entropy Over Overlapping Windows - Fixed Tolerance")
+            st.caption("Approximate and Sample Entropy of the overlapping windows use one tolerance r for every "
+                       "window (0.2 times the standard deviation of the whole selected range), whereas the curve "
+                       "above takes r from each window; their values are not directly comparable.")
+
+        # Calculate the average entropy (over the windows that were not skipped as artifacts)
         entropy_labels = ["Shannon", "Approximate", "Sample"]
-        avg_entropy_fp1 = {metric: sum([window[metric] for window in entropies_fp1]) / len(entropies_fp1) for metric in
+        avg_entropy_fp1 = {metric: np.nanmean([window[metric] for window in entropies_fp1]) for metric in
                            entropy_labels}
-        avg_entropy_fp2 = {metric: sum([window[metric] for window in entropies_fp2]) / len(entropies_fp2) for metric in
+        avg_entropy_fp2 = {metric: np.nanmean([window[metric] for window in entropies_fp2]) for metric in
                            entropy_labels}
 
         # Visualize bars to compare the average entropy between Fp1 and Fp2
         visualizer.plot_entropy_bars(list(avg_entropy_fp1.values()), list(avg_entropy_fp2.values()), entropy_labels)
 
+        # Complexity metrics take long on long signals, so they run in the background
+        if st.checkbox("Compute complexity metrics (NeuroKit2, makowski2022)"):
+            complexity_view({channel_fp1: signal_fp1, channel_fp2: signal_fp2}, fingerprint, start_time * 1000)
+        elif "complexity_job" in st.session_state:
+            ComplexityJobManager.shared().cancel(st.session_state.pop("complexity_job")["job_id"])
+
+
+def entropy_updates(signals, window_size, fingerprint, offset, masks=None):
+    """
+    Yields the partial entropies of the windows of both channels with the fraction of windows computed, for a
+    RenderJob. Windows skipped as artifacts count as computed.
+    """
+    partials = EntropyAnalyzer.iter_entropies_in_windows(signals, window_size_sec=window_size, min_interval_sec=0,
+                                                         fingerprint=fingerprint, offset=offset, coarse_first=True,
+                                                         masks=masks)
+    try:
+        for partial in partials:
+            pending, total = 0, 0
+            for channel, entropies in partial.items():
+                values = np.array([list(window.values()) for window in entropies]).reshape(len(entropies), -1)
+                skipped = EntropyAnalyzer.masked_windows((masks or {}).get(channel), window_size * 1000,
+                                                         len(entropies))
+                pending += int((np.isnan(values).any(axis=1) & ~skipped).sum())
+                total += len(entropies)
+            yield partial, 1 - pending / total if total else 1.0
+    finally:
+        partials.close()  # Drops the windows still queued on the executor when the job is cancelled
+
+
+def complexity_view(signals, fingerprint, offset, sampling_rate=1000):
+    """
+    Submits the complexity job of the selected channel and shows its progress, then its results. The job ID
+    is kept in the session; a job whose inputs changed is cancelled and replaced, and a cancelled job is
+    submitted again.
+    """
+    col1, col2, col3 = st.columns(3)
+    channel = col1.selectbox("Channel", list(signals))
+    reduction = col2.selectbox("Long signals are", ComplexityAnalyzer.REDUCTIONS,
+                               format_func={"segment": "split into segments", "decimate": "decimated"}.get)
+    target_sec = col3.number_input("Seconds analyzed at once", min_value=1, max_value=60, value=10)
+
+    manager = ComplexityJobManager.shared()
+    session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+    inputs = (fingerprint, channel, offset, len(signals[channel]), reduction, target_sec)
+    current = st.session_state.get("complexity_job")
+    current_job = manager.job(current["job_id"]) if current is not None else None
+    # A job cancelled elsewhere (e.g. by the manager shutting down) is submitted again
+    if (current is None or current["inputs"] != inputs or current_job is None
+            or current_job.state == "cancelled"):
+        if current is not None:
+            manager.cancel(current["job_id"])
+        analyzer = ComplexityAnalyzer(signals[channel], fingerprint=fingerprint, channel=channel, offset=offset)
+        job_id = manager.submit(analyzer, session_id, target_sec * sampling_rate, reduction)
+        st.session_state["complexity_job"] = {"job_id": job_id, "inputs": inputs}
+    job = manager.job(st.session_state["complexity_job"]["job_id"])
+
+    if job.active:
+        # st.fragment is named st.experimental_fragment before Streamlit 1.37
+        fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+        @fragment(run_every=1)
+        def poll():
+            if job.active:
+                label = "Waiting for a previous job" if job.state == "queued" else f"{job.elapsed:.0f} s elapsed"
+                st.progress(job.progress, text=f"Computing complexity metrics... {label}")
+            else:
+                st.rerun()  # Show the results outside of the polling fragment
+
+        poll()
+        return
+    if job.state == "failed":
+        st.error(f"The complexity computation failed: {job.error}")
+        return
+
+    table, info = job.result
+    table = table.rename(index=lambda start: (offset + start) / sampling_rate).rename_axis("Start (s)")
+    if info["decimation"] > 1:
+        st.caption(f"Signal decimated by {info['decimation']} before the analysis.")
+    st.dataframe(table)
+    timings = pd.Series(info["timings"], name="Computation time (s)").sort_values(ascending=False)
+    st.caption(f"Computation time per metric, {timings.sum():.1f} s in total")
+    st.bar_chart(timings)
+
 
 if __name__ == "__main__":
-    main()
+    UIElements.run_page(main, "Entropy Analysis")
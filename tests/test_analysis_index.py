@@ -0,0 +1,29 @@
+# tests/test_analysis_index.py
+
+import numpy as np
+
+from components.analysis_index import AnalysisIndex
+from components.entropy_analyzer import EntropyAnalyzer
+from components.result_cache import ResultCache
+
+
+def test_seeded_entropies_are_read_by_the_analyzer():
+    """
+    The entropies seed_cache() stores are found under the keys EntropyAnalyzer looks up, and equal the
+    entropies it computes.
+    """
+    signals = np.round(512 + 30 * np.random.default_rng(0).normal(size=(2, 20000)))
+    index = AnalysisIndex.build(signals, ["A1", "A2"], 1000)
+    cache = ResultCache()
+    fingerprint = "recording"
+    index.seed_cache(cache, fingerprint, signals)
+
+    hits = cache.stats()["hits"]
+    seeded = EntropyAnalyzer(signals[1], cache=cache, fingerprint=fingerprint,
+                             channel="A2").calculate_entropies_in_windows(index.ENTROPY_WINDOW_SEC)
+    assert cache.stats()["hits"] - hits == len(seeded) == 4
+
+    computed = EntropyAnalyzer(signals[1], cache=ResultCache()).calculate_entropies_in_windows(index.ENTROPY_WINDOW_SEC)
+    for seeded_window, computed_window in zip(seeded, computed):
+        for metric, value in computed_window.items():
+            assert abs(seeded_window[metric] - value) < 1e-9
@@ -0,0 +1,50 @@
+# tests/test_band_power.py
+
+import numpy as np
+import scipy.signal
+
+from components.band_power import BandPowerAnalyzer
+from components.result_cache import ResultCache
+
+
+def band_powers_from_psd(frequencies, psd, bands):
+    """
+    Integrates a one-sided PSD over each band (bins with low <= f < high), as BandPowerAnalyzer does.
+    """
+    resolution = frequencies[1] - frequencies[0]
+    return np.array([psd[(frequencies >= low) & (frequencies < high)].sum() * resolution
+                     for low, high in bands.values()])
+
+
+def test_welch_matches_scipy_on_every_window():
+    """
+    The band powers of every sliding window equal those of scipy.signal.welch on the window.
+    """
+    sampling_rate = 250
+    signal = np.random.default_rng(0).normal(size=(2, 30 * sampling_rate))
+    analyzer = BandPowerAnalyzer(signal, sampling_rate, cache=ResultCache())
+    times, powers = analyzer.calculate_band_powers(window_sec=4, hop_sec=1, segment_sec=1)
+    assert powers.shape == (2, len(times), len(analyzer.bands))
+
+    for channel in range(2):
+        for index, start_time in enumerate(times):
+            start = int(round(start_time * sampling_rate))
+            frequencies, psd = scipy.signal.welch(signal[channel, start:start + 4 * sampling_rate], sampling_rate,
+                                                  nperseg=sampling_rate)
+            np.testing.assert_allclose(powers[channel, index],
+                                       band_powers_from_psd(frequencies, psd, analyzer.bands), rtol=1e-9)
+
+
+def test_multitaper_blocks_match_whole_estimate():
+    """
+    The multitaper band powers yielded block by block end with the result of calculate_band_powers().
+    """
+    signal = np.random.default_rng(1).normal(size=20 * 1000)
+    analyzer = BandPowerAnalyzer(signal, cache=ResultCache())
+    analyzer.BLOCK_MAX_MB = 1  # Several blocks of windows
+    updates = list(analyzer.iter_band_powers(method="multitaper"))
+    assert len(updates) > 1 and np.isnan(updates[0][1]).any()
+    assert updates[-1][2] == 1.0
+
+    _, expected = BandPowerAnalyzer(signal, cache=ResultCache()).calculate_band_powers(method="multitaper")
+    np.testing.assert_allclose(updates[-1][1], expected, rtol=1e-12)
@@ -0,0 +1,53 @@
+# tests/test_csv_ingest.py
+
+import importlib.util
+
+import numpy as np
+import pytest
+
+from components.csv_ingest import CSVIngestor
+
+ENGINES = ["processes"] + (["pyarrow"] if importlib.util.find_spec("pyarrow") else [])
+
+
+def write_csv(path, rows, tail=""):
+    """
+    Writes a two-channel recording of integer ADC counts, optionally followed by more lines.
+    """
+    with open(path, "w") as f:
+        f.write("A1,A2\n")
+        f.write("512,513\n" * rows)
+        f.write(tail)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_late_decimals_are_stored_as_float(tmp_path, engine):
+    """
+    A decimal after many integer rows (beyond the block the column types are inferred from) switches the
+    recording to float32 instead of failing to convert.
+    """
+    source = tmp_path / "late.csv"
+    write_csv(source, 300_000, "1.5,2\n")
+    channels, stats = CSVIngestor(engine=engine, max_workers=1, chunk_mb=1).ingest(str(source),
+                                                                                 str(tmp_path / "late.npy"))
+
+    signals = np.load(tmp_path / "late.npy")
+    assert channels == ["A1", "A2"]
+    assert stats["rows"] == 300_001 and stats["dtype"] == "float32"
+    assert signals.dtype == np.float32 and signals.shape == (2, 300_001)
+    np.testing.assert_array_equal(signals[:, -1], [1.5, 2])
+    np.testing.assert_array_equal(signals[:, 0], [512, 513])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_integer_counts_are_stored_as_int16(tmp_path, engine):
+    """
+    Integer ADC counts within range are narrowed to int16.
+    """
+    source = tmp_path / "counts.csv"
+    write_csv(source, 1000, "-7,32767\n")
+    _, stats = CSVIngestor(engine=engine, max_workers=1).ingest(str(source), str(tmp_path / "counts.npy"))
+
+    signals = np.load(tmp_path / "counts.npy")
+    assert stats["dtype"] == "int16" and signals.dtype == np.int16
+    np.testing.assert_array_equal(signals[:, -1], [-7, 32767])
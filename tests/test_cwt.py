@@ -0,0 +1,41 @@
+# tests/test_cwt.py
+
+import numpy as np
+import pywt
+
+from components.cwt_engine import FFTWaveletTransform
+from components.result_cache import ResultCache
+from components.wavelet_analyzer import EEGWaveletAnalyzer
+
+
+def test_fft_transform_matches_pywt():
+    """
+    The Fourier-domain CWT equals pywt.cwt with the same wavelet and scales.
+    """
+    signal = np.random.default_rng(0).normal(size=4000)
+    scales, _ = EEGWaveletAnalyzer.frequency_scales(2, 100, 1000, voices_per_octave=4)
+    expected, _ = pywt.cwt(signal, scales, EEGWaveletAnalyzer.WAVELET)
+
+    coefficients = FFTWaveletTransform(EEGWaveletAnalyzer.WAVELET).transform(signal, scales)
+    np.testing.assert_allclose(coefficients, expected, rtol=0, atol=1e-9 * np.abs(expected).max())
+
+
+def test_blocks_match_whole_transform():
+    """
+    Transforming a range in blocks, each with the context its filters reach, equals transforming the whole
+    signal at once; several channels in one batch equal each channel alone.
+    """
+    signals = np.random.default_rng(1).normal(size=(2, 20000))
+    analyzer = EEGWaveletAnalyzer(signals, min_freq=1, max_freq=100, cache=ResultCache(), voices_per_octave=4,
+                                  block_sec=3)
+    whole = analyzer.transformer.transform(signals, analyzer.scales)
+
+    tiles = [tile for _, tile in analyzer.iter_wavelet_tiles((2, 17))]
+    assert len(tiles) > 1
+    np.testing.assert_allclose(np.concatenate(tiles, axis=-1), whole[..., 2000:17000], rtol=0,
+                               atol=1e-9 * np.abs(whole).max())
+
+    single = EEGWaveletAnalyzer(signals[1], min_freq=1, max_freq=100, cache=ResultCache(), voices_per_octave=4,
+                                block_sec=3)
+    np.testing.assert_allclose(np.concatenate([tile for _, tile in single.iter_wavelet_tiles((2, 17))], axis=-1),
+                               whole[1, :, 2000:17000], rtol=0, atol=1e-9 * np.abs(whole).max())
@@ -0,0 +1,61 @@
+# tests/test_entropy_engine.py
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from components.entropy_engine import WindowedEntropyEngine
+
+
+def test_long_window_stays_within_batch_bound():
+    """
+    The bitsets of a 30 s window at 1000 Hz (about 110 MB each if built at once) are built in blocks of
+    words, so the peak allocation stays close to MAX_BATCH_WORDS.
+    """
+    engine = WindowedEntropyEngine()
+    windows = np.random.default_rng(0).normal(size=(1, 30 * 1000))
+    bound = engine.MAX_BATCH_WORDS * 8
+
+    tracemalloc.start()
+    try:
+        approximate, sample = engine.approximate_and_sample(windows)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert np.isfinite(approximate).all() and np.isfinite(sample).all()
+    # Besides the bitsets, the sort orders and tolerance ranges of the window (a few MB) are alive
+    assert peak < bound * 1.25
+
+
+def test_blocks_of_words_match_whole_bitsets():
+    """
+    Counts built in blocks of words equal the counts built from whole bitsets.
+    """
+    windows = np.round(np.random.default_rng(1).normal(size=(3, 2000)) * 20)
+    engine = WindowedEntropyEngine()
+    whole = engine.match_counts(windows, engine.tolerances(windows))
+
+    blocked = WindowedEntropyEngine()
+    blocked.MAX_BATCH_WORDS = blocked.BITSET_ARRAYS * 3 * 2000  # One word per block
+    for expected, counts in zip(whole, blocked.match_counts(windows, blocked.tolerances(windows))):
+        np.testing.assert_array_equal(counts, expected)
+
+
+def test_matches_neurokit2():
+    """
+    Shannon, Approximate and Sample Entropy of every window agree with neurokit2 within TOLERANCE.
+    """
+    nk = pytest.importorskip("neurokit2")
+    rng = np.random.default_rng(2)
+    # Integer ADC counts (many ties, as in the recordings) and a continuous signal
+    signal = np.concatenate([np.round(512 + 30 * rng.normal(size=3000)), rng.normal(size=3000)])
+    engine = WindowedEntropyEngine()
+    windows = engine.segment(signal, 1000)
+    results = engine.compute(windows)
+
+    for index, window in enumerate(windows):
+        assert abs(results["Shannon"][index] - nk.entropy_shannon(window)[0]) < engine.TOLERANCE
+        assert abs(results["Approximate"][index] - nk.entropy_approximate(window)[0]) < engine.TOLERANCE
+        assert abs(results["Sample"][index] - nk.entropy_sample(window)[0]) < engine.TOLERANCE
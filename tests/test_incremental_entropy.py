@@ -0,0 +1,33 @@
+# tests/test_incremental_entropy.py
+
+import numpy as np
+import pytest
+
+from components.entropy_engine import WindowedEntropyEngine
+from components.incremental_entropy import IncrementalEntropyEngine
+
+TOLERANCE = 1e-9
+
+
+@pytest.mark.parametrize("window_size", [500, 1000])
+@pytest.mark.parametrize("hop_size", [1, 7, 33, 998])
+def test_matches_windowed_engine(window_size, hop_size):
+    """
+    Updating the entropies hop by hop gives the entropies of every window recomputed from scratch with the
+    same fixed tolerance.
+    """
+    rng = np.random.default_rng(window_size + hop_size)
+    # Integer ADC counts, with many ties as in the recordings
+    signal = np.round(512 + 30 * rng.normal(size=window_size + 40 * hop_size + hop_size // 2))
+    tolerance = 0.2 * np.std(signal, ddof=1)
+
+    incremental = IncrementalEntropyEngine(window_size, tolerance=tolerance).compute(signal, hop_size)
+
+    engine = WindowedEntropyEngine()
+    windows = np.asarray(engine.segment(signal, window_size, hop_size), dtype=np.float64)
+    approximate, sample = engine.approximate_and_sample(windows, np.full(len(windows), tolerance))
+    expected = {"Shannon": engine.shannon(windows), "Approximate": approximate, "Sample": sample}
+
+    for metric, values in expected.items():
+        assert len(incremental[metric]) == len(values) == 41
+        np.testing.assert_allclose(incremental[metric], values, rtol=0, atol=TOLERANCE)
@@ -0,0 +1,106 @@
+# tests/test_multichannel.py
+
+import numpy as np
+import pytest
+
+from components.cwt_engine import FFTWaveletTransform
+from components.downsampler import MontagePyramid
+from components.entropy_analyzer import EntropyAnalyzer
+from components.entropy_executor import ParallelEntropyExecutor
+from components.result_cache import ResultCache
+from components.wavelet_analyzer import EEGWaveletAnalyzer
+
+
+@pytest.fixture(scope="module")
+def signals():
+    return np.round(512 + 30 * np.random.default_rng(0).normal(size=(3, 12000)))
+
+
+def test_channel_entropies_match_each_channel(signals):
+    """
+    Entropies of a (channels x samples) signal, batched, in worker processes or window by window with
+    neurokit2, equal those of each channel alone.
+    """
+    mask = np.zeros(signals.shape, dtype=bool)
+    mask[1, 4500] = True
+    expected = [EntropyAnalyzer(signal, cache=ResultCache(), mask=channel_mask).calculate_entropies_in_windows(2)
+                for signal, channel_mask in zip(signals, mask)]
+    assert np.isnan(expected[1][2]["Sample"])
+
+    batched = EntropyAnalyzer(signals, cache=ResultCache(), mask=mask).calculate_entropies_in_windows(2)
+    np.testing.assert_array_equal(entropy_array(batched), entropy_array(expected))
+
+    executor = ParallelEntropyExecutor(max_workers=2)
+    try:
+        parallel = EntropyAnalyzer(signals, cache=ResultCache(), channel=["A1", "A2", "A3"],
+                                   mask=mask).calculate_entropies_in_windows(2, executor=executor)
+    finally:
+        executor.shutdown()
+    np.testing.assert_allclose(entropy_array(parallel), entropy_array(expected), rtol=0, atol=1e-12)
+
+    reference = EntropyAnalyzer(signals[:, :4000], cache=ResultCache(), mask=mask[:, :4000]
+                                ).calculate_entropies_in_windows(2, vectorized=False)
+    np.testing.assert_allclose(entropy_array(reference), entropy_array([rows[:2] for rows in expected]), rtol=0,
+                               atol=1e-9)
+
+
+def entropy_array(entropies):
+    """
+    Converts one list of window dictionaries per channel to a (channels x windows x metrics) array.
+    """
+    return np.array([[list(window.values()) for window in windows] for windows in entropies])
+
+
+@pytest.mark.parametrize("dtype", [np.complex128, np.complex64])
+def test_channel_transforms_match_each_channel(signals, dtype):
+    """
+    The CWT of several channels in one batch equals the CWT of each channel alone.
+    """
+    transformer = FFTWaveletTransform(EEGWaveletAnalyzer.WAVELET, dtype=dtype)
+    scales, _ = EEGWaveletAnalyzer.frequency_scales(2, 100, 1000, voices_per_octave=4)
+    coefficients = transformer.transform(signals, scales)
+    for signal, channel_coefficients in zip(signals, coefficients):
+        np.testing.assert_array_equal(channel_coefficients, transformer.transform(signal, scales))
+
+
+def test_channel_pyramids_match_each_channel(signals):
+    """
+    The scalogram pyramids of several channels equal those built for each channel alone.
+    """
+    options = dict(min_freq=2, max_freq=100, voices_per_octave=4, single_precision=True, block_sec=4)
+    pyramids = EEGWaveletAnalyzer(signals, cache=ResultCache(), **options).scalogram_pyramid(base_bucket=8)
+    assert len(pyramids) == len(signals)
+    for signal, pyramid in zip(signals, pyramids):
+        alone = EEGWaveletAnalyzer(signal, cache=ResultCache(), **options).scalogram_pyramid(base_bucket=8)
+        for max_columns in (50, 400, 2000):
+            positions, values = pyramid.query(0, signal.shape[-1], max_columns)
+            expected_positions, expected_values = alone.query(0, signal.shape[-1], max_columns)
+            np.testing.assert_array_equal(positions, expected_positions)
+            np.testing.assert_array_equal(values, expected_values)
+
+
+@pytest.mark.parametrize("start_idx, end_idx, max_points", [(0, 100000, 400), (12345, 87654, 300),
+                                                            (99000, 100000, 64), (5000, 5400, 1000),
+                                                            (31, 77777, 1000)])
+def test_montage_envelopes_match_direct_min_max(start_idx, end_idx, max_points):
+    """
+    Every (min, max) pair a query returns is the minimum and maximum of the samples of its bucket, the buckets
+    cover the requested range, and no more than max_points points are returned (plus one bucket of
+    alignment on each side).
+    """
+    signals = np.random.default_rng(1).normal(size=(4, 100000)).astype(np.float32)
+    pyramid = MontagePyramid(signals, min_bucket=32)
+    x0, dx, values = pyramid.query(start_idx, end_idx, max_points, rows=[3, 1])
+    assert values.shape[0] == 2
+    if dx == 1:
+        np.testing.assert_array_equal(values, signals[[3, 1], start_idx:end_idx])
+        return
+
+    bucket = int(2 * dx)
+    num_buckets = values.shape[1] // 2
+    assert x0 <= start_idx and x0 + num_buckets * bucket >= end_idx
+    assert 2 * num_buckets <= max_points + 4
+    for j in range(num_buckets):
+        samples = signals[[3, 1], x0 + j * bucket:x0 + (j + 1) * bucket]
+        np.testing.assert_array_equal(values[:, 2 * j], samples.min(axis=1))
+        np.testing.assert_array_equal(values[:, 2 * j + 1], samples.max(axis=1))
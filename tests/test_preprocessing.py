@@ -0,0 +1,158 @@
+# tests/test_preprocessing.py
+
+import numpy as np
+import pytest
+
+from components.data_loader import EEGDataLoader
+from components.entropy_analyzer import EntropyAnalyzer
+from components.preprocessing import EEGPreprocessor
+from components.recording_store import RecordingStore
+
+
+def recording(num_channels=4, duration_sec=60, sampling_rate=1000, seed=0):
+    """
+    Clean synthetic recording in ADC counts: an offset, an alpha rhythm and white noise.
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(duration_sec * sampling_rate) / sampling_rate
+    alpha = 20 * np.sin(2 * np.pi * 10 * time + rng.uniform(0, 2 * np.pi, size=(num_channels, 1)))
+    return np.round(512 + alpha + 10 * rng.normal(size=(num_channels, len(time))))
+
+
+def test_filter_is_zero_phase():
+    """
+    A rhythm inside the pass band comes out with the same phase and amplitude, and a symmetric bump keeps its
+    peak at the same sample.
+    """
+    preprocessor = EEGPreprocessor()
+    time = np.arange(20000) / 1000
+    rhythm = 30 * np.sin(2 * np.pi * 10 * time)
+    filtered = preprocessor.filter(512 + rhythm)
+    assert filtered.dtype == np.float32
+    np.testing.assert_allclose(filtered[2000:-2000], rhythm[2000:-2000], rtol=0, atol=0.3)
+
+    bump = 512 + 100 * np.exp(-0.5 * ((time - 10) / 0.02) ** 2)
+    assert np.argmax(preprocessor.filter(bump)) == 10000
+
+
+def test_filtering_channels_together_equals_filtering_each_channel():
+    """
+    Channels are filtered independently, so a page can filter only the channels it uses.
+    """
+    signals = recording()
+    preprocessor = EEGPreprocessor()
+    filtered = preprocessor.filter(signals)
+    np.testing.assert_array_equal(filtered[2], preprocessor.filter(signals[2]))
+    np.testing.assert_array_equal(preprocessor.artifact_mask(filtered)[2], preprocessor.artifact_mask(filtered[2]))
+
+
+def test_clean_signals_are_hardly_marked_and_edges_are_not():
+    """
+    The edge padding does not turn the first and last epochs of clean signals into artifacts.
+    """
+    signals = recording(num_channels=8)
+    preprocessor = EEGPreprocessor()
+    mask = preprocessor.artifact_mask(preprocessor.filter(signals))
+    assert mask.shape == (8, 60)
+    assert not mask[:, 0].any() and not mask[:, -1].any()
+    assert mask.mean() < 0.03
+
+
+def test_blink_is_marked():
+    """
+    An eye blink (a slow bump of large amplitude) marks the epochs it spans and no others.
+    """
+    signals = recording(num_channels=2)
+    time = np.arange(signals.shape[1]) / 1000
+    signals[1] += 400 * np.exp(-0.5 * ((time - 30.5) / 0.1) ** 2)
+    preprocessor = EEGPreprocessor()
+    mask = preprocessor.artifact_mask(preprocessor.filter(signals))
+    assert mask[1, 30]
+    assert mask[1, :29].sum() + mask[1, 32:].sum() <= 1
+    assert not mask[0, 29:32].any()
+
+
+def test_flat_channel_is_marked():
+    """
+    A channel that is flat for the whole recording is marked, although no epoch differs from the others.
+    """
+    signals = recording(num_channels=2)
+    signals[0] = 512
+    signals[1, 10000:15000] = 512
+    preprocessor = EEGPreprocessor()
+    mask = preprocessor.artifact_mask(preprocessor.filter(signals))
+    assert mask[0].all()
+    assert mask[1, 11:14].all()
+
+
+def test_last_partial_epoch():
+    """
+    A last partial epoch is judged on its own samples.
+    """
+    signals = recording(num_channels=1, duration_sec=10)[0, :9500]
+    signals[9200:] += 300
+    preprocessor = EEGPreprocessor(low_freq=None, high_freq=None, notch_freq=None)
+    mask = preprocessor.artifact_mask(preprocessor.filter(signals))
+    assert mask.shape == (10,)
+    assert mask[9] and not mask[:9].any()
+
+
+def test_loader_filters_only_the_requested_channels(tmp_path):
+    """
+    EEGDataLoader.preprocess() filters the requested channels, in the requested order, and shares each
+    filtered channel through the store with loaders requesting other sets of channels.
+    """
+    signals = recording(num_channels=3, duration_sec=10)
+    path = tmp_path / "recording.csv"
+    np.savetxt(path, signals.T, fmt="%d", delimiter=",", header="A,B,C", comments="")
+    store = RecordingStore()
+    preprocessor = EEGPreprocessor()
+
+    loader = EEGDataLoader(str(path), use_cache=False, store=store, report_errors=False)
+    loader.load_data()
+    data = loader.preprocess(preprocessor, ["C", "A"])
+    assert list(data.columns) == ["C", "A"] and loader.get_channels() == ["C", "A"]
+    np.testing.assert_array_equal(loader.signals, preprocessor.filter(signals[[2, 0]]))
+    np.testing.assert_array_equal(loader.artifact_mask, preprocessor.artifact_mask(loader.signals))
+    np.testing.assert_array_equal(loader.artifact_samples("A", 0, 2000),
+                                  np.repeat(loader.artifact_mask[1, :2], 1000))
+
+    other = EEGDataLoader(str(path), use_cache=False, store=store, report_errors=False)
+    other.load_data()
+    hits = store.stats()["hits"]
+    other.preprocess(preprocessor, ["A"])
+    assert store.stats()["hits"] == hits + 1
+    np.testing.assert_array_equal(other.signals[0], loader.signals[1])
+    assert other.recording_key == loader.recording_key
+
+
+@pytest.mark.parametrize("start_idx, end_idx", [(0, 30), (5, 25), (10, 20), (12, 13), (25, 25), (21, 29)])
+def test_sample_mask_expands_epochs(start_idx, end_idx):
+    """
+    The sample mask of any range equals the epoch mask repeated over the samples of each epoch, then sliced.
+    """
+    epoch_mask = np.array([False, True, False])
+    samples = EEGPreprocessor.sample_mask(epoch_mask, 10, start_idx, end_idx)
+    np.testing.assert_array_equal(samples, np.repeat(epoch_mask, 10)[start_idx:end_idx])
+
+
+@pytest.mark.parametrize("hop_size", [None, 1, 3, 10, 25])
+def test_masked_windows_edges(hop_size):
+    """
+    A window is masked exactly when one of its samples is, including masked samples on the first or last
+    sample of a window and windows running past the end of the mask.
+    """
+    window_size = 10
+    num_windows = 9 if hop_size is None else (100 - window_size) // hop_size + 1
+    for masked in (0, 9, 10, 19, 55, 99):
+        mask = np.zeros(100, dtype=bool)
+        mask[masked] = True
+        starts = np.arange(num_windows) * (hop_size or window_size)
+        expected = (starts <= masked) & (masked < starts + window_size)
+        np.testing.assert_array_equal(EntropyAnalyzer.masked_windows(mask, window_size, num_windows, hop_size),
+                                      expected)
+
+    # Windows past the end of a shorter mask only see its samples
+    np.testing.assert_array_equal(EntropyAnalyzer.masked_windows(np.array([False] * 14 + [True]), 10, 3),
+                                  [False, True, False])
+    assert not EntropyAnalyzer.masked_windows(None, window_size, num_windows, hop_size).any()
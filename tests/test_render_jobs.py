@@ -0,0 +1,66 @@
+# tests/test_render_jobs.py
+
+import threading
+
+from components.render_jobs import RenderJobManager
+
+
+def blocking_producer(release, started=None):
+    """
+    Producer yielding one partial result, then waiting for release before yielding the last one.
+    """
+    def producer():
+        if started is not None:
+            started.set()
+        yield "partial", 0.5
+        release.wait(5)
+        yield "last", 1.0
+    return producer
+
+
+def test_session_runs_at_most_its_limit():
+    manager = RenderJobManager(max_workers=4, max_jobs_per_session=1)
+    release = threading.Event()
+    try:
+        first = manager.job(manager.submit("a", "first", 1, blocking_producer(release)))
+        second = manager.job(manager.submit("a", "second", 1, blocking_producer(release)))
+        other = manager.job(manager.submit("b", "first", 1, blocking_producer(release)))
+        release.set()
+        assert first.wait(5) and second.wait(5) and other.wait(5)
+        # The second job of session "a" only started once the first one had finished
+        assert second.started >= first.finished
+        assert [first.result, second.result, other.result] == ["last"] * 3
+    finally:
+        release.set()
+        manager.shutdown()
+
+
+def test_cancelled_job_is_not_restarted_and_holds_its_slot_until_it_stops():
+    manager = RenderJobManager(max_workers=2, max_jobs_per_session=1)
+    release, started = threading.Event(), threading.Event()
+    try:
+        stale = manager.job(manager.submit("a", "entropy", 1, blocking_producer(release, started)))
+        assert started.wait(5)
+        fresh = manager.job(manager.submit("a", "entropy", 2, blocking_producer(release)))
+        assert stale.state == "cancelled"
+        assert fresh.state == "queued"  # The thread of the stale job is still inside its producer
+        release.set()
+        assert fresh.wait(5) and fresh.state == "done" and fresh.result == "last"
+        assert stale.state == "cancelled" and stale.result is None
+    finally:
+        release.set()
+        manager.shutdown()
+
+
+def test_job_cancelled_while_queued_never_runs_its_producer():
+    manager = RenderJobManager(max_workers=1, max_jobs_per_session=1)
+    release, calls = threading.Event(), []
+    try:
+        manager.submit("a", "first", 1, blocking_producer(release))
+        queued = manager.job(manager.submit("a", "second", 1, lambda: calls.append(1) or iter([("x", 1.0)])))
+        manager.cancel(queued.job_id)
+        release.set()
+        manager.shutdown()
+        assert queued.state == "cancelled" and calls == []
+    finally:
+        release.set()
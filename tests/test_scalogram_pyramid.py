@@ -0,0 +1,51 @@
+# tests/test_scalogram_pyramid.py
+
+import numpy as np
+
+from components.downsampler import ScalogramPyramid
+from components.result_cache import ResultCache
+from components.wavelet_analyzer import EEGWaveletAnalyzer
+
+
+def test_levels_are_max_pooled_bounds_of_the_magnitudes():
+    """
+    Every column of every level is the maximum of the magnitudes it covers, whatever the blocks they were
+    appended in, and queries never return more columns than asked for.
+    """
+    magnitudes = np.random.default_rng(0).random((6, 10000)).astype(np.float32)
+    pyramid = ScalogramPyramid(6, start_idx=500, base_bucket=4)
+    for start in range(0, magnitudes.shape[1], 777):
+        pyramid.append(magnitudes[:, start:start + 777])
+    pyramid.finish()
+    assert pyramid.max_value == magnitudes.max()
+
+    for max_columns in (3, 100, 2500, 20000):
+        positions, values = pyramid.query(500, 10500, max_columns)
+        assert values.shape[1] <= max(max_columns, -(-10000 // pyramid.base_bucket))
+        assert values.shape[1] <= max_columns or pyramid.base_bucket * len(positions) >= 10000
+        bucket = positions[1] - positions[0] if len(positions) > 1 else 10000
+        for column, position in zip(values.T, positions):
+            covered = magnitudes[:, position - 500:position - 500 + bucket]
+            np.testing.assert_array_equal(column, covered.max(axis=1))
+
+    positions, values = pyramid.query(0, 20000, 1, quantize=True)
+    assert values.dtype == np.uint8 and values.max() <= 255
+
+
+def test_scalogram_pyramid_stays_within_its_budget():
+    """
+    The pyramid of a whole recording stays within max_mb, pooling the finest level as needed, and bounds the
+    magnitudes of the transform from above.
+    """
+    signal = np.random.default_rng(1).normal(size=60000)
+    analyzer = EEGWaveletAnalyzer(signal, min_freq=2, max_freq=50, cache=ResultCache(), voices_per_octave=4,
+                                  single_precision=True)
+    max_mb = 0.5
+    pyramid = analyzer.scalogram_pyramid(max_mb=max_mb)
+    assert pyramid.base_bucket > 1
+    assert pyramid.nbytes <= max_mb * 1024 ** 2
+
+    magnitudes = np.abs(analyzer.transformer.transform(signal, analyzer.scales))
+    _, values = pyramid.query(0, len(signal), 10 ** 9)
+    pooled = magnitudes[:, :values.shape[1] * pyramid.base_bucket].reshape(len(analyzer.scales), values.shape[1], -1)
+    np.testing.assert_allclose(values, pooled.max(axis=2), rtol=1e-4)